@@ -0,0 +1,104 @@
+"""
+Benchmark expression lookups: legacy pd.read_csv/pd.read_feather vs the columnar store.
+
+Every (source, reader) pair runs in a fresh interpreter. "cold" is the first query in that
+process and "warm" the second one; the legacy readers have no cache, so they re-read the
+file each time. Peak RSS is the child's ru_maxrss after both queries.
+
+Usage:
+    python bench_exp.py [--genes TP53 EGFR ...] [--cancer BRCA] [--sources NAME ...]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _child(source: str, reader: str, genes: list, cancer: str) -> dict:
+    import pandas as pd
+    import server
+
+    if source == "gene_expression_TCGA":
+        legacy_path = server.gene_expression_TCGA
+    else:
+        legacy_path = server.exp_data_db[source]
+
+    def legacy_query():
+        if source == "gene_expression_TCGA":
+            exp = pd.read_feather(legacy_path)
+        else:
+            exp = pd.read_csv(legacy_path, index_col=0)
+        exp = exp[exp.index.isin(genes)]
+        if source == "gene_expression_TCGA":
+            exp = exp.loc[:, exp.columns.astype(str).str.startswith(cancer)]
+        return exp
+
+    def columnar_query():
+        partition = cancer if source == "gene_expression_TCGA" else None
+        key, path = server._expression_source(source, legacy_path, partition=partition)
+        exp = server.exp_store.get(key, path)
+        columns = exp.prefix_columns(cancer) if source == "gene_expression_TCGA" else None
+        return exp.take(exp.selector.select(genes)[0], columns)
+
+    query = legacy_query if reader == "legacy" else columnar_query
+    timings = []
+    for _ in range(2):
+        start = time.perf_counter()
+        result = query()
+        timings.append(time.perf_counter() - start)
+
+    return {
+        "cold_s": timings[0],
+        "warm_s": timings[1],
+        "peak_rss_mb": _peak_rss_mb(),
+        "shape": list(result.shape),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark expression data readers")
+    parser.add_argument("--genes", nargs="+", default=["TP53", "EGFR", "GATA4", "ESR1", "MYC"])
+    parser.add_argument("--cancer", default="BRCA")
+    parser.add_argument(
+        "--sources",
+        nargs="+",
+        default=["gene_expression_TCGA", "cancer_TCGA", "normal_tissue_GTEx", "cell_line_CCLE"],
+    )
+    parser.add_argument("--child", nargs=2, metavar=("SOURCE", "READER"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_child(*args.child, args.genes, args.cancer)))
+        return
+
+    print(f"{'source':<24}{'reader':<10}{'cold (s)':>10}{'warm (s)':>10}{'peak RSS (MB)':>15}")
+    for source in args.sources:
+        for reader in ("legacy", "columnar"):
+            command = [
+                sys.executable, os.path.abspath(__file__),
+                "--child", source, reader,
+                "--cancer", args.cancer,
+                "--genes", *args.genes,
+            ]
+            proc = subprocess.run(command, capture_output=True, text=True)
+            try:
+                result = json.loads(proc.stdout.strip().splitlines()[-1])
+            except (IndexError, ValueError):
+                print(f"{source:<24}{reader:<10} failed: {proc.stderr.strip()[-200:]}")
+                continue
+            print(
+                f"{source:<24}{reader:<10}{result['cold_s']:>10.3f}{result['warm_s']:>10.3f}"
+                f"{result['peak_rss_mb']:>15.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
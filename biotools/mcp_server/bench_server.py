@@ -0,0 +1,289 @@
+"""
+End-to-end benchmark of server.py over streamable HTTP, against data from make_bench_data.py.
+
+The server runs in a child process with BIOTOOLS_DATA_DIR pointing at the synthetic data and
+a private BIOTOOLS_TMP_DIR, so runs never share result caches. Measured:
+
+    startup     seconds until the port answers and until /ready reports every dataset warm
+    latency     per tool case, "cold" calls use fresh random arguments (result cache misses)
+                and "warm" calls repeat one argument set (cache hits, where the tool caches)
+    throughput  calls/s and latency percentiles of N concurrent client sessions calling a
+                random mix of the cases, for each --concurrency level
+    memory      server RSS after startup and after each phase, and its peak (VmHWM)
+
+Results are written as JSON. With --baseline, startup and latency medians, peak memory and
+throughput are compared with an earlier result file and the script exits with status 1 when
+any of them regresses by more than --threshold (e.g. 1.25 = 25% worse).
+
+Usage:
+    python bench_server.py DATA_DIR [--repeats N] [--concurrency 1 4 16] [--duration S]
+                           [--output results.json] [--baseline old.json] [--threshold 1.25]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from fastmcp import Client
+
+
+def _case_args(rng: random.Random, genes: list, trs: list) -> dict:
+    """Tool cases: name -> function building the arguments of one call"""
+    def gene_list(n: int) -> list:
+        return rng.sample(genes, min(n, len(genes)))
+
+    return {
+        "get_gene_position": lambda: ("get_gene_position", {"genes": gene_list(20)}),
+        "get_gene_regions": lambda: (
+            "get_gene_regions", {"genes": gene_list(20), "upstream": rng.randrange(0, 5000)}
+        ),
+        "query_annotation_regions": lambda: (
+            "query_annotation_regions",
+            {"biological_type": "Enhancer", "genes": gene_list(50), "flank": rng.randrange(0, 10000)},
+        ),
+        "get_mean_express_data": lambda: (
+            "get_mean_express_data", {"data_source": "normal_tissue_GTEx", "genes": gene_list(20)}
+        ),
+        "get_tcga_cancer_express": lambda: (
+            "get_tcga_cancer_express", {"cancer": rng.choice(["BRCA", "LUAD", "COAD"]), "genes": gene_list(20)}
+        ),
+        "expression_stats": lambda: (
+            "expression_stats", {"analysis": "correlation", "genes": gene_list(10), "cancer": "BRCA"}
+        ),
+        "enrichment": lambda: ("enrichment", {"genes": gene_list(100), "category": "GO_BP"}),
+        "rank_tr": lambda: ("rank_tr", {"genes": gene_list(50)}),
+        "search_tr": lambda: ("search_tr", {"keyword": rng.choice(trs)[:4]}),
+        "get_tr_bed": lambda: ("get_tr_bed", {"trs": rng.sample(trs, min(5, len(trs)))}),
+        "execute_bash": lambda: ("execute_bash", {"command": f"echo {rng.random()}"}),
+    }
+
+
+def _read_names(data_dir: str) -> tuple:
+    with open(f"{data_dir}/human/gene.bed") as f:
+        genes = [line.split("\t")[4] for line in f]
+    trs = sorted({name.split("@")[0] for name in os.listdir(f"{data_dir}/trapt/TR_bed")})
+    return genes, trs
+
+
+def _data_scale(data_dir: str) -> dict:
+    """Scale preset recorded by make_bench_data.py, if any"""
+    try:
+        with open(f"{data_dir}/bench_data.json") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _rss_mb(pid: int) -> dict:
+    """Current and peak resident memory of a process, from /proc"""
+    values = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "VmHWM"):
+                values[key] = int(value.split()[0]) / 1024
+    return {"rss_mb": values.get("VmRSS"), "peak_rss_mb": values.get("VmHWM")}
+
+
+def _get(url: str) -> int:
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def start_server(data_dir: str, tmp_dir: str, port: int, startup: str, timeout: float) -> tuple:
+    """Start server.py; returns (process, seconds until listening, seconds until ready)"""
+    env = dict(
+        os.environ,
+        BIOTOOLS_DATA_DIR=data_dir,
+        BIOTOOLS_TMP_DIR=tmp_dir,
+        BIOTOOLS_PORT=str(port),
+        BIOTOOLS_STARTUP=startup,
+        BIOTOOLS_EXP_COLUMNAR_DIR=f"{data_dir}/exp/columnar",
+        BIOTOOLS_TR_MATRIX_PATH=f"{data_dir}/trapt/tr_gene_rp.npz",
+    )
+    server_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, server_path], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    listening = None
+    while time.perf_counter() - start < timeout:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with code {proc.returncode}")
+        try:
+            status = _get(f"http://127.0.0.1:{port}/ready")
+        except OSError:
+            time.sleep(0.05)
+            continue
+        if listening is None:
+            listening = time.perf_counter() - start
+        # Lazy startup never warms everything by itself; the first calls load what they need
+        if status == 200 or startup == "lazy":
+            return proc, listening, time.perf_counter() - start
+        time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f"server not ready after {timeout}s")
+
+
+def _percentiles(timings: list) -> dict:
+    timings = sorted(timings)
+    return {
+        "median_ms": statistics.median(timings) * 1000,
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+        "n": len(timings),
+    }
+
+
+async def _call(client: Client, name: str, args: dict) -> tuple:
+    start = time.perf_counter()
+    result = await client.call_tool(name, args, raise_on_error=False)
+    text = result.content[0].text if result.content else ""
+    return time.perf_counter() - start, result.is_error or text.startswith(("Error", "Execution error"))
+
+
+async def measure_latency(url: str, cases: dict, repeats: int, pid: int) -> dict:
+    results = {}
+    async with Client(url) as client:
+        for case, make_call in cases.items():
+            cold, errors = [], 0
+            for _ in range(repeats):
+                elapsed, failed = await _call(client, *make_call())
+                cold.append(elapsed)
+                errors += failed
+            warm_call = make_call()
+            warm = [(await _call(client, *warm_call))[0] for _ in range(repeats)]
+            results[case] = {
+                "cold": _percentiles(cold),
+                "warm": _percentiles(warm),
+                "errors": errors,
+                **_rss_mb(pid),
+            }
+            print(
+                f"{case:<26}{results[case]['cold']['median_ms']:>10.1f}{results[case]['cold']['p95_ms']:>10.1f}"
+                f"{results[case]['warm']['median_ms']:>10.1f}{errors:>8}{results[case]['rss_mb']:>10.1f}"
+            )
+    return results
+
+
+async def measure_throughput(url: str, cases: dict, concurrency: int, duration: float, seed: int) -> dict:
+    timings, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def session(worker: int):
+        nonlocal errors
+        rng = random.Random(seed + worker)
+        names = list(cases)
+        async with Client(url) as client:
+            while time.perf_counter() < deadline:
+                elapsed, failed = await _call(client, *cases[rng.choice(names)]())
+                timings.append(elapsed)
+                errors += failed
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session(worker) for worker in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {"calls_per_s": len(timings) / elapsed, "errors": errors, **_percentiles(timings or [0.0])}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Regressions as (metric, baseline, current) where current is worse by more than threshold"""
+    pairs = [
+        ("startup.ready_s", baseline["startup"]["ready_s"], results["startup"]["ready_s"]),
+        ("memory.peak_rss_mb", baseline["memory"]["peak_rss_mb"], results["memory"]["peak_rss_mb"]),
+    ]
+    for case, current in results["latency"].items():
+        if case in baseline["latency"]:
+            for kind in ("cold", "warm"):
+                pairs.append(
+                    (f"latency.{case}.{kind}", baseline["latency"][case][kind]["median_ms"], current[kind]["median_ms"])
+                )
+    regressions = [(metric, old, new) for metric, old, new in pairs if old and new > old * threshold]
+    # Throughput regresses when it drops
+    for level, current in results["throughput"].items():
+        old = baseline["throughput"].get(level, {}).get("calls_per_s")
+        if old and current["calls_per_s"] * threshold < old:
+            regressions.append((f"throughput.{level}.calls_per_s", old, current["calls_per_s"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the biotools MCP server end to end")
+    parser.add_argument("data_dir", help="Directory written by make_bench_data.py")
+    parser.add_argument("--port", type=int, default=3101)
+    parser.add_argument("--startup", choices=["background", "lazy", "eager"], default="background")
+    parser.add_argument("--startup-timeout", type=float, default=600)
+    parser.add_argument("--cases", nargs="+", help="Tool cases to run (default: all)")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per concurrency level")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_server_results.json")
+    parser.add_argument("--baseline", help="Earlier result file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    args = parser.parse_args()
+
+    data_dir = os.path.abspath(args.data_dir)
+    genes, trs = _read_names(data_dir)
+    cases = _case_args(random.Random(args.seed), genes, trs)
+    if not os.path.exists(f"{data_dir}/trapt/tr_gene_rp.npz"):
+        cases.pop("rank_tr")
+    if args.cases:
+        cases = {case: cases[case] for case in args.cases}
+    url = f"http://127.0.0.1:{args.port}/biotools"
+
+    with tempfile.TemporaryDirectory(prefix="bench_server_") as tmp_dir:
+        proc, listening_s, ready_s = start_server(data_dir, tmp_dir, args.port, args.startup, args.startup_timeout)
+        try:
+            results = {
+                "data": _data_scale(data_dir),
+                "startup": {"mode": args.startup, "listening_s": listening_s, "ready_s": ready_s, **_rss_mb(proc.pid)},
+            }
+            print(f"startup: listening after {listening_s:.2f}s, ready after {ready_s:.2f}s, "
+                  f"RSS {results['startup']['rss_mb']:.1f} MB")
+
+            print(f"{'case':<26}{'cold (ms)':>10}{'p95 (ms)':>10}{'warm (ms)':>10}{'errors':>8}{'RSS (MB)':>10}")
+            results["latency"] = asyncio.run(measure_latency(url, cases, args.repeats, proc.pid))
+
+            results["throughput"] = {}
+            for concurrency in args.concurrency:
+                level = asyncio.run(measure_throughput(url, cases, concurrency, args.duration, args.seed))
+                level.update(_rss_mb(proc.pid))
+                results["throughput"][str(concurrency)] = level
+                print(
+                    f"concurrency {concurrency:>3}: {level['calls_per_s']:.1f} calls/s, "
+                    f"median {level['median_ms']:.1f} ms, p95 {level['p95_ms']:.1f} ms, {level['errors']} errors"
+                )
+            results["memory"] = _rss_mb(proc.pid)
+            print(f"peak RSS: {results['memory']['peak_rss_mb']:.1f} MB")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for metric, old, new in regressions:
+            print(f"REGRESSION {metric}: {old:.2f} -> {new:.2f}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold}x of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
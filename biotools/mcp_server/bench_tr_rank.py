@@ -0,0 +1,68 @@
+"""
+Benchmark TR ranking: the resident matrix behind rank_tr vs the trapt CLI.
+
+"load" is reading the matrix built by build_tr_matrix.py, "score" the median time to rank
+all TRs for the gene set once the matrix is resident. The CLI is timed end to end, as the
+agent runs it through execute_bash, and is skipped when trapt is not on PATH.
+
+Usage:
+    python bench_tr_rank.py [--genes TP53 EGFR ...] [--repeats N] [--library DIR]
+"""
+
+import argparse
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+
+import server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark TR ranking")
+    parser.add_argument("--genes", nargs="+", default=["TP53", "EGFR", "GATA4", "ESR1", "MYC"])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--library", default=f"{server.data_docker}/trapt/library")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    matrix = server.TRMatrix(server.tr_matrix_path)
+    load_s = time.perf_counter() - start
+
+    rows, unmatched, _ = matrix.selector.select(args.genes)
+    if unmatched:
+        print(f"Genes not in the matrix: {', '.join(unmatched)}")
+    timings = []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        ranking = matrix.score(rows)
+        timings.append(time.perf_counter() - start)
+
+    print(f"{'reader':<12}{'load (s)':>10}{'score (ms)':>12}  top TR")
+    print(
+        f"{'matrix':<12}{load_s:>10.3f}{statistics.median(timings) * 1000:>12.2f}  "
+        f"{ranking['TR'].iloc[0] if len(ranking) else '-'}"
+    )
+
+    if shutil.which("trapt") is None:
+        print(f"{'trapt CLI':<12} skipped: trapt not found on PATH")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(f"{tmp}/genes.txt", "w") as f:
+            f.write("\n".join(args.genes) + "\n")
+        start = time.perf_counter()
+        proc = subprocess.run(
+            ["trapt", "--library", args.library, "--input", f"{tmp}/genes.txt", "--output", f"{tmp}/output"],
+            capture_output=True,
+            text=True,
+        )
+        cli_s = time.perf_counter() - start
+    if proc.returncode != 0:
+        print(f"{'trapt CLI':<12} failed: {proc.stderr.strip()[-200:]}")
+        return
+    print(f"{'trapt CLI':<12}{'-':>10}{cli_s * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Build the TR x gene regulatory potential matrix used by the rank_tr tool.
+
+For every TR bed file in /data/trapt/TR_bed and every gene in gene.bed, the regulatory
+potential is the sum over peaks within --window bp of the gene's TSS of
+exp(-(0.5 + 4 * distance / window)), distance being measured from the peak centre
+(the BETA/TRAPT weighting). The matrix is saved with scipy.sparse.save_npz as an uncompressed
+CSC matrix (float32, TRs x genes); its TR and gene labels, the window and the gene.bed
+fingerprint it was built from go to a .labels.json file next to it.
+
+Usage:
+    python build_tr_matrix.py [--output PATH] [--window BP] [--workers N]
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.sparse
+
+import server
+
+# Set once per worker process by the pool initializer instead of pickled into every task
+_worker_tss = None
+_worker_n_genes = None
+
+
+def _tss_by_chrom(genes: server.GeneIndex) -> dict:
+    """chrom -> (sorted TSS positions, gene rows)"""
+    chroms, starts, _, _, _ = genes.regions(None, "tss", 0, 0)
+    tss = {}
+    for chrom in np.unique(chroms):
+        rows = np.flatnonzero(chroms == chrom)
+        order = np.argsort(starts[rows], kind="stable")
+        tss[chrom] = (starts[rows][order], rows[order])
+    return tss
+
+
+def tr_regulatory_potential(bed_path: str, tss: dict, n_genes: int, window: int) -> tuple:
+    """(gene rows, weights) with non-zero regulatory potential for one TR bed file"""
+    potential = np.zeros(n_genes, dtype=np.float64)
+    for chrom, (starts, ends, _, _) in server.IntervalIndex(bed_path).chroms.items():
+        if chrom not in tss:
+            continue
+        tss_positions, tss_rows = tss[chrom]
+        centres = (starts + ends) // 2
+        first = np.searchsorted(tss_positions, centres - window, side="left")
+        last = np.searchsorted(tss_positions, centres + window, side="right")
+        genes = server._expand_ranges(first, last)
+        peaks = np.repeat(np.arange(len(centres)), last - first)
+        distance = np.abs(tss_positions[genes] - centres[peaks])
+        potential += np.bincount(
+            tss_rows[genes], weights=np.exp(-(0.5 + 4 * distance / window)), minlength=n_genes
+        )
+    rows = np.flatnonzero(potential)
+    return rows, potential[rows].astype(np.float32)
+
+
+def _init_worker(tss: dict, n_genes: int):
+    global _worker_tss, _worker_n_genes
+    _worker_tss, _worker_n_genes = tss, n_genes
+
+
+def _worker(args):
+    bed_path, window = args
+    return tr_regulatory_potential(bed_path, _worker_tss, _worker_n_genes, window)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the TR x gene regulatory potential matrix")
+    parser.add_argument("--output", default=server.tr_matrix_path, help="Output .npz path")
+    parser.add_argument("--window", type=int, default=100_000, help="Max peak to TSS distance (bp)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    server.datasets["tr"].get()
+    genes = server._gene_index()
+    tss = _tss_by_chrom(genes)
+    n_genes = len(genes.name)
+    trs = sorted(server.tr_data_db)
+    print(f"{len(trs)} TRs x {n_genes} genes, window {args.window} bp")
+
+    tasks = [(server.tr_data_db[tr], args.window) for tr in trs]
+    gene_rows, tr_rows, weights = [], [], []
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(tss, n_genes)) as pool:
+        for i, (rows, values) in enumerate(pool.map(_worker, tasks, chunksize=16)):
+            gene_rows.append(rows)
+            tr_rows.append(np.full(len(rows), i, dtype=np.int32))
+            weights.append(values)
+            if (i + 1) % 1000 == 0:
+                print(f"  {i + 1}/{len(trs)} TRs ({time.perf_counter() - start:.1f}s)")
+
+    gene_rows = np.concatenate(gene_rows) if gene_rows else np.zeros(0, dtype=np.int64)
+    tr_rows = np.concatenate(tr_rows) if tr_rows else np.zeros(0, dtype=np.int32)
+    weights = np.concatenate(weights) if weights else np.zeros(0, dtype=np.float32)
+
+    matrix = scipy.sparse.csc_matrix((weights, (tr_rows, gene_rows)), shape=(len(trs), n_genes))
+    labels = {
+        "trs": trs,
+        "genes": [str(gene) for gene in genes.name],
+        "window": args.window,
+        "gene_bed": server._file_fingerprint(server.bed_config["gene_bed_path"]),
+    }
+
+    # Labels first: the server picks the matrix up once the .npz exists
+    labels_path = server._tr_matrix_labels_path(args.output)
+    with open(f"{labels_path}.tmp", "w") as f:
+        json.dump(labels, f)
+    os.replace(f"{labels_path}.tmp", labels_path)
+    tmp_path = f"{args.output}.tmp.npz"
+    scipy.sparse.save_npz(tmp_path, matrix, compressed=False)
+    os.replace(tmp_path, args.output)
+    print(
+        f"{len(weights)} non-zero entries ({len(weights) / max(1, len(trs) * n_genes):.2%}) -> "
+        f"{args.output} ({os.path.getsize(args.output) / 1024 / 1024:.1f} MB, "
+        f"{time.perf_counter() - start:.1f}s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Convert the /data/exp expression matrices into memory-mappable Arrow IPC files.
+
+Each `exp_data_db` source is written to `<output>/<source>.arrow` and the TCGA sample
+matrix is partitioned by cancer type into `<output>/gene_expression_TCGA/<cancer>.arrow`.
+Files are uncompressed and chunked into record batches, so server.py can memory-map them
+and only page in the columns and row batches a query touches. server.py falls back to the
+legacy .csv.gz/.feather files for any source that has not been converted.
+
+Usage:
+    python convert_exp.py [--output DIR] [--sources NAME ...] [--chunk-rows N]
+"""
+
+import argparse
+import json
+import os
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+import server
+
+
+def _write_ipc(frame: pd.DataFrame, path: str, chunk_rows: int) -> int:
+    """Write a DataFrame (index included) as an uncompressed Arrow IPC file, atomically"""
+    table = pa.Table.from_pandas(frame, preserve_index=True)
+    tmp_path = f"{path}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=chunk_rows)
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+def convert_mean_sources(sources, output: str, chunk_rows: int) -> dict:
+    manifest = {}
+    for source in sources:
+        start = time.perf_counter()
+        exp = pd.read_csv(server.exp_data_db[source], index_col=0)
+        path = f"{output}/{source}.arrow"
+        size = _write_ipc(exp, path, chunk_rows)
+        manifest[source] = {
+            "path": path,
+            "genes": int(exp.shape[0]),
+            "samples": int(exp.shape[1]),
+            "bytes": size,
+        }
+        print(f"{source}: {exp.shape[0]} x {exp.shape[1]} -> {path} ({time.perf_counter() - start:.1f}s)")
+    return manifest
+
+
+def convert_tcga(output: str, chunk_rows: int) -> dict:
+    start = time.perf_counter()
+    exp = pd.read_feather(server.gene_expression_TCGA)
+    cancers = pd.read_csv(server.exp_data_db["cancer_TCGA"], index_col=0, nrows=0).columns
+    os.makedirs(f"{output}/gene_expression_TCGA", exist_ok=True)
+
+    partitions = {}
+    assigned = 0
+    for cancer in cancers:
+        columns = exp.columns[exp.columns.astype(str).str.startswith(cancer)]
+        if columns.empty:
+            continue
+        path = f"{output}/gene_expression_TCGA/{cancer}.arrow"
+        size = _write_ipc(exp[columns], path, chunk_rows)
+        partitions[cancer] = {"path": path, "samples": int(len(columns)), "bytes": size}
+        assigned += len(columns)
+
+    if assigned < exp.shape[1]:
+        print(f"Warning: {exp.shape[1] - assigned} TCGA samples match no cancer type and were skipped")
+    print(
+        f"gene_expression_TCGA: {exp.shape[0]} x {exp.shape[1]} -> "
+        f"{len(partitions)} partitions ({time.perf_counter() - start:.1f}s)"
+    )
+    return {"gene_expression_TCGA": {"genes": int(exp.shape[0]), "partitions": partitions}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert expression matrices to Arrow IPC")
+    parser.add_argument("--output", default=server.exp_columnar_dir, help="Output directory")
+    all_sources = list(server.exp_data_db) + ["gene_expression_TCGA"]
+    parser.add_argument(
+        "--sources", nargs="+", choices=all_sources, default=all_sources, help="Data sources to convert"
+    )
+    parser.add_argument("--chunk-rows", type=int, default=4096, help="Rows per record batch")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    manifest_path = f"{args.output}/manifest.json"
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+
+    mean_sources = [source for source in args.sources if source in server.exp_data_db]
+    manifest.update(convert_mean_sources(mean_sources, args.output, args.chunk_rows))
+    if "gene_expression_TCGA" in args.sources:
+        manifest.update(convert_tcga(args.output, args.chunk_rows))
+
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Manifest written to {manifest_path}")
+
+
+if __name__ == "__main__":
+    main()
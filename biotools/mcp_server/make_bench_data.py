@@ -0,0 +1,288 @@
+"""
+Generate a synthetic stand-in for /data, for benchmarking server.py (see bench_server.py).
+
+The layout and file formats match what server.py reads: gene.bed and gene_alias.tsv, the
+annotation BEDs, the TR_bed directory, the mean expression .csv.gz sources, the TCGA sample
+feather file and the geneset JSON files. Sizes follow a scale preset:
+
+    tiny    600 genes, 60 TR files, 3k annotation rows per type, 132 TCGA samples (pytest suite)
+    small   2k genes, 200 TR files, 20k annotation rows per type, 400 TCGA samples
+    medium  20k genes, 2k TR files, 200k annotation rows per type, 1.6k TCGA samples
+    large   40k genes, 10k TR files, 1M annotation rows per type, 6.6k TCGA samples
+
+Genes get lognormal lengths on chromosomes weighted by length, TR peaks and annotation
+regions are enriched near TSSs, expression is low rank plus noise (so coexpression has
+structure) and TCGA samples carry barcodes with tumour/normal sample types. The first
+genes and TRs get real symbols (TP53, EGFR, ESR1, ...) so default queries hit.
+
+Usage:
+    python make_bench_data.py OUTPUT [--scale tiny|small|medium|large] [--seed N]
+                              [--columnar] [--tr-matrix]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+scales = {
+    "tiny": {
+        "genes": 600, "trs": 60, "peaks": 300, "annotation_rows": 3_000,
+        "samples_per_cancer": 10, "cell_lines": 20, "gene_sets": 60,
+    },
+    "small": {
+        "genes": 2_000, "trs": 200, "peaks": 1_000, "annotation_rows": 20_000,
+        "samples_per_cancer": 12, "cell_lines": 100, "gene_sets": 300,
+    },
+    "medium": {
+        "genes": 20_000, "trs": 2_000, "peaks": 3_000, "annotation_rows": 200_000,
+        "samples_per_cancer": 50, "cell_lines": 500, "gene_sets": 3_000,
+    },
+    "large": {
+        "genes": 40_000, "trs": 10_000, "peaks": 5_000, "annotation_rows": 1_000_000,
+        "samples_per_cancer": 200, "cell_lines": 1_000, "gene_sets": 10_000,
+    },
+}
+
+# hg38 chromosome lengths (Mb), used to place genes and regions
+chrom_sizes = {
+    "chr1": 248, "chr2": 242, "chr3": 198, "chr4": 190, "chr5": 181, "chr6": 170, "chr7": 159,
+    "chr8": 145, "chr9": 138, "chr10": 133, "chr11": 135, "chr12": 133, "chr13": 114,
+    "chr14": 107, "chr15": 101, "chr16": 90, "chr17": 83, "chr18": 80, "chr19": 58,
+    "chr20": 64, "chr21": 46, "chr22": 50, "chrX": 156, "chrY": 57,
+}
+
+gene_symbols = [
+    "TP53", "EGFR", "GATA4", "ESR1", "MYC", "BRCA1", "BRCA2", "KRAS", "PTEN", "PIK3CA",
+    "AKT1", "CDKN2A", "RB1", "APC", "ERBB2", "FOXA1", "GATA3", "SOX2", "NANOG", "POU5F1",
+    "CTCF", "AR", "VHL", "NOTCH1", "SMAD4", "STAT3", "JUN", "FOS", "MYOD1", "HNF4A",
+]
+tr_symbols = [
+    "ESR1", "FOXA1", "GATA3", "CTCF", "MYC", "MAX", "TP53", "AR", "SOX2", "POU5F1", "NANOG",
+    "STAT3", "JUN", "FOS", "HNF4A", "GATA4", "REST", "YY1", "EP300", "RAD21", "SMC3", "ZNF143",
+    "CEBPB", "NFKB1", "RELA", "E2F1", "SP1", "KLF4", "TEAD1", "RUNX1",
+]
+aliases = {"P53": "TP53", "ERBB1": "EGFR", "HER2": "ERBB2", "ER": "ESR1", "C-MYC": "MYC"}
+cancers = [
+    "ACC", "BLCA", "BRCA", "CESC", "CHOL", "COAD", "DLBC", "ESCA", "GBM", "HNSC", "KICH",
+    "KIRC", "KIRP", "LAML", "LGG", "LIHC", "LUAD", "LUSC", "MESO", "OV", "PAAD", "PCPG",
+    "PRAD", "READ", "SARC", "SKCM", "STAD", "TGCT", "THCA", "THYM", "UCEC", "UCS", "UVM",
+]
+tissues = [
+    "Adipose", "Adrenal_Gland", "Bladder", "Blood", "Brain_Cortex", "Brain_Cerebellum", "Breast",
+    "Colon", "Esophagus", "Heart", "Kidney", "Liver", "Lung", "Muscle", "Nerve", "Ovary",
+    "Pancreas", "Pituitary", "Prostate", "Skin", "Small_Intestine", "Spleen", "Stomach",
+    "Testis", "Thyroid", "Uterus", "Vagina", "Whole_Blood",
+]
+annotation_widths = {  # biological type -> (median width, spread) of its regions
+    "Super_Enhancer_SEdbv2": (20_000, 0.6),
+    "Super_Enhancer_SEAv3": (20_000, 0.6),
+    "Super_Enhancer_dbSUPER": (15_000, 0.6),
+    "Enhancer": (1_500, 0.5),
+    "Common_SNP": (1, 0),
+    "Risk_SNP": (1, 0),
+    "eQTL": (1, 0),
+    "TFBS": (300, 0.4),
+    "eRNA": (2_000, 0.5),
+    "RNA_Interaction": (500, 0.8),
+    "CRISPR": (25, 0.2),
+}
+
+
+def _names(symbols: list, prefix: str, n: int) -> list:
+    return symbols[:n] + [f"{prefix}{i}" for i in range(len(symbols), n)]
+
+
+def _random_positions(rng: np.random.Generator, n: int) -> tuple:
+    """(chroms, positions) drawn uniformly over the genome"""
+    names = np.array(list(chrom_sizes))
+    weights = np.array(list(chrom_sizes.values()), dtype=np.float64)
+    chroms = rng.choice(names, size=n, p=weights / weights.sum())
+    sizes = np.array([chrom_sizes[chrom] for chrom in chroms]) * 1_000_000
+    return chroms, (rng.random(n) * (sizes - 2_000_000)).astype(np.int64) + 1_000_000
+
+
+def _near_tss(rng: np.random.Generator, genes: pd.DataFrame, n: int, fraction: float) -> tuple:
+    """(chroms, positions): a fraction placed within 50 kb of a random TSS, the rest uniform"""
+    chroms, positions = _random_positions(rng, n)
+    near = rng.random(n) < fraction
+    picked = genes.iloc[rng.integers(0, len(genes), near.sum())]
+    tss = np.where(picked["strand"] == "+", picked["start"], picked["end"]).astype(np.int64)
+    chroms[near] = picked["chrom"].to_numpy()
+    positions[near] = np.maximum(tss + rng.normal(0, 15_000, near.sum()).astype(np.int64), 0)
+    return chroms, positions
+
+
+def _write_bed(path: str, frame: pd.DataFrame):
+    frame = frame.sort_values(["chrom", "start"], kind="stable")
+    frame.to_csv(path, sep="\t", header=False, index=False)
+
+
+def make_genes(rng: np.random.Generator, output: str, n_genes: int) -> pd.DataFrame:
+    chroms, starts = _random_positions(rng, n_genes)
+    lengths = np.clip(rng.lognormal(np.log(25_000), 1.0, n_genes), 500, 2_000_000).astype(np.int64)
+    genes = pd.DataFrame(
+        {
+            "chrom": chroms,
+            "start": starts,
+            "end": starts + lengths,
+            "id": [f"ENSG{i:011d}" for i in range(n_genes)],
+            "name": _names(gene_symbols, "GENE", n_genes),
+            "strand": rng.choice(["+", "-"], n_genes),
+        }
+    )
+    os.makedirs(f"{output}/human", exist_ok=True)
+    _write_bed(f"{output}/human/gene.bed", genes)
+    with open(f"{output}/human/gene_alias.tsv", "w") as f:
+        f.writelines(f"{alias}\t{symbol}\n" for alias, symbol in aliases.items() if symbol in set(genes["name"]))
+    return genes
+
+
+def make_annotations(rng: np.random.Generator, output: str, genes: pd.DataFrame, n_rows: int):
+    for biological_type, (width, spread) in annotation_widths.items():
+        chroms, centres = _near_tss(rng, genes, n_rows, 0.4)
+        widths = np.maximum(rng.lognormal(np.log(width), spread, n_rows).astype(np.int64), 1) if spread else 1
+        starts = np.maximum(centres - widths // 2, 0)
+        frame = pd.DataFrame(
+            {
+                "chrom": chroms,
+                "start": starts,
+                "end": starts + widths,
+                "name": [f"{biological_type}_{i}" for i in range(n_rows)],
+            }
+        )
+        _write_bed(f"{output}/human/human_{biological_type}.bed", frame)
+
+
+def make_trs(rng: np.random.Generator, output: str, genes: pd.DataFrame, n_trs: int, median_peaks: int):
+    directory = f"{output}/trapt/TR_bed"
+    os.makedirs(directory, exist_ok=True)
+    symbols = _names(tr_symbols, "TF", max(1, n_trs // 4))
+    for i in range(n_trs):
+        # Several samples per TR, named like the TRAPT library: SYMBOL@Sample_xx_nnnn
+        symbol = symbols[i % len(symbols)]
+        n_peaks = int(np.clip(rng.lognormal(np.log(median_peaks), 0.8), 50, median_peaks * 20))
+        chroms, centres = _near_tss(rng, genes, n_peaks, rng.uniform(0.2, 0.7))
+        frame = pd.DataFrame({"chrom": chroms, "start": np.maximum(centres - 250, 0), "end": centres + 250})
+        _write_bed(f"{directory}/{symbol}@Sample_{i % 100:02d}_{i:04d}.bed", frame)
+
+
+def _expression(rng: np.random.Generator, n_genes: int, n_samples: int, rank: int = 8) -> np.ndarray:
+    """log2(TPM + 1)-like values: gene baseline + low rank sample programmes + noise"""
+    baseline = rng.gamma(2.0, 1.5, size=(n_genes, 1))
+    programmes = rng.normal(0, 1, size=(n_genes, rank)) @ rng.normal(0, 0.4, size=(rank, n_samples))
+    noise = rng.normal(0, 0.3, size=(n_genes, n_samples))
+    return np.maximum(baseline + programmes + noise, 0).astype(np.float32)
+
+
+def _write_csv_gz(path: str, frame: pd.DataFrame):
+    with gzip.open(path, "wt", compresslevel=1) as f:
+        frame.to_csv(f, float_format="%.4g")
+
+
+def make_expression(rng: np.random.Generator, output: str, genes: pd.DataFrame, scale: dict):
+    os.makedirs(f"{output}/exp", exist_ok=True)
+    names = genes["name"].to_numpy()
+    mean_sources = {
+        "cancer_TCGA": cancers,
+        "normal_tissue_GTEx": tissues,
+        "cell_line_CCLE": [f"CCLE_{i:04d}" for i in range(scale["cell_lines"])],
+        "cell_line_ENCODE": [f"ENCODE_CL_{i:03d}" for i in range(max(10, scale["cell_lines"] // 5))],
+        "primary_cell_ENCODE": [f"ENCODE_PC_{i:03d}" for i in range(max(10, scale["cell_lines"] // 5))],
+    }
+    for source, columns in mean_sources.items():
+        frame = pd.DataFrame(_expression(rng, len(names), len(columns)), index=names, columns=columns)
+        _write_csv_gz(f"{output}/exp/{source}.csv.gz", frame)
+
+    # TCGA samples: "<cancer>_<barcode>", about one normal (11) per ten tumours (01)
+    samples = []
+    for cancer in cancers:
+        for i in range(scale["samples_per_cancer"]):
+            sample_type = "11" if i % 10 == 9 else "01"
+            samples.append(f"{cancer}_TCGA-{cancer[:2]}-{i:04d}-{sample_type}A")
+    frame = pd.DataFrame(_expression(rng, len(names), len(samples)), index=names, columns=samples)
+    feather.write_feather(
+        pa.Table.from_pandas(frame, preserve_index=True),
+        f"{output}/exp/gene_expression_TCGA.feather",
+        compression="uncompressed",
+    )
+
+
+def make_genesets(rng: np.random.Generator, output: str, genes: pd.DataFrame, n_sets: int):
+    names = genes["name"].to_numpy()
+    categories = {"KEGG": "KEGG pathways", "GO_BP": "GO biological processes", "Reactome": "Reactome pathways"}
+    class_data = {}
+    for category, n in zip(categories, (max(10, n_sets // 10), n_sets, max(10, n_sets // 3))):
+        sizes = np.clip(rng.lognormal(np.log(40), 0.9, n).astype(int), 5, min(2_000, len(names)))
+        class_data[category] = {
+            f"{category}_SET_{i}": names[rng.choice(len(names), size, replace=False)].tolist()
+            for i, size in enumerate(sizes)
+        }
+    os.makedirs(f"{output}/geneset/json", exist_ok=True)
+    with open(f"{output}/geneset/json/class_data.json", "w") as f:
+        json.dump(class_data, f)
+    with open(f"{output}/geneset/json/info_class.json", "w") as f:
+        json.dump({category: {"text": text} for category, text in categories.items()}, f)
+
+
+def _run_tool(script: str, output: str):
+    """Run one of the data preparation scripts against the generated directory"""
+    env = dict(os.environ, BIOTOOLS_DATA_DIR=output)
+    subprocess.run(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), script)],
+        env=env,
+        check=True,
+    )
+
+
+def generate(output: str, scale_name: str = "small", seed: int = 0, columnar: bool = False, tr_matrix: bool = False):
+    """Write the synthetic data tree of a scale preset to output (also used by the pytest suite)"""
+    scale = scales[scale_name]
+    rng = np.random.default_rng(seed)
+    output = os.path.abspath(output)
+
+    start = time.perf_counter()
+    genes = make_genes(rng, output, scale["genes"])
+    print(f"genes: {time.perf_counter() - start:.1f}s")
+    for name, step in [
+        ("annotations", lambda: make_annotations(rng, output, genes, scale["annotation_rows"])),
+        ("TR beds", lambda: make_trs(rng, output, genes, scale["trs"], scale["peaks"])),
+        ("expression", lambda: make_expression(rng, output, genes, scale)),
+        ("gene sets", lambda: make_genesets(rng, output, genes, scale["gene_sets"])),
+    ]:
+        start = time.perf_counter()
+        step()
+        print(f"{name}: {time.perf_counter() - start:.1f}s")
+
+    if columnar:
+        _run_tool("convert_exp.py", output)
+    if tr_matrix:
+        os.makedirs(f"{output}/trapt", exist_ok=True)
+        _run_tool("build_tr_matrix.py", output)
+
+    with open(f"{output}/bench_data.json", "w") as f:
+        json.dump({"scale": scale_name, "seed": seed, **scale}, f, indent=2)
+    print(f"Synthetic {scale_name} data written to {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic /data tree for benchmarks")
+    parser.add_argument("output", help="Output directory (used as BIOTOOLS_DATA_DIR)")
+    parser.add_argument("--scale", choices=list(scales), default="small")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--columnar", action="store_true", help="Also convert expression data with convert_exp.py")
+    parser.add_argument("--tr-matrix", action="store_true", help="Also build the rank_tr matrix with build_tr_matrix.py")
+    args = parser.parse_args()
+    generate(args.output, args.scale, args.seed, args.columnar, args.tr_matrix)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,43 @@
-from fastmcp import FastMCP
+from fastmcp import FastMCP, Context
+from fastmcp.server.middleware import CallNext, Middleware, MiddlewareContext
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
 import pandas as pd
-from typing import Optional, Union, List
+import numpy as np
+import pyarrow as pa
+import pyarrow.feather as feather
+import scipy.sparse
+import scipy.stats
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Union, List
 import os
 import asyncio
 import hashlib
+import contextlib
+import contextvars
+import csv
+import functools
 import json
+import mmap
+import re
+import shutil
+import signal
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+import warnings
+import zlib
 
 mcp = FastMCP("biotools")
 
 # Configuration
-data_docker = "/data"
+data_docker = os.environ.get("BIOTOOLS_DATA_DIR", "/data")
 workdir = "/app"
-tmp_docker = "/tmp"
+tmp_docker = os.environ.get("BIOTOOLS_TMP_DIR", "/tmp")
+port = int(os.environ.get("BIOTOOLS_PORT", "3001"))
 
 try:
     os.chdir(workdir)
@@ -28,6 +54,224 @@ def _truncate_error(msg: str, max_length: int = 200) -> str:
     except Exception:
         return "Error message too long or invalid"
 
+
+# Metrics
+log_format = os.environ.get("BIOTOOLS_LOG_FORMAT", "text")
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800)
+size_buckets = tuple(4 ** i * 256 for i in range(12))  # 256 B .. 1 GiB
+
+
+class Metrics:
+    """
+    Minimal Prometheus registry of labelled counters, gauges and histograms, rendered in the
+    text exposition format by the /metrics endpoint.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}  # name -> (type, help, buckets)
+        self._values = {}  # name -> {labels: value or [bucket counts..., sum, count]}
+
+    def describe(self, name: str, kind: str, help: str, buckets: tuple = ()):
+        self._meta[name] = (kind, help, buckets)
+        self._values.setdefault(name, {})
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values[name]
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._values[name][tuple(sorted(labels.items()))] = value
+
+    def observe(self, name: str, value: float, **labels):
+        buckets = self._meta[name][2]
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values[name]
+            if key not in series:
+                series[key] = [0] * (len(buckets) + 2)
+            counts = series[key]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, (kind, help, buckets) in self._meta.items():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in self._values[name].items():
+                    if kind != "histogram":
+                        lines.append(f"{name}{_format_labels(key)} {value}")
+                        continue
+                    for bound, count in zip(buckets, value):
+                        lines.append(f"{name}_bucket{_format_labels(key + (('le', bound),))} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(key + (('le', '+Inf'),))} {value[-1]}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {value[-2]}")
+                    lines.append(f"{name}_count{_format_labels(key)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+metrics = Metrics()
+metrics.describe("biotools_tool_calls_total", "counter", "Tool calls by outcome (ok, error reply, exception)")
+metrics.describe("biotools_tool_in_flight", "gauge", "Tool calls currently running")
+metrics.describe("biotools_tool_duration_seconds", "histogram", "Tool call latency", latency_buckets)
+metrics.describe("biotools_tool_request_bytes", "histogram", "Size of the JSON tool arguments", size_buckets)
+metrics.describe("biotools_tool_response_bytes", "histogram", "Size of the tool reply text", size_buckets)
+metrics.describe("biotools_tool_cache_hits_total", "counter", "Result and step cache hits")
+metrics.describe("biotools_tool_cache_misses_total", "counter", "Result and step cache misses")
+metrics.describe("biotools_tool_rows_scanned_total", "counter", "Genes, regions, gene sets or TRs read to answer calls")
+metrics.describe("biotools_tool_tmp_bytes_written_total", "counter", "Bytes of output files and logs written to /tmp")
+metrics.describe("biotools_tool_subprocess_cpu_seconds_total", "counter", "CPU time of commands run by the tool")
+metrics.describe(
+    "biotools_tool_subprocess_peak_rss_bytes", "histogram", "Sampled peak RSS of a command's process group", size_buckets
+)
+
+# Per-call counters of the tool call running in this context (copied into executor threads)
+tool_call = contextvars.ContextVar("tool_call", default=None)
+
+
+def _count(name: str, value: float = 1):
+    """Add to a counter of the current tool call (no-op outside a tool call)"""
+    call = tool_call.get()
+    if call is not None:
+        call["counters"][name] = call["counters"].get(name, 0) + value
+
+
+def _record_peak(name: str, value: float):
+    """Keep the largest value seen for name during the current tool call"""
+    call = tool_call.get()
+    if call is not None:
+        call["peaks"][name] = max(call["peaks"].get(name, 0), value)
+
+
+def _log(event: str, message: str, **fields):
+    """Print a log line, or one JSON object per line when BIOTOOLS_LOG_FORMAT=json"""
+    if log_format == "json":
+        print(json.dumps({"ts": round(time.time(), 3), "event": event, **fields}, default=str), flush=True)
+    else:
+        print(message)
+
+
+# Replies of tools that report failures as text instead of raising
+error_reply_prefixes = ("Error", "Execution error", "Command failed", "Command timed out")
+
+
+class ToolMetrics(Middleware):
+    """Records latency, outcome, payload sizes and per-call counters of every tool call"""
+
+    async def on_call_tool(self, context: MiddlewareContext, call_next: CallNext):
+        tool = context.message.name
+        request_bytes = len(json.dumps(context.message.arguments or {}, default=str))
+        call = {"counters": {}, "peaks": {}}
+        token = tool_call.set(call)
+        metrics.inc("biotools_tool_in_flight", 1, tool=tool)
+        start = time.perf_counter()
+        status, reply, error = "exception", "", None
+        try:
+            result = await call_next(context)
+            reply = "".join(getattr(block, "text", "") for block in result.content)
+            status = "error" if reply.startswith(error_reply_prefixes) else "ok"
+            if status == "error":
+                error = _truncate_error(reply.split("\n", 1)[0])
+            return result
+        except Exception as e:
+            error = _truncate_error(str(e))
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            tool_call.reset(token)
+            metrics.inc("biotools_tool_in_flight", -1, tool=tool)
+            metrics.inc("biotools_tool_calls_total", tool=tool, status=status)
+            metrics.observe("biotools_tool_duration_seconds", duration, tool=tool)
+            metrics.observe("biotools_tool_request_bytes", request_bytes, tool=tool)
+            metrics.observe("biotools_tool_response_bytes", len(reply.encode("utf-8")), tool=tool)
+            for name, value in call["counters"].items():
+                metrics.inc(f"biotools_tool_{name}_total", value, tool=tool)
+            for name, value in call["peaks"].items():
+                metrics.observe(f"biotools_tool_{name}", value, tool=tool)
+            if log_format == "json":
+                _log(
+                    "tool_call", "", tool=tool, status=status, duration_s=round(duration, 4),
+                    request_bytes=request_bytes, response_bytes=len(reply.encode("utf-8")),
+                    session=_session_key(context.fastmcp_context), error=error, **call["counters"], **call["peaks"],
+                )
+
+
+mcp.add_middleware(ToolMetrics())
+
+
+class LazyDataset:
+    """A dataset loaded once, on first use or by a background warm-up thread"""
+
+    def __init__(self, name: str, description: str, loader):
+        self.name = name
+        self.description = description
+        self.loader = loader
+        self.state = "cold"
+        self.value = None
+        self.error = None
+        self.load_seconds = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Return the loaded value, loading it first if needed (load errors are re-raised)"""
+        with self._lock:
+            if self.state != "warm":
+                self.state = "loading"
+                start = time.perf_counter()
+                try:
+                    self.value = self.loader()
+                    self.state = "warm"
+                    self.error = None
+                except Exception as e:
+                    self.state = "failed"
+                    self.error = _truncate_error(str(e))
+                    print(f"Warning: Failed to load {self.description}: {self.error}")
+                    raise
+                finally:
+                    self.load_seconds = time.perf_counter() - start
+            return self.value
+
+    def ensure(self) -> bool:
+        """Load the dataset if needed; returns whether it is available"""
+        try:
+            self.get()
+            return True
+        except Exception:
+            return False
+
+    def warm_in_background(self):
+        threading.Thread(target=self.ensure, name=f"warm_{self.name}", daemon=True).start()
+
+    def status(self) -> dict:
+        return {"state": self.state, "load_seconds": self.load_seconds, "error": self.error}
+
+
+datasets = {}  # name -> LazyDataset, reported by the /ready endpoint
+
+
+def _register_dataset(name: str, description: str, loader) -> LazyDataset:
+    datasets[name] = LazyDataset(name, description, loader)
+    return datasets[name]
+
+
 # Initialize global variables with safe defaults
 class_data = {}
 info_class = {}
@@ -41,15 +285,17 @@ cancer_list = ""
 execute_bash_md = "Execute bash commands"
 
 # Load geneset data
-try:
+def _load_geneset_data():
+    global class_data, info_class, geneset_types_list
     with open(f"{data_docker}/geneset/json/class_data.json", "r") as f:
         class_data = json.load(f)
 
     with open(f"{data_docker}/geneset/json/info_class.json", "r") as f:
         info_class = json.load(f)
         geneset_types_list = ", ".join(info_class.keys())
-except Exception as e:
-    print(f"Warning: Failed to load geneset data: {_truncate_error(str(e))}")
+
+
+_register_dataset("geneset", "geneset data", _load_geneset_data)
 
 # Load bed files database
 try:
@@ -70,21 +316,570 @@ try:
 except Exception as e:
     print(f"Warning: Failed to load bed data database: {_truncate_error(str(e))}")
 
-# Load TR data database
-try:
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Levenshtein distance, returning max_distance + 1 as soon as it is exceeded"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            ))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return min(previous[-1], max_distance + 1)
+
+
+class TRIndex:
+    """Trigram and symbol index over TR sample keys of the form NAME@Sample_xx"""
+
+    def __init__(self, tr_db: dict):
+        self.keys = sorted(tr_db)
+        self._lower = [key.lower() for key in self.keys]
+        self._symbol = [key.split("@", 1)[0] for key in self.keys]
+
+        self.symbols = {}  # upper-cased TR symbol -> key ids
+        self._trigrams = {}  # trigram of lower-cased key -> key ids
+        for i, key in enumerate(self._lower):
+            self.symbols.setdefault(self._symbol[i].upper(), []).append(i)
+            for trigram in _trigrams(key):
+                self._trigrams.setdefault(trigram, set()).add(i)
+
+        self._symbol_trigrams = {}  # trigram of upper-cased symbol -> symbols
+        for symbol in self.symbols:
+            for trigram in _trigrams(symbol):
+                self._symbol_trigrams.setdefault(trigram, set()).add(symbol)
+
+    def _rank(self, i: int, query: str) -> tuple:
+        """Exact symbol, symbol prefix, symbol substring, then sample-name matches"""
+        symbol = self._symbol[i].lower()
+        if symbol == query:
+            tier = 0
+        elif symbol.startswith(query):
+            tier = 1
+        elif query in symbol:
+            tier = 2
+        else:
+            tier = 3
+        return tier, len(symbol) - len(query), self._lower[i]
+
+    def search(self, keyword: str) -> List[str]:
+        """Ranked keys containing keyword (case-insensitive)"""
+        query = keyword.strip().lower()
+        if len(query) >= 3:
+            postings = sorted((self._trigrams.get(t, set()) for t in _trigrams(query)), key=len)
+            candidates = set.intersection(*postings) if postings else set()
+        else:
+            # Too short for trigrams, scan all keys
+            candidates = range(len(self.keys))
+        matches = [i for i in candidates if query in self._lower[i]]
+        return [self.keys[i] for i in sorted(matches, key=lambda i: self._rank(i, query))]
+
+    def fuzzy(self, name: str, limit: int = 10) -> List[str]:
+        """Ranked sample keys for a TR name without '@', by substring then edit distance"""
+        matches = [key for key in self.search(name) if "@" in key]
+        if matches:
+            return matches[:limit]
+
+        query = name.strip().upper()
+        max_distance = max(1, len(query) // 4)
+        candidates = set()
+        for trigram in _trigrams(query):
+            candidates |= self._symbol_trigrams.get(trigram, set())
+        if not candidates:
+            candidates = self.symbols.keys()
+        scored = sorted(
+            (distance, symbol)
+            for symbol in candidates
+            if (distance := _edit_distance(query, symbol, max_distance)) <= max_distance
+        )
+        return [self.keys[i] for _, symbol in scored for i in self.symbols[symbol]][:limit]
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def _tr_metadata(key: str) -> str:
+    """Sample metadata of a TR key: TR symbol, sample id and peak file size"""
+    symbol, _, sample = key.partition("@")
+    try:
+        size = _format_bytes(os.path.getsize(tr_data_db[key]))
+    except OSError:
+        size = "unknown"
+    return f"TR: {symbol}, sample: {sample or 'N/A'}, size: {size}"
+
+
+tr_index = TRIndex({})
+
+
+# Load TR data database and build its search index
+def _load_tr_data():
+    global tr_data_db, tr_index
     tr_data_db = dict(
         map(
             lambda x: (x.split(".")[0], f"{data_docker}/trapt/TR_bed/{x}"),
             os.listdir(f"{data_docker}/trapt/TR_bed"),
         )
     )
-except Exception as e:
-    print(f"Warning: Failed to load TR data: {_truncate_error(str(e))}")
+    tr_index = TRIndex(tr_data_db)
+
+
+_register_dataset("tr", "TR data", _load_tr_data)
+
+# TR bed delivery into /tmp: reflink, copy, hardlink or symlink
+# (reflink and hardlink fall back to an in-process copy, e.g. across mounts).
+# Reflinks are copy-on-write; hardlinks and symlinks share the database file, so an in-place
+# edit of a delivered file (>>, sed -i, sort -o) would change /data and are opt-in only
+tr_delivery_mode = os.environ.get("BIOTOOLS_TR_DELIVERY", "reflink")
+tr_delivery_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("BIOTOOLS_TR_DELIVERY_WORKERS", "8")),
+    thread_name_prefix="tr_delivery",
+)
+FICLONE = 0x40049409
+
+
+def _reflink(src: str, dst: str):
+    import fcntl
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    shutil.copystat(src, dst)
+
+
+def _deliver_file(src: str, dst: str, mode: str) -> tuple:
+    """Place src at dst without copying when possible; returns (method, bytes copied)"""
+    stat = os.stat(src)
+    if os.path.lexists(dst):
+        if os.path.islink(dst):
+            if os.readlink(dst) == src:
+                return "reused", 0
+        else:
+            existing = os.stat(dst)
+            if existing.st_size == stat.st_size and existing.st_mtime_ns == stat.st_mtime_ns:
+                return "reused", 0
+        os.remove(dst)
+
+    if mode == "symlink":
+        os.symlink(src, dst)
+        return "linked", 0
+    if mode in ("hardlink", "reflink"):
+        try:
+            os.link(src, dst) if mode == "hardlink" else _reflink(src, dst)
+            return "linked", 0
+        except OSError:
+            if os.path.lexists(dst):
+                os.remove(dst)
+
+    # shutil.copyfile uses sendfile on Linux; copystat keeps mtime for the reuse check
+    shutil.copyfile(src, dst)
+    shutil.copystat(src, dst)
+    return "copied", stat.st_size
+
+
+def _deliver_files(sources: List[str], dest_dir: str) -> tuple:
+    """
+    Deliver files into dest_dir concurrently.
+    Returns ({src: dst or exception}, summary line with time and bytes not copied).
+    """
+    start = time.perf_counter()
+    futures = {
+        src: tr_delivery_pool.submit(
+            _deliver_file, src, f"{dest_dir}/{os.path.basename(src)}", tr_delivery_mode
+        )
+        for src in dict.fromkeys(sources)
+    }
+
+    delivered = {}
+    counts = {"linked": 0, "copied": 0, "reused": 0}
+    bytes_copied = 0
+    bytes_saved = 0
+    for src, future in futures.items():
+        try:
+            method, copied = future.result()
+        except Exception as e:
+            delivered[src] = e
+            continue
+        delivered[src] = f"{dest_dir}/{os.path.basename(src)}"
+        counts[method] += 1
+        bytes_copied += copied
+        if method != "copied":
+            bytes_saved += os.path.getsize(src)
+
+    _count("tmp_bytes_written", bytes_copied)
+    summary = (
+        f"Delivered {len(futures)} file(s) via {tr_delivery_mode} "
+        f"(linked: {counts['linked']}, copied: {counts['copied']}, reused: {counts['reused']}) "
+        f"in {time.perf_counter() - start:.2f}s; "
+        f"{_format_bytes(bytes_copied)} copied, {_format_bytes(bytes_saved)} not copied"
+    )
+    return delivered, summary
 
 # Configuration
-bed_config = {"gene_bed_path": f"{data_docker}/human/gene.bed"}
+bed_config = {
+    "gene_bed_path": f"{data_docker}/human/gene.bed",
+    # Optional tab separated alias table: alias, official symbol
+    "gene_alias_path": f"{data_docker}/human/gene_alias.tsv",
+    # Arrow copy of gene.bed, refreshed when gene.bed changes; kept in /tmp with the other
+    # derived caches, since /data may be mounted read-only
+    "gene_index_path": os.environ.get("BIOTOOLS_GENE_INDEX_PATH", f"{tmp_docker}/biotools_gene_index.arrow"),
+}
 gene_expression_TCGA = f"{data_docker}/exp/gene_expression_TCGA.feather"
 
+# Load gene aliases (upper-cased alias -> official symbol)
+gene_aliases = {}
+try:
+    if os.path.exists(bed_config["gene_alias_path"]):
+        aliases = pd.read_csv(
+            bed_config["gene_alias_path"], sep="\t", header=None, usecols=[0, 1], dtype=str
+        ).dropna()
+        gene_aliases = dict(zip(aliases[0].str.strip().str.upper(), aliases[1].str.strip()))
+except Exception as e:
+    print(f"Warning: Failed to load gene aliases: {_truncate_error(str(e))}")
+
+
+class GeneSelector:
+    """Hash-based gene symbol lookup with case normalisation and alias resolution"""
+
+    def __init__(self, symbols):
+        self.symbols = pd.Index(symbols).astype(str)
+        self._rows = {}  # symbol -> row positions
+        for row, symbol in enumerate(self.symbols):
+            self._rows.setdefault(symbol, []).append(row)
+        # Reversed so that the first occurrence of a symbol wins
+        upper = self.symbols.str.upper()
+        self._upper_map = dict(zip(upper[::-1], self.symbols[::-1]))
+
+    def select(self, genes_list: List[str]) -> tuple:
+        """
+        Return (rows, unmatched, resolved): row positions of the requested genes in
+        index order, genes that could not be found, and a map of normalised/alias
+        inputs to the symbol they resolved to. Costs O(len(genes_list)).
+        """
+        rows = []
+        resolved = {}
+        unmatched = []
+        for gene in dict.fromkeys(map(str, genes_list)):
+            hit = self._rows.get(gene)
+            if hit is None:
+                # Only genes without an exact hit go through the fallback lookups
+                key = gene.strip().upper()
+                symbol = self._upper_map.get(key)
+                if symbol is None and key in gene_aliases:
+                    symbol = self._upper_map.get(gene_aliases[key].upper())
+                if symbol is None:
+                    unmatched.append(gene)
+                    continue
+                resolved[gene] = symbol
+                hit = self._rows[symbol]
+            rows.extend(hit)
+        return np.unique(np.asarray(rows, dtype=np.int64)), unmatched, resolved
+
+
+class GeneIndex:
+    """Resident gene annotation: symbol lookup plus array-backed chrom/start/end/strand"""
+
+    def __init__(self, frame: pd.DataFrame):
+        self.frame = frame
+        self.selector = GeneSelector(frame[4])
+        self.chrom = frame[0].astype(str).to_numpy()
+        self.start = frame[1].to_numpy(dtype=np.int64)
+        self.end = frame[2].to_numpy(dtype=np.int64)
+        self.name = self.selector.symbols.to_numpy()
+
+        # Strand is the first column holding only +/-/. values, if any
+        self.strand = np.full(len(frame), "+", dtype=object)
+        for column in frame.columns[3:]:
+            values = frame[column].astype(str)
+            if len(frame) and values.isin(["+", "-", "."]).all():
+                self.strand = values.to_numpy()
+                break
+
+    def regions(self, rows: Optional[np.ndarray], region: str, upstream: int, downstream: int) -> tuple:
+        """
+        Strand-aware (chrom, start, end, name, strand) arrays for the selected genes.
+        region "tss" is the transcription start base, "gene_body" the whole gene; both are
+        extended by upstream/downstream bp relative to the gene strand.
+        """
+        rows = slice(None) if rows is None else rows
+        start, end, strand = self.start[rows], self.end[rows], self.strand[rows]
+        minus = strand == "-"
+        if region == "tss":
+            start = np.where(minus, end - 1, start)
+            end = start + 1
+        new_start = np.where(minus, start - downstream, start - upstream)
+        new_end = np.where(minus, end + upstream, end + downstream)
+        return self.chrom[rows], np.maximum(new_start, 0), new_end, self.name[rows], strand
+
+
+def _load_gene_frame(path: str, sidecar: str) -> pd.DataFrame:
+    """Read gene.bed, through its Arrow sidecar when that is up to date (written if possible)"""
+    fingerprint = json.dumps(_file_fingerprint(path)).encode("utf-8")
+    try:
+        table = feather.read_table(sidecar, memory_map=True)
+        if (table.schema.metadata or {}).get(b"source") == fingerprint:
+            frame = table.to_pandas()
+            frame.columns = range(frame.shape[1])
+            return frame
+    except (OSError, pa.ArrowInvalid):
+        pass
+
+    frame = pd.read_csv(path, index_col=None, header=None, sep="\t")
+    try:
+        table = pa.Table.from_pandas(frame.rename(columns=str), preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"source": fingerprint})
+        feather.write_feather(table, f"{sidecar}.tmp", compression="uncompressed")
+        os.replace(f"{sidecar}.tmp", sidecar)
+    except OSError as e:
+        print(f"Warning: Failed to write gene index sidecar: {_truncate_error(str(e))}")
+    return frame
+
+
+_register_dataset(
+    "gene_index",
+    "gene annotation",
+    lambda: GeneIndex(_load_gene_frame(bed_config["gene_bed_path"], bed_config["gene_index_path"])),
+)
+
+
+def _gene_index() -> GeneIndex:
+    """Gene annotation index, loaded on first use and kept resident"""
+    return datasets["gene_index"].get()
+
+
+def _expand_ranges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Concatenation of arange(start, end) for each pair, without a Python loop"""
+    counts = ends - starts
+    offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return np.arange(counts.sum(), dtype=np.int64) + offsets
+
+
+@functools.lru_cache(maxsize=4)
+def _log_factorials(n: int) -> np.ndarray:
+    return np.concatenate(([0.0], np.cumsum(np.log(np.arange(1, n + 1, dtype=np.float64)))))
+
+
+def _hypergeom_sf(overlap, population: int, successes, draws) -> np.ndarray:
+    """
+    P(X >= overlap) for X ~ Hypergeometric(population, successes, draws), vectorised over
+    overlap/successes/draws: the first pmf term comes from a log-factorial table, the rest of
+    the tail from the pmf ratio recurrence, dropping cells once their remaining terms no
+    longer change the sum. Matches scipy.stats.hypergeom.sf (see tests/test_enrichment.py),
+    which evaluates cells one at a time and is about 100x slower on geneset x list grids.
+    """
+    overlap, successes, draws = (np.asarray(a, dtype=np.int64) for a in np.broadcast_arrays(overlap, successes, draws))
+    shape = overlap.shape
+    overlap, successes, draws = overlap.ravel(), successes.ravel(), draws.ravel()
+    lower = np.maximum(0, draws + successes - population)
+    upper = np.minimum(successes, draws)
+    p = np.where(overlap <= lower, 1.0, 0.0)
+
+    # Tails that do not start at the lower bound of the support (and are not empty)
+    cells = np.flatnonzero((overlap > lower) & (overlap <= upper))
+    if len(cells):
+        lf = _log_factorials(int(population))
+        x, s, d = overlap[cells], successes[cells], draws[cells]
+        log_scale = (
+            lf[s] - lf[x] - lf[s - x]
+            + lf[population - s] - lf[d - x] - lf[population - s - d + x]
+            - (lf[population] - lf[d] - lf[population - d])
+        )
+        x, s, d = x.astype(np.float64), s.astype(np.float64), d.astype(np.float64)
+        term = np.ones(len(cells))
+        total = np.ones(len(cells))
+        active = np.arange(len(cells))
+        while len(active):
+            xa = x[active]
+            term[active] *= (s[active] - xa) * (d[active] - xa) / ((xa + 1) * (population - s[active] - d[active] + xa + 1))
+            x[active] += 1
+            total[active] += term[active]
+            # Terms are relative to the first one; rescale before they could overflow
+            big = active[total[active] > 1e200]
+            term[big] /= 1e200
+            total[big] /= 1e200
+            log_scale[big] += np.log(1e200)
+            active = active[term[active] > total[active] * 1e-17]
+        p[cells] = np.exp(log_scale + np.log(total))
+    return np.clip(p, 0.0, 1.0).reshape(shape)
+
+
+def _bh_fdr(p: np.ndarray) -> np.ndarray:
+    """Benjamini-Hochberg adjusted p-values along the last axis"""
+    if p.shape[-1] == 0:
+        return p.copy()
+    return scipy.stats.false_discovery_control(p, axis=-1, method="bh")
+
+
+class GenesetMatrix:
+    """
+    One geneset category of class_data as a geneset x gene bit matrix, packed 8 genes per
+    byte. The gene universe is the union of the category's genesets.
+    """
+
+    def __init__(self, genesets: dict):
+        self.names = np.asarray(list(genesets), dtype=object)
+        members = [list(dict.fromkeys(map(str, genes))) for genes in genesets.values()]
+        self.genes = np.asarray(sorted({gene for genes in members for gene in genes}), dtype=object)
+        self.selector = GeneSelector(self.genes)
+        position = {gene: i for i, gene in enumerate(self.genes)}
+
+        rows = np.repeat(np.arange(len(members)), [len(genes) for genes in members])
+        columns = np.fromiter((position[gene] for genes in members for gene in genes), dtype=np.int64, count=len(rows))
+        self.bits = np.zeros((len(members), (len(self.genes) + 7) // 8), dtype=np.uint8)
+        np.bitwise_or.at(self.bits, (rows, columns >> 3), (128 >> (columns & 7)).astype(np.uint8))
+        self.sizes = np.bincount(rows, minlength=len(members))
+
+    def membership(self, columns: np.ndarray) -> np.ndarray:
+        """geneset x len(columns) 0/1 matrix for the given gene columns"""
+        return (self.bits[:, columns >> 3] >> (7 - (columns & 7)).astype(np.uint8)) & 1
+
+    def enrich(self, queries: List[np.ndarray], pvalue: float, fdr: float, bonferroni: float) -> List[pd.DataFrame]:
+        """
+        Hypergeometric enrichment of every gene list (gene columns) against every geneset,
+        in one pass over the concatenated lists. Returns, per list, the genesets sharing at
+        least one gene and passing all three thresholds, sorted by p-value.
+        """
+        draws = np.array([len(columns) for columns in queries], dtype=np.int64)
+        columns = np.concatenate(queries) if len(queries) else np.zeros(0, dtype=np.int64)
+        hits = self.membership(columns)
+        bounds = np.concatenate(([0], np.cumsum(draws)))
+        overlap = np.zeros((len(queries), len(self.names)), dtype=np.int64)
+        nonempty = draws > 0  # reduceat cannot express empty segments
+        if nonempty.any():
+            overlap[nonempty] = np.add.reduceat(hits, bounds[:-1][nonempty], axis=1, dtype=np.int64).T
+
+        p = _hypergeom_sf(overlap, len(self.genes), self.sizes[None, :], draws[:, None])
+        q = _bh_fdr(p)
+        adjusted = np.minimum(p * len(self.names), 1.0)
+        keep = (overlap > 0) & (p <= pvalue) & (q <= fdr) & (adjusted <= bonferroni)
+
+        results = []
+        for i in range(len(queries)):
+            rows = np.flatnonzero(keep[i])
+            rows = rows[np.lexsort((-overlap[i, rows], p[i, rows]))]
+            genes = self.genes[queries[i]]
+            segment = hits[rows, bounds[i]:bounds[i + 1]].astype(bool)
+            results.append(
+                pd.DataFrame(
+                    {
+                        "geneset": self.names[rows],
+                        "geneset_size": self.sizes[rows],
+                        "overlap": overlap[i, rows],
+                        "list_size": draws[i],
+                        "p_value": p[i, rows],
+                        "fdr": q[i, rows],
+                        "bonferroni": adjusted[i, rows],
+                        "overlap_genes": [",".join(genes[members]) for members in segment],
+                    }
+                )
+            )
+        return results
+
+
+geneset_matrices = {}  # category -> GenesetMatrix, built on first use
+geneset_matrix_lock = threading.Lock()
+
+
+def _geneset_matrix(category: str) -> GenesetMatrix:
+    with geneset_matrix_lock:
+        matrix = geneset_matrices.get(category)
+        if matrix is None:
+            matrix = geneset_matrices[category] = GenesetMatrix(class_data[category])
+        return matrix
+
+
+def _tr_matrix_labels_path(path: str) -> str:
+    """TR/gene labels written next to the matrix .npz by build_tr_matrix.py"""
+    return f"{os.path.splitext(path)[0]}.labels.json"
+
+
+class TRMatrix:
+    """
+    TR x gene regulatory potential matrix written by build_tr_matrix.py: a scipy.sparse CSC
+    matrix (columns are genes, so a gene set is scored by slicing its columns only) and a
+    JSON file with its TR and gene labels.
+    """
+
+    def __init__(self, path: str):
+        self.matrix = scipy.sparse.load_npz(path).tocsc()
+        with open(_tr_matrix_labels_path(path), "r") as f:
+            labels = json.load(f)
+        self.trs = np.asarray(labels["trs"], dtype=str)
+        genes = np.asarray(labels["genes"], dtype=str)
+        if self.matrix.shape != (len(self.trs), len(genes)):
+            raise ValueError(f"{path} does not match its labels, rebuild it with build_tr_matrix.py")
+        self.window = labels["window"]
+        self.gene_bed = labels["gene_bed"]
+        self.selector = GeneSelector(genes)
+        self.n_genes = len(genes)
+
+        # Per-TR totals for the background distribution of regulatory potential
+        weights = self.matrix.astype(np.float64)
+        self.row_sum = np.asarray(weights.sum(axis=1)).ravel()
+        self.row_sumsq = np.asarray(weights.multiply(weights).sum(axis=1)).ravel()
+        self.row_nnz = self.matrix.getnnz(axis=1)
+
+    def score(self, rows: np.ndarray) -> pd.DataFrame:
+        """
+        Rank all TRs for a gene set (gene column positions): score is the z-score of the
+        set's mean regulatory potential against all genes; p_value is the hypergeometric
+        probability of at least bound_genes of the set lying within the window of the TR's peaks.
+        """
+        n, k = len(self.trs), len(rows)
+        columns = self.matrix[:, rows]
+        query_sum = np.asarray(columns.sum(axis=1, dtype=np.float64)).ravel()
+        bound = columns.getnnz(axis=1)
+
+        mean = self.row_sum / self.n_genes
+        std = np.sqrt(np.maximum(self.row_sumsq / self.n_genes - mean**2, 0.0))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            score = np.where(std > 0, (query_sum / k - mean) / (std / np.sqrt(k)), 0.0)
+
+        ranking = pd.DataFrame(
+            {
+                "TR": self.trs,
+                "score": score,
+                "query_mean_rp": query_sum / k,
+                "background_mean_rp": mean,
+                "bound_genes": bound,
+                "target_genes": self.row_nnz,
+                "p_value": _hypergeom_sf(bound, self.n_genes, self.row_nnz, k),
+            }
+        ).sort_values(["score", "p_value"], ascending=[False, True], kind="stable")
+        ranking.insert(0, "rank", np.arange(1, n + 1))
+        return ranking
+
+
+# TR x gene regulatory potential matrix, optional: built offline by build_tr_matrix.py
+tr_matrix_path = os.environ.get("BIOTOOLS_TR_MATRIX_PATH", f"{data_docker}/trapt/tr_gene_rp.npz")
+
+
+def _tr_matrix() -> TRMatrix:
+    """TR matrix, loaded on first use and kept resident (registered once the file exists)"""
+    if "tr_matrix" not in datasets:
+        if not os.path.exists(tr_matrix_path):
+            raise FileNotFoundError(f"{tr_matrix_path} (build it with build_tr_matrix.py)")
+        _register_dataset("tr_matrix", "TR regulatory potential matrix", lambda: TRMatrix(tr_matrix_path))
+    return datasets["tr_matrix"].get()
+
+
+if os.path.exists(tr_matrix_path):
+    _register_dataset("tr_matrix", "TR regulatory potential matrix", lambda: TRMatrix(tr_matrix_path))
+
+
 # Expression data databases
 try:
     exp_data_db = {
@@ -98,6 +893,528 @@ try:
 except Exception as e:
     print(f"Warning: Failed to load expression data databases: {_truncate_error(str(e))}")
 
+# Expression store configuration (memory cap shared by all resident matrices)
+exp_store_max_bytes = int(os.environ.get("BIOTOOLS_EXP_STORE_MB", "8192")) * 1024 * 1024
+# Arrow IPC copies written by convert_exp.py (TCGA is partitioned by cancer type)
+exp_columnar_dir = os.environ.get("BIOTOOLS_EXP_COLUMNAR_DIR", f"{data_docker}/exp/columnar")
+
+
+class ExpressionMatrix:
+    """Gene x sample expression matrix with hash indexes over genes and sample prefixes"""
+
+    def __init__(self, genes, samples, nbytes: int, frame=None, table=None, fields=None):
+        self.genes = pd.Index(genes)
+        self.samples = pd.Index(samples).astype(str)
+        self.nbytes = nbytes
+        self._frame = frame
+        self._table = table
+        self._fields = np.asarray(fields) if fields is not None else None
+        self._prefix_columns = {}
+        self._selector = None
+
+    @property
+    def selector(self) -> GeneSelector:
+        """Gene selector over the row index, built on first use"""
+        if self._selector is None:
+            self._selector = GeneSelector(self.genes)
+        return self._selector
+
+    def prefix_columns(self, prefix: str) -> np.ndarray:
+        """Column positions of samples whose name starts with prefix (memoized)"""
+        columns = self._prefix_columns.get(prefix)
+        if columns is None:
+            columns = np.flatnonzero(self.samples.str.startswith(prefix))
+            self._prefix_columns[prefix] = columns
+        return columns
+
+    def take(self, rows: Optional[np.ndarray] = None, columns: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Materialize only the selected rows and columns as a DataFrame"""
+        _count("rows_scanned", len(self.genes) if rows is None else len(rows))
+        if self._frame is not None:
+            return self._frame.iloc[
+                slice(None) if rows is None else rows,
+                slice(None) if columns is None else columns,
+            ]
+
+        fields = self._fields if columns is None else self._fields[columns]
+        table = self._table.select(fields.tolist())
+        if rows is not None:
+            table = table.take(pa.array(rows, type=pa.int64()))
+        exp = table.to_pandas()
+        exp.index = self.genes if rows is None else self.genes[rows]
+        exp.columns = self.samples if columns is None else self.samples[columns]
+        return exp
+
+
+def _load_expression_matrix(path: str) -> ExpressionMatrix:
+    """Load an expression file; Arrow/feather files are memory-mapped instead of copied"""
+    if path.endswith((".feather", ".arrow")):
+        table = feather.read_table(path, memory_map=True)
+        # Count the mapped buffers: heap allocations stay near zero for uncompressed files
+        nbytes = table.nbytes
+
+        pandas_metadata = table.schema.pandas_metadata or {}
+        index_columns = [
+            name for name in pandas_metadata.get("index_columns", []) if isinstance(name, str)
+        ]
+        gene_field = index_columns[0] if index_columns else table.schema.names[0]
+        fields = [
+            i for i, name in enumerate(table.schema.names)
+            if name != gene_field and name not in index_columns
+        ]
+        genes = pd.Index(table.column(gene_field).to_pandas())
+        # Unnamed pandas indexes are stored as "__index_level_N__"
+        genes.name = None if gene_field.startswith("__index_level_") else gene_field
+        return ExpressionMatrix(
+            genes=genes,
+            samples=[table.schema.names[i] for i in fields],
+            nbytes=nbytes,
+            table=table,
+            fields=fields,
+        )
+
+    frame = pd.read_csv(path, index_col=0)
+    return ExpressionMatrix(
+        genes=frame.index,
+        samples=frame.columns,
+        nbytes=int(frame.memory_usage(index=True).sum()),
+        frame=frame,
+    )
+
+
+class ExpressionStore:
+    """In-process LRU cache of expression matrices, one entry per data source"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._matrices = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def get(self, name: str, path: str) -> ExpressionMatrix:
+        with self._lock:
+            if name in self._matrices:
+                self._matrices.move_to_end(name)
+                return self._matrices[name]
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # Concurrent requests for the same source wait for a single load
+        with load_lock:
+            with self._lock:
+                if name in self._matrices:
+                    self._matrices.move_to_end(name)
+                    return self._matrices[name]
+
+            matrix = _load_expression_matrix(path)
+
+            with self._lock:
+                self._matrices[name] = matrix
+                self._evict(keep=name)
+            return matrix
+
+    def _evict(self, keep: str):
+        """Drop least recently used sources until the memory cap is respected"""
+        total = sum(matrix.nbytes for matrix in self._matrices.values())
+        for name in list(self._matrices):
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            total -= self._matrices.pop(name).nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sources": list(self._matrices),
+                "nbytes": sum(matrix.nbytes for matrix in self._matrices.values()),
+                "max_bytes": self.max_bytes,
+            }
+
+
+exp_store = ExpressionStore(exp_store_max_bytes)
+
+
+def _expression_source(name: str, legacy_path: str, partition: Optional[str] = None) -> tuple:
+    """Resolve a data source to its columnar copy if converted, else to the legacy file"""
+    candidates = []
+    if partition:
+        candidates.append((f"{name}/{partition}", f"{exp_columnar_dir}/{name}/{partition}.arrow"))
+    candidates.append((name, f"{exp_columnar_dir}/{name}.arrow"))
+    for key, path in candidates:
+        if os.path.exists(path):
+            return key, path
+    return name, legacy_path
+
+
+# Result cache configuration
+result_cache_max_bytes = int(os.environ.get("BIOTOOLS_RESULT_CACHE_MB", "2048")) * 1024 * 1024
+result_cache_max_age = float(os.environ.get("BIOTOOLS_RESULT_CACHE_MAX_AGE_H", "72")) * 3600
+result_cache_index_path = f"{tmp_docker}/.biotools_result_cache.json"
+# Artifacts written by the data tools, swept by age even when they are not in the index
+result_artifact_pattern = re.compile(
+    r"^(gene_position|TCGA_[\w-]+_exp|exp_genes|annotation_[\w-]+|gene_regions_\w+|tr_rank|enrichment_[\w-]+"
+    r"|\w+_batch|expression_stats_\w+)_md5_[0-9a-f]{32}\.(bed|csv|tsv|json|parquet|feather|bed\.gz|bed\.gz\.tbi)$"
+)
+
+
+def _file_fingerprint(path: str) -> list:
+    """Cheap content fingerprint of a source file: path, mtime and size"""
+    try:
+        stat = os.stat(path)
+        return [path, stat.st_mtime_ns, stat.st_size]
+    except OSError:
+        return [path, None, None]
+
+
+def _genes_cache_arg(genes: Union[List[str], str]) -> Union[List[str], str]:
+    """Normalise a validated genes input for cache keys (file inputs are hashed by content)"""
+    if isinstance(genes, list):
+        return sorted(set(genes))
+    if genes == "all":
+        return genes
+    with open(genes, "rb") as f:
+        return f"md5:{hashlib.md5(f.read()).hexdigest()}"
+
+
+# Output formats of the data tools; "bed.gz" is block gzip (BGZF) with a tabix index
+expression_formats = ("csv", "parquet", "feather")
+position_formats = ("bed", "parquet", "feather", "bed.gz")
+tabix_path = os.environ.get("BIOTOOLS_TABIX") or shutil.which("tabix") or "/opt/conda/bin/tabix"
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+
+def _tmp_path(path: str) -> str:
+    """Per-writer temporary name next to path, keeping its extension"""
+    directory, name = os.path.split(path)
+    stem, _, extension = name.partition(".")
+    return f"{directory}/{stem}.tmp{os.getpid()}_{threading.get_ident()}.{extension}"
+
+
+def _write_atomic(path: str, write):
+    """Call write(tmp_path) and rename the result into place, so readers never see partial files"""
+    tmp_path = _tmp_path(path)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+        _count("tmp_bytes_written", os.path.getsize(path))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _write_bgzf(path: str, data: bytes, block_size: int = 0xFF00):
+    """Write data as BGZF (what bgzip produces): gzip members of at most 64 KB with a BC extra field"""
+    with open(path, "wb") as f:
+        for offset in range(0, len(data), block_size):
+            block = data[offset:offset + block_size]
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+            compressed = compressor.compress(block) + compressor.flush()
+            f.write(struct.pack("<4BI2BH2BHH", 31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, len(compressed) + 25))
+            f.write(compressed)
+            f.write(struct.pack("<2I", zlib.crc32(block), len(block)))
+        f.write(BGZF_EOF)
+
+
+def _write_expression(frame: pd.DataFrame, path: str, fmt: str):
+    """Expression table; CSV keeps the gene index as first column, binary formats name it "gene" """
+    if fmt == "csv":
+        _write_atomic(path, frame.to_csv)
+        return
+    table = frame.reset_index(names="gene")
+    table.columns = table.columns.astype(str)
+    if fmt == "parquet":
+        _write_atomic(path, lambda tmp_path: table.to_parquet(tmp_path, index=False))
+    else:
+        _write_atomic(path, lambda tmp_path: table.to_feather(tmp_path, compression="uncompressed"))
+
+
+def _write_positions(frame: pd.DataFrame, path: str, fmt: str) -> str:
+    """BED-like positions (chrom, start, end, ...) in fmt; returns a note for the reply"""
+    if fmt == "bed":
+        _write_atomic(path, lambda tmp_path: frame.to_csv(tmp_path, header=False, index=False, sep="\t"))
+        return ""
+    if fmt in ("parquet", "feather"):
+        table = frame.reset_index(drop=True)
+        table.columns = ["chrom", "start", "end"] + [f"column_{i + 1}" for i in range(3, frame.shape[1])]
+        if fmt == "parquet":
+            _write_atomic(path, lambda tmp_path: table.to_parquet(tmp_path, index=False))
+        else:
+            _write_atomic(path, lambda tmp_path: table.to_feather(tmp_path, compression="uncompressed"))
+        return ""
+
+    # bed.gz: tabix needs the records sorted by chromosome and start
+    data = frame.sort_values([frame.columns[0], frame.columns[1]], kind="stable").to_csv(
+        header=False, index=False, sep="\t"
+    ).encode("utf-8")
+    tmp_path = _tmp_path(path)
+    try:
+        _write_bgzf(tmp_path, data)
+        indexed = False
+        if os.path.exists(tabix_path):
+            proc = subprocess.run([tabix_path, "-f", "-p", "bed", tmp_path], capture_output=True, text=True)
+            indexed = proc.returncode == 0
+        # Data first: tabix warns about indexes older than their data file
+        os.replace(tmp_path, path)
+        if indexed:
+            os.replace(f"{tmp_path}.tbi", f"{path}.tbi")
+    finally:
+        for leftover in (tmp_path, f"{tmp_path}.tbi"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    if not indexed:
+        return "\nNote: tabix is not available, the bgzipped BED file has no .tbi index"
+    return f"\nNote: tabix index: {path}.tbi"
+
+
+class ResultCache:
+    """
+    Content-addressed cache of tool output files in /tmp.
+
+    Entries are keyed by tool name, normalised arguments and source file fingerprints,
+    and are evicted by last access age and total size.
+    """
+
+    def __init__(self, index_path: str, max_bytes: int, max_age: float):
+        self.index_path = index_path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self._load()
+
+    def key(self, tool: str, args: dict, sources: List[str]) -> str:
+        payload = {
+            "tool": tool,
+            "args": args,
+            "sources": [_file_fingerprint(path) for path in sources],
+        }
+        return hashlib.md5(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                try:
+                    valid = os.path.getsize(entry["path"]) == entry["size"]
+                except OSError:
+                    valid = False
+                if valid:
+                    entry["atime"] = time.time()
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    _count("cache_hits")
+                    return entry["result"]
+                del self._entries[key]
+            self.misses += 1
+            _count("cache_misses")
+            return None
+
+    def put(self, key: str, path: str, result: str):
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        with self._lock:
+            self._entries[key] = {"path": path, "result": result, "size": size, "atime": time.time()}
+            self._entries.move_to_end(key)
+            self._evict(keep=key)
+            self._save()
+
+    def evict(self):
+        """Apply the size and age bounds (and sweep untracked artifacts) now"""
+        with self._lock:
+            self._evict()
+            self._save()
+
+    def _evict(self, keep: Optional[str] = None):
+        """Remove expired and least recently used artifacts until the size cap is respected"""
+        now = time.time()
+        total = sum(entry["size"] for entry in self._entries.values())
+        for key in list(self._entries):
+            entry = self._entries[key]
+            if now - entry["atime"] <= self.max_age and total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            self._remove(key)
+            total -= entry["size"]
+
+        # Sweep untracked artifacts (e.g. from older server versions) at most once an hour
+        if now - self._last_sweep < 3600:
+            return
+        self._last_sweep = now
+        tracked = {entry["path"] for entry in self._entries.values()}
+        try:
+            with os.scandir(tmp_docker) as entries:
+                for file in entries:
+                    if not result_artifact_pattern.match(file.name) or file.path in tracked:
+                        continue
+                    if now - file.stat().st_mtime > self.max_age:
+                        os.remove(file.path)
+                        self.evictions += 1
+        except OSError as e:
+            print(f"Warning: Failed to sweep result cache: {_truncate_error(str(e))}")
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        for path in (entry["path"], f"{entry['path']}.tbi"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.evictions += 1
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r") as f:
+                entries = json.load(f)
+            for key, entry in sorted(entries.items(), key=lambda item: item[1]["atime"]):
+                if os.path.exists(entry["path"]):
+                    self._entries[key] = entry
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Warning: Failed to load result cache index: {_truncate_error(str(e))}")
+
+    def _save(self):
+        try:
+            tmp_path = f"{self.index_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.index_path)
+        except Exception as e:
+            print(f"Warning: Failed to save result cache index: {_truncate_error(str(e))}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(entry["size"] for entry in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+result_cache = ResultCache(result_cache_index_path, result_cache_max_bytes, result_cache_max_age)
+_register_dataset("result_cache", "result cache", result_cache.evict)
+
+
+class IntervalIndex:
+    """
+    Overlap index over a BED file: per-chromosome arrays sorted by start with a running
+    maximum of ends, plus byte offsets of each line so hits are written verbatim.
+    """
+
+    chunk_size = 64 * 1024 * 1024
+
+    def __init__(self, path: str):
+        self.path = path
+        # Taken before reading, so a file replaced while the index is built looks changed
+        self.fingerprint = _file_fingerprint(path)
+        self.chroms = {}  # chrom -> (starts, ends, max_ends, line ids), sorted by start
+        self._mm = None
+        self._line_starts = np.zeros(0, dtype=np.int64)
+        self._line_ends = np.zeros(0, dtype=np.int64)
+        if os.path.getsize(path) == 0:
+            return
+
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        size = len(self._mm)
+
+        # Line boundaries, scanned in chunks to bound temporary memory
+        newlines = []
+        for offset in range(0, size, self.chunk_size):
+            chunk = np.frombuffer(self._mm, dtype=np.uint8, count=min(self.chunk_size, size - offset), offset=offset)
+            newlines.append(np.flatnonzero(chunk == 10) + offset)
+        newlines = np.concatenate(newlines)
+        line_starts = np.concatenate(([0], newlines + 1))
+        line_ends = np.concatenate((newlines, [size]))
+        if line_starts[-1] == size:
+            line_starts, line_ends = line_starts[:-1], line_ends[:-1]
+
+        # Skip blank, comment, track and browser lines
+        skip = [
+            i for i in np.flatnonzero(
+                (line_starts == line_ends)
+                | np.isin(np.frombuffer(self._mm, dtype=np.uint8)[line_starts], list(b"#tb"))
+            )
+            if line_starts[i] == line_ends[i]
+            or self._mm[line_starts[i]:line_starts[i] + 1] == b"#"
+            or self._mm[line_starts[i]:line_starts[i] + 6] in (b"track ", b"track\t")
+            or self._mm[line_starts[i]:line_starts[i] + 8] in (b"browser ", b"browser\t")
+        ]
+        data_lines = np.setdiff1d(np.arange(len(line_starts)), skip)
+        self._line_starts = line_starts[data_lines]
+        self._line_ends = line_ends[data_lines]
+
+        bed = pd.read_csv(
+            path, sep="\t", header=None, usecols=[0, 1, 2], skiprows=skip,
+            skip_blank_lines=False, quoting=csv.QUOTE_NONE,
+            dtype={0: str, 1: np.int64, 2: np.int64},
+        )
+        if len(bed) != len(data_lines):
+            raise ValueError(f"Unexpected BED layout in {path}")
+
+        for chrom, group in bed.groupby(0, sort=False):
+            order = np.argsort(group[1].to_numpy(), kind="stable")
+            starts = group[1].to_numpy()[order]
+            ends = group[2].to_numpy()[order]
+            self.chroms[chrom] = (starts, ends, np.maximum.accumulate(ends), group.index.to_numpy()[order])
+
+    def __len__(self) -> int:
+        return len(self._line_starts)
+
+    def overlaps(self, chrom: str, start: int, end: int) -> np.ndarray:
+        """Line ids of intervals overlapping [start, end), in start order"""
+        arrays = self.chroms.get(chrom)
+        if arrays is None:
+            return np.zeros(0, dtype=np.int64)
+        starts, ends, max_ends, lines = arrays
+        # Intervals before `first` all end at or before start; from `last` on they start at or after end
+        first = np.searchsorted(max_ends, start, side="right")
+        last = np.searchsorted(starts, end, side="left")
+        if first >= last:
+            return np.zeros(0, dtype=np.int64)
+        hits = np.flatnonzero(ends[first:last] > start) + first
+        return lines[hits]
+
+    def line(self, line_id: int) -> bytes:
+        return self._mm[self._line_starts[line_id]:self._line_ends[line_id]].rstrip(b"\r")
+
+
+annotation_indexes = {}
+annotation_index_lock = threading.Lock()
+annotation_index_load_locks = {}
+
+
+def _annotation_index(biological_type: str) -> IntervalIndex:
+    """
+    Interval index of a bed_data_db entry, built on first use and kept resident until the
+    BED file's fingerprint changes
+    """
+    path = bed_data_db[biological_type]
+    fingerprint = _file_fingerprint(path)
+    with annotation_index_lock:
+        index = annotation_indexes.get(biological_type)
+        if index is not None and index.fingerprint == fingerprint:
+            return index
+        load_lock = annotation_index_load_locks.setdefault(biological_type, threading.Lock())
+
+    with load_lock:
+        index = annotation_indexes.get(biological_type)
+        if index is None or index.fingerprint != _file_fingerprint(path):
+            index = IntervalIndex(path)
+            with annotation_index_lock:
+                annotation_indexes[biological_type] = index
+        return index
+
+
 # Global lists
 try:
     with open("cli_prompt.md", "r", encoding="utf8") as file:
@@ -105,11 +1422,115 @@ try:
 except Exception as e:
     print(f"Warning: Failed to load CLI prompt: {_truncate_error(str(e))}")
 
+
+
+def _expression_columns(name: str, legacy_path: str) -> List[str]:
+    """Sample/column names of a data source, read from the file header or Arrow schema only"""
+    _, path = _expression_source(name, legacy_path)
+    if path.endswith((".feather", ".arrow")):
+        schema = pa.ipc.open_file(pa.memory_map(path)).schema
+        index_columns = (schema.pandas_metadata or {}).get("index_columns", [])
+        return [name for name in schema.names if name not in index_columns]
+    return pd.read_csv(path, index_col=0, nrows=0).columns.tolist()
+
+
 try:
-    cancer_list = ", ".join(pd.read_csv(exp_data_db["cancer_TCGA"], index_col=0).columns)
+    cancer_list = ", ".join(_expression_columns("cancer_TCGA", exp_data_db["cancer_TCGA"]))
 except Exception as e:
     print(f"Warning: Failed to load cancer list: {_truncate_error(str(e))}")
 
+# Startup mode: "eager" loads every dataset before serving, "background" warms them
+# once the server starts listening and "lazy" loads each dataset on first use
+startup_mode = os.environ.get("BIOTOOLS_STARTUP", "background")
+# Datasets loaded at startup, which /ready waits for (none in lazy mode)
+startup_datasets = [] if startup_mode == "lazy" else list(datasets)
+if startup_mode == "eager":
+    for name in startup_datasets:
+        datasets[name].ensure()
+
+
+class ToolExecutor:
+    """
+    Runs blocking tool bodies on a thread pool, off the event loop, with per-tool
+    concurrency limits and queue metrics (updated on the event loop thread only).
+    """
+
+    def __init__(self, name: str, workers: int, default_limit: int, limits: dict):
+        self.name = name
+        self.default_limit = default_limit
+        self.limits = limits
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._semaphores = {}
+        self._stats = {}
+
+    async def run(self, tool: str, fn, *args, **kwargs):
+        if tool not in self._semaphores:
+            self._semaphores[tool] = asyncio.Semaphore(self.limits.get(tool, self.default_limit))
+            self._stats[tool] = {
+                "waiting": 0, "running": 0, "completed": 0,
+                "wait_seconds": 0.0, "max_wait_seconds": 0.0,
+            }
+        semaphore = self._semaphores[tool]
+        stats = self._stats[tool]
+
+        queued = time.perf_counter()
+        stats["waiting"] += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            stats["waiting"] -= 1
+        wait = time.perf_counter() - queued
+        stats["wait_seconds"] += wait
+        stats["max_wait_seconds"] = max(stats["max_wait_seconds"], wait)
+
+        stats["running"] += 1
+        try:
+            # run_in_executor does not carry context variables over, so the tool call's counters would be lost
+            loop = asyncio.get_running_loop()
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(self._executor, functools.partial(context.run, fn, *args, **kwargs))
+        finally:
+            stats["running"] -= 1
+            stats["completed"] += 1
+            semaphore.release()
+
+    def stats(self) -> dict:
+        return {tool: dict(stats, limit=self.limits.get(tool, self.default_limit)) for tool, stats in self._stats.items()}
+
+
+def _parse_tool_limits(value: str) -> dict:
+    """Parse "tool=limit,tool=limit" overrides"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        tool, _, limit = item.partition("=")
+        limits[tool.strip()] = int(limit)
+    return limits
+
+
+# Heavy data tools and cheap lookups get separate pools, so lookups never queue behind data loads
+tool_limits = {
+    "get_tcga_cancer_express": 2,
+    "get_mean_express_data": 2,
+    "query_annotation_regions": 2,
+    **_parse_tool_limits(os.environ.get("BIOTOOLS_TOOL_LIMITS", "")),
+}
+data_executor = ToolExecutor(
+    "data_tools", int(os.environ.get("BIOTOOLS_DATA_WORKERS", "4")), default_limit=4, limits=tool_limits
+)
+lookup_executor = ToolExecutor(
+    "lookup_tools", int(os.environ.get("BIOTOOLS_LOOKUP_WORKERS", "4")), default_limit=4, limits=tool_limits
+)
+
+
+def _offload(executor: ToolExecutor):
+    """Turn a blocking tool implementation into an async tool running on executor"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return await executor.run(fn.__name__, fn, *args, **kwargs)
+        return wrapper
+    return decorator
+
 
 def _validate_file_path(file_path: str) -> bool:
     """Validate if file path exists"""
@@ -139,6 +1560,62 @@ def _validate_genes_input(genes: Union[List[str], str]) -> Union[List[str], str]
         return f"Error validating genes input: {_truncate_error(str(e))}"
 
 
+def _read_genes_list(genes: Union[List[str], str]) -> Union[List[str], str]:
+    """Return the gene list of a validated genes input (list or CSV file path)"""
+    if isinstance(genes, list):
+        return genes
+    try:
+        return pd.read_csv(genes, header=None).iloc[:, 0].astype(str).tolist()
+    except Exception as e:
+        return f"Error reading genes file: {_truncate_error(str(e))}"
+
+
+def _gene_selection_note(unmatched: List[str], resolved: dict) -> str:
+    """Summarize alias resolutions and unmatched genes as trailing note lines"""
+    lines = []
+    if resolved:
+        pairs = [f"{gene} -> {symbol}" for gene, symbol in list(resolved.items())[:10]]
+        line = f"Note: Resolved gene names: {', '.join(pairs)}"
+        if len(resolved) > 10:
+            line += f" and {len(resolved)-10} more"
+        lines.append(line)
+    if unmatched:
+        line = f"Note: {len(unmatched)} gene(s) not found: {', '.join(unmatched[:10])}"
+        if len(unmatched) > 10:
+            line += f" and {len(unmatched)-10} more"
+        lines.append(line)
+    return "".join(f"\n{line}" for line in lines)
+
+
+def _parse_regions(regions: Union[List[str], str]) -> Union[List[tuple], str]:
+    """Parse 'chr:start-end' strings or a BED file into (chrom, start, end, name) tuples"""
+    parsed = []
+    if isinstance(regions, str):
+        if not _validate_file_path(regions):
+            return f"Error: File path does not exist: {regions}"
+        with open(regions, "r") as f:
+            for line in f:
+                fields = line.rstrip("\r\n").split("\t")
+                if len(fields) < 3 or line.startswith(("#", "track", "browser")):
+                    continue
+                try:
+                    start, end = int(fields[1]), int(fields[2])
+                except ValueError:
+                    continue
+                name = fields[3] if len(fields) > 3 else f"{fields[0]}:{start}-{end}"
+                parsed.append((fields[0], start, end, name))
+    elif isinstance(regions, list):
+        for region in regions:
+            match = re.match(r"^\s*([^:\s]+):([\d,]+)-([\d,]+)\s*$", str(region))
+            if not match:
+                return f"Error: Region must look like 'chr1:1000-2000', got: {region}"
+            start, end = int(match.group(2).replace(",", "")), int(match.group(3).replace(",", ""))
+            parsed.append((match.group(1), start, end, f"{match.group(1)}:{start}-{end}"))
+    else:
+        return f"Error: Regions parameter must be list or string, got: {type(regions).__name__}"
+    return parsed
+
+
 def _validate_trs_input(trs: Union[List[str], str]) -> Union[List[str], str]:
     """Validate TRs input parameter"""
     try:
@@ -162,6 +1639,184 @@ def _validate_trs_input(trs: Union[List[str], str]) -> Union[List[str], str]:
         return f"Error validating TRs input: {_truncate_error(str(e))}"
 
 
+# execute_bash streaming: progress chunk size and interval, output kept in memory, full logs
+bash_stream_chunk_bytes = int(os.environ.get("BIOTOOLS_BASH_CHUNK_BYTES", "4096"))
+bash_stream_interval = float(os.environ.get("BIOTOOLS_BASH_STREAM_INTERVAL", "1.0"))
+bash_keep_bytes = int(os.environ.get("BIOTOOLS_BASH_KEEP_KB", "32")) * 1024
+bash_log_dir = os.environ.get("BIOTOOLS_BASH_LOG_DIR", f"{tmp_docker}/bash_logs")
+bash_sample_interval = float(os.environ.get("BIOTOOLS_BASH_SAMPLE_INTERVAL", "0.5"))
+page_size = os.sysconf("SC_PAGE_SIZE")
+clock_ticks = os.sysconf("SC_CLK_TCK")
+
+
+class OutputBuffer:
+    """
+    Command output spilled in full to a log file; only the first and the most recent
+    keep_bytes stay in memory.
+    """
+
+    def __init__(self, log_dir: str, keep_bytes: int):
+        os.makedirs(log_dir, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(prefix="bash_", suffix=".log", dir=log_dir)
+        self._file = os.fdopen(fd, "wb")
+        self.keep_bytes = keep_bytes
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, data: bytes):
+        self._file.write(data)
+        self.total += len(data)
+        room = self.keep_bytes - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail += data
+            if len(self.tail) > self.keep_bytes:
+                del self.tail[: len(self.tail) - self.keep_bytes]
+
+    def close(self):
+        self._file.close()
+
+    def text(self) -> str:
+        head = self.head.decode("utf-8", errors="replace")
+        tail = self.tail.decode("utf-8", errors="replace")
+        omitted = self.total - len(self.head) - len(self.tail)
+        if omitted > 0:
+            return f"{head}\n... [{omitted} bytes omitted, see full log] ...\n{tail}".strip()
+        return (head + tail).strip()
+
+
+def _kill_process_group(pid: int):
+    """Kill a shell and everything it started (it leads its own session)"""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _process_group_usage(pgid: int) -> tuple:
+    """
+    (resident bytes, CPU seconds) of the live processes in a process group, read from
+    /proc/<pid>/stat. CPU time includes the children each process has reaped, so the
+    total only grows while the group runs, whichever member a child exits under.
+    """
+    rss, ticks = 0, 0
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/stat", "rb") as f:
+                # Fields after the parenthesised command name: state, ppid, pgrp, ...,
+                # utime, stime, cutime, cstime (14th-17th), ..., rss (24th)
+                fields = f.read().rsplit(b")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[2]) == pgid:
+            rss += int(fields[21]) * page_size
+            ticks += sum(map(int, fields[11:15]))
+    return rss, ticks / clock_ticks
+
+
+@contextlib.asynccontextmanager
+async def _track_usage(pid: int):
+    """
+    Record the CPU time and peak RSS of a command (a process group leader) on the current
+    tool call, sampled from /proc off the event loop. Only the command's own processes are
+    counted; CPU time used after the last sample is missed.
+    """
+    peak, cpu = 0, 0.0
+
+    async def sample():
+        nonlocal peak, cpu
+        while True:
+            rss, seconds = await asyncio.to_thread(_process_group_usage, pid)
+            peak, cpu = max(peak, rss), max(cpu, seconds)
+            await asyncio.sleep(bash_sample_interval)
+
+    sampler = asyncio.create_task(sample())
+    try:
+        yield
+    finally:
+        sampler.cancel()
+        _count("subprocess_cpu_seconds", cpu)
+        if peak:
+            _record_peak("subprocess_peak_rss_bytes", peak)
+
+
+async def _run_logged(command: str, timeout: Optional[float], ctx: Optional[Context]) -> tuple:
+    """
+    Run a command, forwarding its output as progress notifications and logging all of it.
+    Returns (exit code, whether it timed out, closed OutputBuffer).
+    """
+    buffer = OutputBuffer(bash_log_dir, bash_keep_bytes)
+    pending = bytearray()
+
+    proc = await asyncio.create_subprocess_shell(
+        command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+        start_new_session=True,
+    )
+
+    async def flush():
+        if not pending or ctx is None:
+            pending.clear()
+            return
+        # Chatty commands only get their latest chunk forwarded; the log file has everything
+        skipped = max(0, len(pending) - bash_stream_chunk_bytes)
+        message = pending[skipped:].decode("utf-8", errors="replace")
+        if skipped:
+            message = f"... [{skipped} bytes not forwarded] ...\n{message}"
+        pending.clear()
+        await ctx.report_progress(progress=buffer.total, message=message)
+
+    async def pump():
+        while True:
+            data = await proc.stdout.read(65536)
+            if not data:
+                break
+            buffer.write(data)
+            pending.extend(data)
+
+    async def forward():
+        while True:
+            await asyncio.sleep(bash_stream_interval)
+            await flush()
+
+    forwarder = asyncio.create_task(forward())
+    timed_out = False
+    async with _track_usage(proc.pid):
+        try:
+            await asyncio.wait_for(asyncio.gather(pump(), proc.wait()), timeout=timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+        finally:
+            forwarder.cancel()
+            if proc.returncode is None:
+                _kill_process_group(proc.pid)
+                await proc.wait()
+            buffer.close()
+    _count("tmp_bytes_written", buffer.total)
+    await flush()
+    return proc.returncode, timed_out, buffer
+
+
+def _format_logged(returncode: int, timed_out: bool, buffer: OutputBuffer, timeout: Optional[float]) -> str:
+    output_str = buffer.text()
+    log_note = f"Full log: {buffer.path}"
+    if timed_out:
+        return f"Command timed out after {timeout} seconds\n{output_str}\n\n{log_note}"
+    if returncode != 0:
+        return f"Command failed (exit code {returncode}):\n{output_str}\n\n{log_note}"
+    return f"{output_str or 'Command executed successfully (no output)'}\n\n{log_note}"
+
+
+async def _stream_bash(command: str, timeout: Optional[float], ctx: Optional[Context]) -> str:
+    return _format_logged(*await _run_logged(command, timeout, ctx), timeout=timeout)
+
+
 @mcp.tool(
     description=f"""
 {execute_bash_md}
@@ -169,46 +1824,766 @@ def _validate_trs_input(trs: Union[List[str], str]) -> Union[List[str], str]:
 Args:
     command: The bash command to execute
     timeout: Timeout time (seconds), None means no timeout
+    stream: Forward output as progress notifications while the command runs, and return only the
+        beginning and end of the output together with the path of a log file holding all of it.
+        Use it for long running or verbose commands.
 """
 )
 async def execute_bash(
-    command: str = "echo hello!", timeout: Optional[float] = 6000.0
+    command: str = "echo hello!",
+    timeout: Optional[float] = 6000.0,
+    stream: bool = False,
+    ctx: Optional[Context] = None,
 ) -> str:
     try:
         if not isinstance(command, str) or not command.strip():
             return "Error: Command cannot be empty"
 
-        print(f"Executing: {command}")
+        _log("execute", f"Executing: {command}", command=command)
+
+        if stream:
+            return await _stream_bash(command, timeout, ctx)
 
         proc = await asyncio.create_subprocess_shell(
             command,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.STDOUT,
+            start_new_session=True,
         )
 
+        async with _track_usage(proc.pid):
+            try:
+                output, _ = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+            except asyncio.TimeoutError:
+                try:
+                    _kill_process_group(proc.pid)
+                    await proc.wait()
+                except Exception:
+                    pass
+                return f"Command timed out after {timeout} seconds"
+
+        output_str = output.decode("utf-8", errors="replace").strip()
+
+        if proc.returncode != 0:
+            return f"Command failed (exit code {proc.returncode}):\n{output_str}"
+
+        return (
+            output_str
+            if output_str
+            else "Command executed successfully (no output)"
+        )
+
+    except Exception as e:
+        return f"Execution error: {_truncate_error(str(e))}"
+
+
+# Memoized pipeline steps (execute_bash_cached): entry directory and total size cap
+step_cache_dir = os.environ.get("BIOTOOLS_STEP_CACHE_DIR", f"{tmp_docker}/biotools_step_cache")
+step_cache_max_bytes = int(os.environ.get("BIOTOOLS_STEP_CACHE_MB", "20480")) * 1024 * 1024
+
+
+# Quoted strings and escapes are kept verbatim, whitespace between them is collapsed
+shell_token_pattern = re.compile(r"""('[^']*'|"(?:[^"\\]|\\.)*"|\\.)|(\s+)""", re.DOTALL)
+
+
+def _normalise_command(command: str) -> str:
+    """
+    Canonical spelling of a command: whitespace outside quotes collapsed, everything else
+    verbatim, so quoted literals never match operators (a '&&' b vs a && b)
+    """
+    return shell_token_pattern.sub(lambda m: m.group(1) or " ", command.strip())
+
+
+def _tree_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files
+    )
+
+
+def _copy_output(src: str, dst: str):
+    """Copy a file or directory tree, reflinking files where the filesystem allows it"""
+    if os.path.isdir(src):
+        shutil.copytree(
+            src, dst, dirs_exist_ok=True, copy_function=lambda s, d: _deliver_file(s, d, "reflink")
+        )
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+        _deliver_file(src, dst, "reflink")
+
+
+class StepCache:
+    """
+    Recorded outputs of pipeline commands, keyed by the normalised command and the content
+    hashes of its declared inputs. Each entry is a directory holding copies of the output
+    files and the command log; least recently used entries are evicted beyond max_bytes.
+    Content hashes are remembered per (mtime, size, inode), so unchanged inputs are not re-read.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.index_path = f"{directory}/index.json"
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._hashes = {}  # path -> [mtime_ns, size, inode, sha256]
+        self._pinned = {}  # key -> number of restores copying its outputs
+        self._lock = threading.Lock()
+        self._load()
+
+    def _file_hash(self, path: str) -> str:
+        stat = os.stat(path)
+        fingerprint = [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+        with self._lock:
+            known = self._hashes.get(path)
+        if known is not None and known[:3] == fingerprint:
+            return known[3]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        with self._lock:
+            self._hashes[path] = fingerprint + [digest.hexdigest()]
+        return digest.hexdigest()
+
+    def _input_hash(self, path: str) -> str:
+        if not os.path.isdir(path):
+            return self._file_hash(os.path.abspath(path))
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.abspath(os.path.join(root, name))
+                digest.update(f"{os.path.relpath(file_path, path)}\0{self._file_hash(file_path)}\n".encode())
+        return digest.hexdigest()
+
+    def key(self, command: str, inputs: List[str], outputs: List[str]) -> str:
+        payload = {
+            "command": _normalise_command(command),
+            "inputs": sorted([path, self._input_hash(path)] for path in inputs),
+            "outputs": sorted(os.path.abspath(path) for path in outputs),
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def restore(self, key: str) -> Optional[dict]:
+        """Copy the recorded outputs of key back to their paths; returns the entry or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not os.path.isdir(f"{self.directory}/{key}"):
+                self._entries.pop(key, None)
+                self.misses += 1
+                _count("cache_misses")
+                return None
+            entry["atime"] = time.time()
+            self._entries.move_to_end(key)
+            self.hits += 1
+            _count("cache_hits")
+            # Pinned so the entry is neither evicted nor replaced while copying outside the lock
+            self._pinned[key] = self._pinned.get(key, 0) + 1
+            entry = dict(entry)
+        try:
+            for index, path in enumerate(entry["outputs"]):
+                _copy_output(f"{self.directory}/{key}/outputs/{index}", path)
+        finally:
+            with self._lock:
+                self._pinned[key] -= 1
+                if not self._pinned[key]:
+                    del self._pinned[key]
+                self._save()
+        return entry
+
+    def put(self, key: str, command: str, outputs: List[str], log_path: str, runtime: float) -> int:
+        """Record outputs and log of a successful run; returns the entry size in bytes"""
+        entry_dir = f"{self.directory}/{key}"
+        tmp_dir = f"{entry_dir}.{os.urandom(4).hex()}.tmp"
+        try:
+            for index, path in enumerate(outputs):
+                _copy_output(path, f"{tmp_dir}/outputs/{index}")
+            shutil.copyfile(log_path, f"{tmp_dir}/command.log")
+            size = _tree_size(tmp_dir)
+            with self._lock:
+                if key in self._pinned:
+                    # Being restored: the recorded outputs are the same, keep them
+                    return self._entries[key]["size"]
+                if os.path.isdir(entry_dir):
+                    shutil.rmtree(entry_dir)
+                os.replace(tmp_dir, entry_dir)
+                self._entries[key] = {
+                    "command": command,
+                    "outputs": [os.path.abspath(path) for path in outputs],
+                    "size": size,
+                    "runtime": runtime,
+                    "created": time.time(),
+                    "atime": time.time(),
+                }
+                self._entries.move_to_end(key)
+                self._evict(keep=key)
+                self._save()
+            return size
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def log_path(self, key: str) -> str:
+        return f"{self.directory}/{key}/command.log"
+
+    def _evict(self, keep: Optional[str] = None):
+        total = sum(entry["size"] for entry in self._entries.values())
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep or key in self._pinned:
+                continue
+            total -= self._entries.pop(key)["size"]
+            shutil.rmtree(f"{self.directory}/{key}", ignore_errors=True)
+            self.evictions += 1
+
+    def _load(self):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+            for key, entry in sorted(index["entries"].items(), key=lambda item: item[1]["atime"]):
+                if os.path.isdir(f"{self.directory}/{key}"):
+                    self._entries[key] = entry
+            self._hashes = {path: known for path, known in index["hashes"].items() if os.path.exists(path)}
+            self._evict()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Warning: Failed to load step cache index: {_truncate_error(str(e))}")
+
+    def _save(self):
         try:
-            output, _ = await asyncio.wait_for(proc.communicate(), timeout=timeout)
-            output_str = output.decode("utf-8", errors="replace").strip()
+            tmp_path = f"{self.index_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"entries": self._entries, "hashes": self._hashes}, f)
+            os.replace(tmp_path, self.index_path)
+        except Exception as e:
+            print(f"Warning: Failed to save step cache index: {_truncate_error(str(e))}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(entry["size"] for entry in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+step_cache = StepCache(step_cache_dir, step_cache_max_bytes)
+# Hashing inputs and copying outputs can take minutes on large files, so step cache work has
+# its own pool instead of holding data tool workers
+step_executor = ToolExecutor(
+    "step_cache", int(os.environ.get("BIOTOOLS_STEP_CACHE_WORKERS", "2")), default_limit=2, limits=tool_limits
+)
 
-            if proc.returncode != 0:
-                return f"Command failed (exit code {proc.returncode}):\n{output_str}"
 
+def _replay_log(src: str) -> OutputBuffer:
+    """Copy a recorded log into a fresh log file, keeping its head and tail for the reply"""
+    buffer = OutputBuffer(bash_log_dir, bash_keep_bytes)
+    try:
+        with open(src, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                buffer.write(block)
+    finally:
+        buffer.close()
+    return buffer
+
+
+@mcp.tool(
+    description="""
+Run a pipeline step (fastqc, trim_galore, bowtie2, macs2, TRAPT, HOMER, ...) through a step cache.
+If the same command already ran successfully on input files with identical contents, its
+recorded output files and log are restored instead of running it again. Only use it for
+commands whose outputs depend on nothing but the command and the declared inputs.
+
+Args:
+    command: The bash command to execute
+    inputs: Input files or directories the command reads; their contents are part of the cache key
+    outputs: Output files or directories the command writes; recorded after a successful run and restored on a cache hit
+    timeout: Timeout time (seconds), None means no timeout
+"""
+)
+async def execute_bash_cached(
+    command: str,
+    inputs: List[str],
+    outputs: List[str],
+    timeout: Optional[float] = 6000.0,
+    ctx: Optional[Context] = None,
+) -> str:
+    try:
+        if not isinstance(command, str) or not command.strip():
+            return "Error: Command cannot be empty"
+        if not outputs:
+            return "Error: At least one output path is required"
+        for path in inputs:
+            if not os.path.exists(path):
+                return f"Error: Input path does not exist: {path}"
+
+        key = await step_executor.run("execute_bash_cached", step_cache.key, command, inputs, outputs)
+        entry = await step_executor.run("execute_bash_cached", step_cache.restore, key)
+        if entry is not None:
+            buffer = await step_executor.run("execute_bash_cached", _replay_log, step_cache.log_path(key))
+            recorded = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["created"]))
             return (
-                output_str
-                if output_str
-                else "Command executed successfully (no output)"
+                f"Restored {len(entry['outputs'])} output(s) from step cache "
+                f"(recorded {recorded}, original runtime {entry['runtime']:.1f}s):\n"
+                + "\n".join(entry["outputs"])
+                + f"\n\n{buffer.text()}\n\nFull log: {buffer.path}"
             )
 
-        except asyncio.TimeoutError:
+        _log("execute", f"Executing: {command}", command=command)
+        start = time.perf_counter()
+        returncode, timed_out, buffer = await _run_logged(command, timeout, ctx)
+        result = _format_logged(returncode, timed_out, buffer, timeout)
+        if timed_out or returncode != 0:
+            return result
+
+        missing = [path for path in outputs if not os.path.exists(path)]
+        if missing:
+            return f"{result}\nNote: Not cached, output(s) not found: {', '.join(missing)}"
+        size = await step_executor.run(
+            "execute_bash_cached",
+            step_cache.put, key, command, outputs, buffer.path, time.perf_counter() - start,
+        )
+        return f"{result}\nNote: Outputs recorded in step cache ({_format_bytes(size)})"
+    except Exception as e:
+        return f"Execution error: {_truncate_error(str(e))}"
+
+
+# Background jobs: state and logs directory, and the resources shared by running jobs
+job_dir = os.environ.get("BIOTOOLS_JOB_DIR", f"{tmp_docker}/biotools_jobs")
+job_cpu_slots = int(os.environ.get("BIOTOOLS_JOB_CPU_SLOTS", str(os.cpu_count() or 1)))
+job_memory_mb = int(
+    os.environ.get(
+        "BIOTOOLS_JOB_MEMORY_MB",
+        str(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)),
+    )
+)
+JOB_FINAL_STATES = ("succeeded", "failed", "cancelled", "timed_out", "lost")
+
+
+class JobScheduler:
+    """
+    Runs submitted commands in the background. A job starts once its CPU slots and memory
+    fit in what running jobs leave free; sessions are served round-robin so one client's
+    queue cannot hold back the others, and jobs of the same session start in order.
+
+    Each job is a JSON file in job_dir next to its log. Commands run detached in their own
+    session and record their exit code in a file, so after a server restart queued jobs are
+    queued again and jobs that are still running are picked up where they are.
+    """
+
+    def __init__(self, directory: str, cpu_slots: int, memory_mb: int):
+        self.directory = directory
+        self.cpu_slots = cpu_slots
+        self.memory_mb = memory_mb
+        self.jobs = {}  # id -> job record
+        self._queues = OrderedDict()  # session -> [job id, ...] waiting
+        self._running = {}  # id -> Popen, or None for a job adopted after a restart
+        self._killed = []  # Popen of killed jobs not reaped yet, polled instead of waited on
+        self._last_session = None
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def _path(self, job_id: str, suffix: str) -> str:
+        return f"{self.directory}/{job_id}.{suffix}"
+
+    def _save(self, job: dict):
+        path = self._path(job["id"], "json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(job, f)
+        os.replace(f"{path}.tmp", path)
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        records = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
             try:
-                proc.kill()
-                await proc.wait()
-            except Exception:
-                pass
-            return f"Command timed out after {timeout} seconds"
+                with open(f"{self.directory}/{name}", "r") as f:
+                    records.append(json.load(f))
+            except Exception as e:
+                print(f"Warning: Failed to load job state {name}: {_truncate_error(str(e))}")
+
+        for job in sorted(records, key=lambda job: job["submitted_at"]):
+            self.jobs[job["id"]] = job
+            if job["state"] == "queued":
+                self._queues.setdefault(job["session"], []).append(job["id"])
+            elif job["state"] == "running":
+                if os.path.exists(self._path(job["id"], "exit")):
+                    self._finish(job, None)
+                elif self._alive(job):
+                    self._running[job["id"]] = None
+                else:
+                    job.update(state="lost", finished_at=time.time())
+                    self._save(job)
+
+    def _alive(self, job: dict) -> bool:
+        """Whether the job's wrapper process still exists (checked by its command line)"""
+        try:
+            with open(f"/proc/{job['pid']}/cmdline", "rb") as f:
+                return self._path(job["id"], "exit").encode() in f.read()
+        except OSError:
+            return False
+
+    def _free(self):
+        running = [self.jobs[job_id] for job_id in self._running]
+        return (
+            self.cpu_slots - sum(job["cpus"] for job in running),
+            self.memory_mb - sum(job["memory_mb"] for job in running),
+        )
+
+    def _start(self, job: dict):
+        exit_path = self._path(job["id"], "exit")
+        with open(self._path(job["id"], "log"), "ab") as log:
+            proc = subprocess.Popen(
+                ["/bin/sh", "-c", '/bin/sh -c "$1"; echo $? > "$2"', "job", job["command"], exit_path],
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                stdin=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+        self._running[job["id"]] = proc
+        job.update(state="running", pid=proc.pid, started_at=time.time())
+        self._save(job)
+
+    def _finish(self, job: dict, state: Optional[str]):
+        exit_path = self._path(job["id"], "exit")
+        finished_at = time.time()
+        try:
+            with open(exit_path, "r") as f:
+                job["exit_code"] = int(f.read().strip())
+            finished_at = os.path.getmtime(exit_path)
+        except (OSError, ValueError):
+            pass
+        if state is None:
+            if job.get("exit_code") is None:
+                state = "lost"
+            else:
+                state = "succeeded" if job["exit_code"] == 0 else "failed"
+        job.update(state=state, finished_at=finished_at)
+        self._running.pop(job["id"], None)
+        self._save(job)
+
+    def _reap(self):
+        now = time.time()
+        self._killed = [proc for proc in self._killed if proc.poll() is None]
+        for job_id, proc in list(self._running.items()):
+            job = self.jobs[job_id]
+            if proc is not None:
+                done = proc.poll() is not None
+            else:
+                done = os.path.exists(self._path(job_id, "exit")) or not self._alive(job)
+            if done:
+                self._finish(job, None)
+            elif job["timeout"] is not None and now - job["started_at"] > job["timeout"]:
+                _kill_process_group(job["pid"])
+                if proc is not None:
+                    self._killed.append(proc)
+                self._finish(job, "timed_out")
+
+    def _admit(self):
+        while True:
+            sessions = [session for session, queue in self._queues.items() if queue]
+            if not sessions:
+                return
+            # Round-robin: start looking right after the session served last
+            if self._last_session in sessions:
+                turn = sessions.index(self._last_session) + 1
+                sessions = sessions[turn:] + sessions[:turn]
+            free_cpus, free_memory = self._free()
+            for session in sessions:
+                job = self.jobs[self._queues[session][0]]
+                if job["cpus"] <= free_cpus and job["memory_mb"] <= free_memory:
+                    self._queues[session].pop(0)
+                    self._last_session = session
+                    self._start(job)
+                    break
+            else:
+                return
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                try:
+                    self._reap()
+                    self._admit()
+                except Exception as e:
+                    print(f"Warning: Job scheduler error: {_truncate_error(str(e))}")
+                self._cond.wait(timeout=1.0)
+
+    def ensure_started(self):
+        with self._cond:
+            if self._thread is None:
+                self._load()
+                self._thread = threading.Thread(target=self._loop, name="job_scheduler", daemon=True)
+                self._thread.start()
+
+    def submit(self, command: str, session: str, cpus: int, memory_mb: int, timeout: Optional[float]) -> dict:
+        self.ensure_started()
+        job = {
+            "id": f"{time.strftime('%Y%m%d-%H%M%S')}-{os.urandom(3).hex()}",
+            "session": session,
+            "command": command,
+            "cpus": cpus,
+            "memory_mb": memory_mb,
+            "timeout": timeout,
+            "state": "queued",
+            "pid": None,
+            "exit_code": None,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "log": None,
+        }
+        job["log"] = self._path(job["id"], "log")
+        with self._cond:
+            self.jobs[job["id"]] = job
+            self._queues.setdefault(session, []).append(job["id"])
+            self._save(job)
+            self._cond.notify()
+        return job
+
+    def cancel(self, job_id: str) -> dict:
+        self.ensure_started()
+        with self._cond:
+            job = self.jobs[job_id]
+            if job["state"] == "queued":
+                self._queues[job["session"]].remove(job_id)
+                job.update(state="cancelled", finished_at=time.time())
+                self._save(job)
+            elif job["state"] == "running":
+                _kill_process_group(job["pid"])
+                proc = self._running[job_id]
+                if proc is not None:
+                    # Reaped by the scheduler loop: waiting here would hold the lock while the
+                    # process group tears down
+                    self._killed.append(proc)
+                self._finish(job, "cancelled")
+            self._cond.notify()
+            return dict(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        self.ensure_started()
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+            if job["state"] == "queued":
+                job["queue_position"] = self._queues[job["session"]].index(job_id) + 1
+            return job
+
+    def list(self) -> List[dict]:
+        self.ensure_started()
+        with self._cond:
+            return [dict(job) for job in self.jobs.values()]
+
+    def stats(self) -> dict:
+        with self._cond:
+            free_cpus, free_memory = self._free()
+            return {
+                "cpu_slots": self.cpu_slots,
+                "free_cpu_slots": free_cpus,
+                "memory_mb": self.memory_mb,
+                "free_memory_mb": free_memory,
+                "running": len(self._running),
+                "queued": sum(len(queue) for queue in self._queues.values()),
+            }
+
+
+job_scheduler = JobScheduler(job_dir, job_cpu_slots, job_memory_mb)
+
+
+def _session_key(ctx: Optional[Context]) -> str:
+    """Key jobs are fair-queued by: the MCP session, or the client id without one"""
+    if ctx is None:
+        return "default"
+    try:
+        return ctx.session_id or ctx.client_id or "default"
+    except Exception:
+        return "default"
+
+
+def _read_log_tail(path: str, max_bytes: int) -> str:
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - max_bytes))
+            tail = f.read().decode("utf-8", errors="replace")
+    except OSError:
+        return ""
+    if size > max_bytes:
+        return f"... [{size - max_bytes} bytes omitted, see full log] ...\n{tail}"
+    return tail
+
+
+def _read_log_since(path: str, offset: Optional[int]) -> tuple:
+    """(size, output after offset capped at one streaming chunk); offset None only reads the size"""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return offset or 0, ""
+    if offset is None or size <= offset:
+        return size, ""
+    start = max(offset, size - bash_stream_chunk_bytes)
+    with open(path, "rb") as f:
+        f.seek(start)
+        return size, f.read(size - start).decode("utf-8", errors="replace")
+
+
+def _format_job(job: dict) -> str:
+    lines = [f"Job {job['id']}: {job['state']}"]
+    lines.append(f"Command: {job['command']}")
+    lines.append(f"Resources: {job['cpus']} CPU slot(s), {job['memory_mb']} MB")
+    if job.get("queue_position"):
+        lines.append(f"Queue position in session: {job['queue_position']}")
+    if job["started_at"]:
+        end = job["finished_at"] or time.time()
+        lines.append(f"Runtime: {end - job['started_at']:.1f}s")
+    if job["exit_code"] is not None:
+        lines.append(f"Exit code: {job['exit_code']}")
+    lines.append(f"Log: {job['log']}")
+    return "\n".join(lines)
+
+
+@mcp.tool(
+    description="""
+Submit a bash command as a background job and return its job id immediately.
+The job starts as soon as the requested CPU slots and memory are free; use it for long
+running pipelines (alignment, peak calling, footprinting) instead of execute_bash.
+
+Args:
+    command: The bash command to run
+    cpus: CPU slots the command uses (e.g. its --threads value)
+    memory_mb: Memory (MB) the command needs at its peak, 0 if negligible
+    timeout: Timeout time (seconds) once running, None means no timeout
+"""
+)
+async def submit_job(
+    command: str,
+    cpus: int = 1,
+    memory_mb: int = 0,
+    timeout: Optional[float] = None,
+    ctx: Optional[Context] = None,
+) -> str:
+    try:
+        if not isinstance(command, str) or not command.strip():
+            return "Error: Command cannot be empty"
+        if cpus < 1 or cpus > job_scheduler.cpu_slots:
+            return f"Error: cpus must be between 1 and {job_scheduler.cpu_slots}"
+        if memory_mb < 0 or memory_mb > job_scheduler.memory_mb:
+            return f"Error: memory_mb must be between 0 and {job_scheduler.memory_mb}"
+
+        # The scheduler does file IO under its lock, so it is only called from a thread
+        job = await asyncio.to_thread(job_scheduler.submit, command, _session_key(ctx), cpus, memory_mb, timeout)
+        return f"Submitted job {job['id']}\nCheck it with job_status, stop it with cancel_job\nLog: {job['log']}"
+    except Exception as e:
+        return f"Error submitting job: {_truncate_error(str(e))}"
+
+
+@mcp.tool(
+    description="""
+Show the state of a background job and the end of its output.
+
+Args:
+    job_id: Job id returned by submit_job
+    wait: Seconds to wait for the job to finish, forwarding new output as progress notifications; 0 returns at once
+"""
+)
+async def job_status(job_id: str, wait: float = 0, ctx: Optional[Context] = None) -> str:
+    try:
+        job = await asyncio.to_thread(job_scheduler.get, job_id)
+        if job is None:
+            return f"Error: Unknown job: {job_id}"
+
+        deadline = time.monotonic() + wait
+        offset, _ = await asyncio.to_thread(_read_log_since, job["log"], None)
+        while job["state"] not in JOB_FINAL_STATES and time.monotonic() < deadline:
+            await asyncio.sleep(min(bash_stream_interval, max(0.0, deadline - time.monotonic())))
+            if ctx is not None:
+                size, message = await asyncio.to_thread(_read_log_since, job["log"], offset)
+                if message:
+                    offset = size
+                    await ctx.report_progress(progress=size, message=message)
+            job = await asyncio.to_thread(job_scheduler.get, job_id)
+
+        output = (await asyncio.to_thread(_read_log_tail, job["log"], bash_keep_bytes)).strip()
+        if not output:
+            output = "(no output)" if job["state"] in JOB_FINAL_STATES else "(no output yet)"
+        return f"{_format_job(job)}\n\n{output}"
+    except Exception as e:
+        return f"Error reading job status: {_truncate_error(str(e))}"
+
+
+@mcp.tool(
+    description="""
+Cancel a queued or running background job (a running job is killed with all its child processes).
+
+Args:
+    job_id: Job id returned by submit_job
+"""
+)
+async def cancel_job(job_id: str) -> str:
+    try:
+        if await asyncio.to_thread(job_scheduler.get, job_id) is None:
+            return f"Error: Unknown job: {job_id}"
+        job = await asyncio.to_thread(job_scheduler.cancel, job_id)
+        if job["state"] != "cancelled":
+            return f"Job {job_id} already finished: {job['state']}"
+        return f"Cancelled job {job_id}"
+    except Exception as e:
+        return f"Error cancelling job: {_truncate_error(str(e))}"
 
+
+@mcp.tool(
+    description="""
+List background jobs, newest first, with the CPU slots and memory currently free.
+
+Args:
+    state: Only list jobs in this state (queued, running, succeeded, failed, cancelled, timed_out, lost), None for all
+    all_sessions: Include jobs submitted from other sessions
+    limit: Maximum number of jobs listed
+"""
+)
+async def list_jobs(
+    state: Optional[str] = None,
+    all_sessions: bool = False,
+    limit: int = 20,
+    ctx: Optional[Context] = None,
+) -> str:
+    try:
+        session = _session_key(ctx)
+        jobs = [
+            job for job in await asyncio.to_thread(job_scheduler.list)
+            if (state is None or job["state"] == state) and (all_sessions or job["session"] == session)
+        ]
+        jobs.sort(key=lambda job: job["submitted_at"], reverse=True)
+
+        stats = await asyncio.to_thread(job_scheduler.stats)
+        lines = [
+            f"Free: {stats['free_cpu_slots']}/{stats['cpu_slots']} CPU slots, "
+            f"{stats['free_memory_mb']}/{stats['memory_mb']} MB; "
+            f"{stats['running']} running, {stats['queued']} queued"
+        ]
+        if not jobs:
+            lines.append("No jobs found")
+        for job in jobs[:limit]:
+            command = job["command"] if len(job["command"]) <= 80 else job["command"][:77] + "..."
+            lines.append(f"{job['id']}  {job['state']:<10} {job['cpus']} CPU  {job['memory_mb']} MB  {command}")
+        if len(jobs) > limit:
+            lines.append(f"... and {len(jobs) - limit} more")
+        return "\n".join(lines)
     except Exception as e:
-        return f"Execution error: {_truncate_error(str(e))}"
+        return f"Error listing jobs: {_truncate_error(str(e))}"
 
 
 @mcp.tool(
@@ -219,8 +2594,10 @@ Returns:
     A string containing all geneset categories and their descriptions.
 """
 )
-async def geneset_category_list() -> str:
+@_offload(lookup_executor)
+def geneset_category_list() -> str:
     try:
+        datasets["geneset"].ensure()
         if not info_class:
             return "Error: No geneset categories available"
             
@@ -232,10 +2609,92 @@ async def geneset_category_list() -> str:
         return f"Error: {_truncate_error(str(e))}"
 
 
+@mcp.tool(
+    description=f"""
+Geneset enrichment analysis (hypergeometric test) of one or more gene lists against all genesets
+of a category, computed in memory.
+
+Args:
+    genes: Gene names, in one of the following formats:
+        - A list of gene names (e.g., ['TP53', 'EGFR'])
+        - Path to a CSV file containing gene names, with a single column and no header
+        - Several named gene lists, e.g. {{"up": ['TP53', 'EGFR'], "down": "/tmp/down.csv"}}
+    category: Geneset category, one of: {geneset_types_list or "see geneset_category_list"}
+    pvalue: Keep genesets with p-value at or below this
+    fdr: Keep genesets with Benjamini-Hochberg FDR at or below this
+    bonferroni: Keep genesets with Bonferroni adjusted p-value at or below this
+
+Returns:
+    For each gene list, the number of enriched genesets, the top ones and the path of a TSV file
+    with columns geneset, geneset_size, overlap, list_size, p_value, fdr, bonferroni, overlap_genes.
+"""
+)
+@_offload(data_executor)
+def enrichment(
+    genes: Union[List[str], str, Dict[str, Union[List[str], str]]],
+    category: str,
+    pvalue: float = 0.05,
+    fdr: float = 0.5,
+    bonferroni: float = 0.5,
+) -> str:
+    try:
+        if not datasets["geneset"].ensure():
+            return "Error: Geneset data is not available"
+        if category not in class_data:
+            return f"Error: Invalid category '{category}'. Available categories: {', '.join(class_data)}"
+
+        gene_lists = genes if isinstance(genes, dict) else {"genes": genes}
+        if not gene_lists:
+            return "Error: Genes parameter cannot be empty"
+
+        inputs = {}
+        for name, value in gene_lists.items():
+            validated_genes = _validate_genes_input(value)
+            if isinstance(validated_genes, str) and validated_genes.startswith("Error:"):
+                return f"{validated_genes} (gene list '{name}')"
+            if validated_genes == "all":
+                return f"Error: Gene list '{name}' must be a gene list or a gene file, not 'all'"
+            genes_list = _read_genes_list(validated_genes)
+            if isinstance(genes_list, str):
+                return f"{genes_list} (gene list '{name}')"
+            inputs[name] = genes_list
+
+        matrix = _geneset_matrix(category)
+        selections = {name: matrix.selector.select(genes_list) for name, genes_list in inputs.items()}
+        results = matrix.enrich([rows for rows, _, _ in selections.values()], pvalue, fdr, bonferroni)
+        _count("rows_scanned", len(matrix.names) * len(selections))
+
+        output = []
+        for (name, (rows, unmatched, resolved)), enriched in zip(selections.items(), results):
+            md5_value = hashlib.md5(
+                json.dumps([category, sorted(inputs[name]), pvalue, fdr, bonferroni]).encode("utf-8")
+            ).hexdigest()
+            enrichment_path = f"{tmp_docker}/enrichment_{category}_md5_{md5_value}.tsv"
+            try:
+                _write_atomic(enrichment_path, lambda tmp_path: enriched.to_csv(tmp_path, sep="\t", index=False))
+            except Exception as e:
+                return f"Error writing enrichment file: {_truncate_error(str(e))}"
+
+            lines = [f"{name}: {len(rows)} of {len(inputs[name])} genes in category, {len(enriched)} enriched geneset(s)"]
+            lines += [
+                f"  {row.geneset} (overlap {row.overlap}/{row.geneset_size}, p={row.p_value:.2e}, fdr={row.fdr:.2e})"
+                for row in enriched.head(5).itertuples()
+            ]
+            lines.append(f"  Results: {enrichment_path}{_gene_selection_note(unmatched, resolved)}")
+            output.append("\n".join(lines))
+        return "\n\n".join(output)
+
+    except Exception as e:
+        return f"Error: {_truncate_error(str(e))}"
+
+
 @mcp.tool(
     description=f"""
 Get annotation bed file for a given biological type from the local database (hg38).
 
+Note: To find annotations overlapping regions or near genes, use query_annotation_regions
+      instead of intersecting the whole file with bedtools.
+
 Args:
     biological_type: Biological types in local database (must be one of: {biological_type_list})
 
@@ -257,6 +2716,125 @@ async def get_annotation_bed(biological_type: str) -> str:
         return f"Error: {_truncate_error(str(e))}"
 
 
+@mcp.tool(
+    description=f"""
+Find annotations of a biological type that overlap genomic regions or lie within N bp of genes (hg38),
+without running bedtools. Each output line is the annotation BED line followed by the chromosome,
+start, end and name of the query region it overlaps.
+
+Args:
+    biological_type: Biological types in local database (must be one of: {biological_type_list})
+    regions: Query regions. Can be either:
+        - Region list (e.g., ['chr17:7661779-7687538'])
+        - BED file path (first three columns, optional name in the fourth)
+    genes: Gene names (list or CSV file path) whose gene bodies are used as query regions
+    flank: Extend every query region by this many bp on both sides (e.g., 10000)
+
+Returns:
+    The path to the overlap bed file and the number of overlaps found.
+"""
+)
+@_offload(data_executor)
+def query_annotation_regions(
+    biological_type: str,
+    regions: Optional[Union[List[str], str]] = None,
+    genes: Optional[Union[List[str], str]] = None,
+    flank: int = 0,
+) -> str:
+    try:
+        if not isinstance(biological_type, str) or biological_type not in bed_data_db:
+            available_types = ", ".join(bed_data_db.keys()) if bed_data_db else "None available"
+            return f"Error: Biological type '{biological_type}' not found. Available: {available_types}"
+
+        if regions is None and genes is None:
+            return "Error: Either regions or genes must be provided"
+
+        if not isinstance(flank, int) or flank < 0:
+            return f"Error: Flank must be a non-negative integer, got: {flank}"
+
+        if genes is not None:
+            validated_genes = _validate_genes_input(genes)
+            if isinstance(validated_genes, str) and validated_genes.startswith("Error:"):
+                return validated_genes
+            genes = validated_genes
+            if genes == "all":
+                return "Error: Genes parameter must be a gene list or a CSV file path"
+
+        source_fingerprint = _file_fingerprint(bed_data_db[biological_type])
+        md5_value = result_cache.key(
+            "query_annotation_regions",
+            {
+                "biological_type": biological_type,
+                "regions": None if regions is None else _genes_cache_arg(regions),
+                "genes": None if genes is None else _genes_cache_arg(genes),
+                "flank": flank,
+            },
+            [bed_data_db[biological_type], bed_config["gene_bed_path"], bed_config["gene_alias_path"]],
+        )
+        cached = result_cache.get(md5_value)
+        if cached is not None:
+            return cached
+
+        queries = []
+        note = ""
+        if regions is not None:
+            parsed = _parse_regions(regions)
+            if isinstance(parsed, str):
+                return parsed
+            queries.extend(parsed)
+
+        if genes is not None:
+            genes_list = _read_genes_list(genes)
+            if isinstance(genes_list, str):
+                return genes_list
+            try:
+                genes_index = _gene_index()
+            except Exception as e:
+                return f"Error reading gene bed file: {_truncate_error(str(e))}"
+            rows, unmatched, resolved = genes_index.selector.select(genes_list)
+            note = _gene_selection_note(unmatched, resolved)
+            chroms, starts, ends, names, _ = genes_index.regions(rows, "gene_body", 0, 0)
+            queries.extend(zip(chroms, starts.tolist(), ends.tolist(), names))
+
+        if not queries:
+            return "Error: No valid query regions found" + note
+
+        try:
+            index = _annotation_index(biological_type)
+        except Exception as e:
+            return f"Error reading annotation bed file: {_truncate_error(str(e))}"
+
+        overlap_path = f"{tmp_docker}/annotation_{biological_type}_md5_{md5_value}.bed"
+        n_overlaps = 0
+        queries = sorted(set(queries))
+
+        def write_overlaps(tmp_path: str):
+            nonlocal n_overlaps
+            with open(tmp_path, "wb") as f:
+                for chrom, start, end, name in queries:
+                    query_fields = f"\t{chrom}\t{start}\t{end}\t{name}\n".encode("utf-8")
+                    hits = index.overlaps(chrom, max(start - flank, 0), end + flank)
+                    if len(hits):
+                        f.write(b"".join(index.line(line_id) + query_fields for line_id in hits))
+                        n_overlaps += len(hits)
+
+        _write_atomic(overlap_path, write_overlaps)
+        _count("rows_scanned", n_overlaps)
+
+        result = (
+            f"{overlap_path}\n"
+            f"Found {n_overlaps} overlap(s) between {len(queries)} query region(s) and "
+            f"{len(index)} {biological_type} annotations (flank: {flank} bp)" + note
+        )
+        # The BED file changed after the key was taken: the result belongs to a newer key
+        if index.fingerprint == source_fingerprint:
+            result_cache.put(md5_value, overlap_path, result)
+        return result
+
+    except Exception as e:
+        return f"Error: {_truncate_error(str(e))}"
+
+
 @mcp.tool(
     description="""
 Get TR (including transcription factors, transcription co-factors, and chromatin regulators)
@@ -264,7 +2842,8 @@ binding region ChIP-seq bed files for a given list of TRs from the local databas
 
 Note: The bed files provided are derived from ChIP-seq data.
       TR names can be obtained via search_tr or TRAPT.
-      If a TR name without '@' is provided, fuzzy matching will be performed and return top 10 matches.
+      If a TR name without '@' is provided, fuzzy matching (substring, then edit distance on the
+      TR symbol) will be performed and return the top 10 ranked matches.
 
 Args:
     trs: Transcriptional regulators. Can be either:
@@ -272,11 +2851,14 @@ Args:
         - A path to a CSV file containing TR names (one name per line)
 
 Returns:
-    The paths to the TR binding region bed files.
+    The paths to the TR binding region bed files, followed by a delivery summary
+    (files linked, copied or reused, time taken and bytes not copied).
 """
 )
-async def get_tr_bed(trs: Optional[Union[List[str], str]] = None) -> str:
+@_offload(data_executor)
+def get_tr_bed(trs: Optional[Union[List[str], str]] = None) -> str:
     try:
+        datasets["tr"].ensure()
         if trs is None:
             return "Error: TR list cannot be empty"
 
@@ -290,47 +2872,48 @@ async def get_tr_bed(trs: Optional[Union[List[str], str]] = None) -> str:
 
         md5_value = hashlib.md5("get_tr_bed".join(trs_list).encode("utf-8")).hexdigest()
         try:
-            os.makedirs(f"/tmp/md5_{md5_value}", exist_ok=True)
+            os.makedirs(f"{tmp_docker}/md5_{md5_value}", exist_ok=True)
         except Exception as e:
             return f"Error creating temporary directory: {_truncate_error(str(e))}"
 
         tr_beds = []
         missing_trs = []
         fuzzy_matches_info = []
-        
+        requested = []  # (TR name, bed file) pairs to deliver
+
         for tr in trs_list:
             # Exact match
             if '@' in tr:
                 tr_bed = tr_data_db.get(tr)
                 if tr_bed:
-                    try:
-                        basename = os.path.basename(tr_bed)
-                        os.system(f"cp {tr_bed} /tmp/md5_{md5_value}/{basename}")
-                        tr_beds.append(f"/tmp/md5_{md5_value}/{basename}")
-                    except Exception as e:
-                        missing_trs.append(f"{tr} (copy failed: {_truncate_error(str(e))})")
+                    requested.append((tr, tr_bed))
                 else:
                     missing_trs.append(tr)
             # Fuzzy match
             else:
                 try:
-                    matching_keys = [key for key in tr_data_db.keys() if tr in key and '@' in key][:10]
+                    matching_keys = tr_index.fuzzy(tr, limit=10)
                     if matching_keys:
                         fuzzy_matches_info.append(f"'{tr}' matched: {', '.join(matching_keys)}")
                         for matched_tr in matching_keys:
                             tr_bed = tr_data_db.get(matched_tr)
                             if tr_bed:
-                                try:
-                                    basename = os.path.basename(tr_bed)
-                                    os.system(f"cp {tr_bed} /tmp/md5_{md5_value}/{basename}")
-                                    tr_beds.append(f"/tmp/md5_{md5_value}/{basename}")
-                                except Exception as e:
-                                    missing_trs.append(f"{matched_tr} (copy failed: {_truncate_error(str(e))})")
+                                requested.append((matched_tr, tr_bed))
                     else:
                         missing_trs.append(tr)
                 except Exception as e:
                     missing_trs.append(f"{tr} (search failed: {_truncate_error(str(e))})")
 
+        delivered, delivery_summary = _deliver_files(
+            [tr_bed for _, tr_bed in requested], f"{tmp_docker}/md5_{md5_value}"
+        )
+        for tr, tr_bed in requested:
+            result = delivered[tr_bed]
+            if isinstance(result, Exception):
+                missing_trs.append(f"{tr} (copy failed: {_truncate_error(str(result))})")
+            elif result not in tr_beds:
+                tr_beds.append(result)
+
         # Build output
         output = []
         if fuzzy_matches_info:
@@ -351,6 +2934,8 @@ async def get_tr_bed(trs: Optional[Union[List[str], str]] = None) -> str:
         output.extend(tr_beds[:20])  # Limit output
         if len(tr_beds) > 20:
             output.append(f"... and {len(tr_beds)-20} more files")
+        output.append("")
+        output.append(delivery_summary)
         return "\n".join(output)
         
     except Exception as e:
@@ -369,22 +2954,25 @@ Args:
     keyword: A partial or full name of a TR to search for.
 
 Returns:
-    A list of matching TR names and their corresponding bed file paths.
+    A ranked list (exact TR symbol matches first) of matching TR names, their corresponding
+    bed file paths and sample metadata.
 """
 )
-async def search_tr(keyword: str) -> str:
+@_offload(lookup_executor)
+def search_tr(keyword: str) -> str:
     try:
+        datasets["tr"].ensure()
         if not isinstance(keyword, str) or not keyword.strip():
             return "Error: Keyword cannot be empty"
 
-        matches = {
-            tr: path for tr, path in tr_data_db.items() if keyword.lower() in tr.lower()
-        }
+        matches = tr_index.search(keyword)
 
         if not matches:
             return f"No matching TR found for keyword: {keyword}"
 
-        output_lines = [f"{tr}: {path}" for tr, path in list(matches.items())[:20]]  # Limit output
+        output_lines = [
+            f"{tr}: {tr_data_db[tr]} ({_tr_metadata(tr)})" for tr in matches[:20]
+        ]  # Limit output
         if len(matches) > 20:
             output_lines.append(f"... and {len(matches)-20} more matches")
         return f"Found {len(matches)} matching TR(s):\n" + "\n".join(output_lines)
@@ -393,6 +2981,88 @@ async def search_tr(keyword: str) -> str:
         return f"Error: {_truncate_error(str(e))}"
 
 
+@mcp.tool(
+    description="""
+Rank transcriptional regulators (TRs) for a set of genes, TRAPT-style, from a precomputed TR x gene
+regulatory potential matrix kept in memory. Much faster than running the trapt CLI; use the CLI
+when its full output is needed.
+
+Args:
+    genes: Gene names, in one of the following formats:
+        - A list of gene names (e.g., ['TP53', 'EGFR'])
+        - Path to a CSV file containing gene names, with a single column and no header
+    top_n: Number of top ranked TRs listed in the reply (the CSV file has all of them)
+
+Returns:
+    The top ranked TRs (names usable with get_tr_bed) and the path of a CSV file with the full
+    ranking: rank, TR, score (z-score of the genes' mean regulatory potential), query_mean_rp,
+    background_mean_rp, bound_genes, target_genes, p_value (hypergeometric).
+"""
+)
+@_offload(data_executor)
+def rank_tr(genes: Optional[Union[List[str], str]] = None, top_n: int = 10) -> str:
+    try:
+        if genes is None:
+            return "Error: Genes parameter cannot be empty"
+
+        if not isinstance(top_n, int) or top_n < 1:
+            return "Error: top_n must be a positive integer"
+
+        validated_genes = _validate_genes_input(genes)
+        if isinstance(validated_genes, str) and validated_genes.startswith("Error:"):
+            return validated_genes
+        if validated_genes == "all":
+            return "Error: Genes must be a gene list or a gene file, not 'all'"
+
+        genes_list = _read_genes_list(validated_genes)
+        if isinstance(genes_list, str):
+            return genes_list
+
+        try:
+            matrix = _tr_matrix()
+        except Exception as e:
+            return f"Error: TR matrix is not available: {_truncate_error(str(e))}"
+
+        md5_value = result_cache.key(
+            "rank_tr",
+            {"genes": _genes_cache_arg(validated_genes)},
+            [tr_matrix_path, bed_config["gene_alias_path"]],
+        )
+        ranking_path = f"{tmp_docker}/tr_rank_md5_{md5_value}.csv"
+        cached = result_cache.get(md5_value)
+        if cached is not None:
+            ranking = pd.read_csv(ranking_path, nrows=top_n)
+        else:
+            rows, unmatched, resolved = matrix.selector.select(genes_list)
+            if len(rows) == 0:
+                error_msg = f"Error: None of the genes are in the TR matrix: {', '.join(genes_list[:10])}"
+                if len(genes_list) > 10:
+                    error_msg += f" and {len(genes_list)-10} more"
+                return error_msg
+
+            note = _gene_selection_note(unmatched, resolved)
+            if _file_fingerprint(bed_config["gene_bed_path"]) != matrix.gene_bed:
+                note += "\nNote: gene.bed changed since the TR matrix was built; rebuild it with build_tr_matrix.py"
+
+            ranking = matrix.score(rows)
+            _count("rows_scanned", len(matrix.trs))
+            try:
+                _write_atomic(ranking_path, lambda tmp_path: ranking.to_csv(tmp_path, index=False))
+            except Exception as e:
+                return f"Error writing TR ranking file: {_truncate_error(str(e))}"
+            result_cache.put(md5_value, ranking_path, ranking_path + note)
+            cached = ranking_path + note
+
+        lines = [
+            f"{row.rank}. {row.TR} (score {row.score:.2f}, {row.bound_genes} genes bound, p={row.p_value:.2e})"
+            for row in ranking.head(top_n).itertuples()
+        ]
+        return f"Top {len(lines)} TR(s):\n" + "\n".join(lines) + f"\n\nFull ranking: {cached}"
+
+    except Exception as e:
+        return f"Error: {_truncate_error(str(e))}"
+
+
 @mcp.tool(
     description="""
 Query the positions of genes and return a Gene-bed file path (hg38).
@@ -402,42 +3072,56 @@ Args:
         - Gene name list (e.g., ['TP53'])
         - CSV file containing a list of gene names
         - The string "all" to return all genes
+    format: Output format: "bed" (default), "parquet", "feather" or "bed.gz" (bgzipped and
+        tabix-indexed, sorted by position). Binary formats load much faster for many genes.
 
 Returns:
     The path to the gene bed file.
+    Gene names are matched case-insensitively and through known aliases; resolved and
+    unmatched gene names are reported on the lines following the path.
 """
 )
-async def get_gene_position(genes: Optional[Union[List[str], str]] = None) -> str:
+@_offload(data_executor)
+def get_gene_position(genes: Optional[Union[List[str], str]] = None, format: str = "bed") -> str:
     try:
         if genes is None:
             return "Error: Genes parameter cannot be empty"
 
+        if format not in position_formats:
+            return f"Error: Format must be one of: {', '.join(position_formats)}"
+
         validated_genes = _validate_genes_input(genes)
         if isinstance(validated_genes, str) and validated_genes.startswith("Error:"):
             return validated_genes
 
         genes = validated_genes
 
+        md5_value = result_cache.key(
+            "get_gene_position",
+            {"genes": _genes_cache_arg(genes), "format": format},
+            [bed_config["gene_bed_path"], bed_config["gene_alias_path"]],
+        )
+        cached = result_cache.get(md5_value)
+        if cached is not None:
+            return cached
+
         try:
-            gene_bed = pd.read_csv(
-                bed_config["gene_bed_path"], index_col=None, header=None, sep="\t"
-            )
+            genes_index = _gene_index()
         except Exception as e:
             return f"Error reading gene bed file: {_truncate_error(str(e))}"
 
+        note = ""
         if genes == "all":
-            gene_position = gene_bed
-            genes_list = ["all"]
+            gene_position = genes_index.frame
         else:
-            if isinstance(genes, str):  # file path
-                try:
-                    genes_list = pd.read_csv(genes, header=None).iloc[:, 0].tolist()
-                except Exception as e:
-                    return f"Error reading genes file: {_truncate_error(str(e))}"
-            else:  # list
-                genes_list = genes
+            genes_list = _read_genes_list(genes)
+            if isinstance(genes_list, str):
+                return genes_list
 
-            gene_position = gene_bed[gene_bed[4].map(lambda gene: gene in genes_list)]
+            rows, unmatched, resolved = genes_index.selector.select(genes_list)
+            gene_position = genes_index.frame.iloc[rows]
+            _count("rows_scanned", len(rows))
+            note = _gene_selection_note(unmatched, resolved)
 
             if gene_position.empty:
                 error_msg = f"Error: No position information found for genes: {', '.join(genes_list[:10])}"
@@ -445,19 +3129,108 @@ async def get_gene_position(genes: Optional[Union[List[str], str]] = None) -> st
                     error_msg += f" and {len(genes_list)-10} more"
                 return error_msg
 
-        md5_value = hashlib.md5(
-            "get_gene_position".join(genes_list).encode("utf-8")
-        ).hexdigest()
-
-        docker_gene_position_path = f"{tmp_docker}/gene_position_md5_{md5_value}.bed"
+        docker_gene_position_path = f"{tmp_docker}/gene_position_md5_{md5_value}.{format}"
         try:
-            gene_position.to_csv(
-                docker_gene_position_path, header=False, index=False, sep="\t"
-            )
+            note += _write_positions(gene_position, docker_gene_position_path, format)
         except Exception as e:
             return f"Error writing gene position file: {_truncate_error(str(e))}"
 
-        return docker_gene_position_path
+        result_cache.put(md5_value, docker_gene_position_path, docker_gene_position_path + note)
+        return docker_gene_position_path + note
+
+    except Exception as e:
+        return f"Error: {_truncate_error(str(e))}"
+
+
+@mcp.tool(
+    description="""
+Build promoter/TSS windows or gene-body regions for genes and return a BED file path (hg38).
+Regions are strand-aware: upstream/downstream are relative to the gene strand.
+
+Args:
+    genes: Gene names. Can be either:
+        - Gene name list (e.g., ['TP53'])
+        - CSV file containing a list of gene names
+        - The string "all" to return all genes
+    region: "tss" for the transcription start base, "gene_body" for the whole gene
+    upstream: Extend each region upstream by this many bp (e.g., 2000 for promoters)
+    downstream: Extend each region downstream by this many bp (e.g., 500 for promoters)
+
+Returns:
+    The path to a BED6 file (chrom, start, end, gene, ., strand).
+"""
+)
+@_offload(data_executor)
+def get_gene_regions(
+    genes: Optional[Union[List[str], str]] = None,
+    region: str = "tss",
+    upstream: int = 0,
+    downstream: int = 0,
+) -> str:
+    try:
+        if genes is None:
+            return "Error: Genes parameter cannot be empty"
+
+        if region not in ("tss", "gene_body"):
+            return f"Error: Region must be 'tss' or 'gene_body', got: {region}"
+
+        if not isinstance(upstream, int) or not isinstance(downstream, int) or upstream < 0 or downstream < 0:
+            return "Error: Upstream and downstream must be non-negative integers"
+
+        validated_genes = _validate_genes_input(genes)
+        if isinstance(validated_genes, str) and validated_genes.startswith("Error:"):
+            return validated_genes
+
+        genes = validated_genes
+
+        md5_value = result_cache.key(
+            "get_gene_regions",
+            {"genes": _genes_cache_arg(genes), "region": region, "upstream": upstream, "downstream": downstream},
+            [bed_config["gene_bed_path"], bed_config["gene_alias_path"]],
+        )
+        cached = result_cache.get(md5_value)
+        if cached is not None:
+            return cached
+
+        try:
+            genes_index = _gene_index()
+        except Exception as e:
+            return f"Error reading gene bed file: {_truncate_error(str(e))}"
+
+        note = ""
+        rows = None
+        if genes != "all":
+            genes_list = _read_genes_list(genes)
+            if isinstance(genes_list, str):
+                return genes_list
+
+            rows, unmatched, resolved = genes_index.selector.select(genes_list)
+            _count("rows_scanned", len(rows))
+            if len(rows) == 0:
+                error_msg = f"Error: No position information found for genes: {', '.join(genes_list[:10])}"
+                if len(genes_list) > 10:
+                    error_msg += f" and {len(genes_list)-10} more"
+                return error_msg
+            note = _gene_selection_note(unmatched, resolved)
+
+        chroms, starts, ends, names, strands = genes_index.regions(rows, region, upstream, downstream)
+        regions_path = f"{tmp_docker}/gene_regions_{region}_md5_{md5_value}.bed"
+        def write_regions(tmp_path: str):
+            with open(tmp_path, "w") as f:
+                f.writelines(
+                    f"{chrom}\t{start}\t{end}\t{name}\t.\t{strand}\n"
+                    for chrom, start, end, name, strand in zip(
+                        chroms, starts.tolist(), ends.tolist(), names, strands
+                    )
+                )
+
+        try:
+            _write_atomic(regions_path, write_regions)
+        except Exception as e:
+            return f"Error writing gene regions file: {_truncate_error(str(e))}"
+
+        result_cache.put(md5_value, regions_path, regions_path + note)
+        return regions_path + note
 
     except Exception as e:
         return f"Error: {_truncate_error(str(e))}"
@@ -473,14 +3246,23 @@ Args:
         - Gene name list (e.g., ['TP53'])
         - CSV file containing a list of gene names
         - The string "all" to return all genes
+    format: Output format: "csv" (default), "parquet" or "feather"; binary formats load much
+        faster, and the gene names are in their "gene" column
 
 Returns:
     The TCGA cancer genes expression file.
+    Gene names are matched case-insensitively and through known aliases; resolved and
+    unmatched gene names are reported on the lines following the path.
 """
 )
-async def get_tcga_cancer_express(
-    cancer: str, genes: Optional[Union[List[str], str]] = "all"
+@_offload(data_executor)
+def get_tcga_cancer_express(
+    cancer: str, genes: Optional[Union[List[str], str]] = "all", format: str = "csv"
 ) -> str:
+    return _tcga_cancer_express(cancer, genes, format)
+
+
+def _tcga_cancer_express(cancer: str, genes: Optional[Union[List[str], str]] = "all", format: str = "csv") -> str:
     try:
         if not isinstance(cancer, str):
             return f"Error: Cancer type must be a string, got: {type(cancer).__name__}"
@@ -488,47 +3270,59 @@ async def get_tcga_cancer_express(
         if cancer not in cancer_list.split(", "):
             return f"Error: Cancer type '{cancer}' not found. Available: {cancer_list}"
 
+        if format not in expression_formats:
+            return f"Error: Format must be one of: {', '.join(expression_formats)}"
+
         validated_genes = _validate_genes_input(genes)
         if isinstance(validated_genes, str) and validated_genes.startswith("Error:"):
             return validated_genes
 
         genes = validated_genes
 
+        source = _expression_source("gene_expression_TCGA", gene_expression_TCGA, partition=cancer)
+        md5_value = result_cache.key(
+            "get_tcga_cancer_express",
+            {"cancer": cancer, "genes": _genes_cache_arg(genes), "format": format},
+            [source[1], bed_config["gene_alias_path"]],
+        )
+        cached = result_cache.get(md5_value)
+        if cached is not None:
+            return cached
+
         try:
-            exp = pd.read_feather(gene_expression_TCGA)
+            exp = exp_store.get(*source)
         except Exception as e:
             return f"Error reading expression data: {_truncate_error(str(e))}"
 
+        note = ""
         if genes == "all":
-            exp_genes = exp
-            genes_list = ["all"]
+            rows = None
         else:
-            if isinstance(genes, str):  # file path
-                try:
-                    genes_list = pd.read_csv(genes, header=None).iloc[:, 0].tolist()
-                except Exception as e:
-                    return f"Error reading genes file: {_truncate_error(str(e))}"
-            else:  # list
-                genes_list = genes
+            genes_list = _read_genes_list(genes)
+            if isinstance(genes_list, str):
+                return genes_list
 
-            exp_genes = exp[exp.index.map(lambda gene: gene in genes_list)]
+            rows, unmatched, resolved = exp.selector.select(genes_list)
 
-            if exp_genes.empty:
+            if len(rows) == 0:
                 return f"Error: No expression data found for specified genes in TCGA database"
+            note = _gene_selection_note(unmatched, resolved)
 
-        exp_genes = exp_genes.filter(regex=f"^{cancer}")
+        columns = exp.prefix_columns(cancer)
 
-        if exp_genes.empty:
+        if len(columns) == 0:
             return f"Error: No expression data found for cancer type '{cancer}'"
 
-        md5_value = hashlib.md5(cancer.join(genes_list).encode("utf-8")).hexdigest()
-        exp_genes_path = f"{tmp_docker}/TCGA_{cancer}_exp_md5_{md5_value}.csv"
+        exp_genes = exp.take(rows, columns)
+
+        exp_genes_path = f"{tmp_docker}/TCGA_{cancer}_exp_md5_{md5_value}.{format}"
         try:
-            exp_genes.to_csv(exp_genes_path)
+            _write_expression(exp_genes, exp_genes_path, format)
         except Exception as e:
             return f"Error writing expression file: {_truncate_error(str(e))}"
 
-        return exp_genes_path
+        result_cache.put(md5_value, exp_genes_path, exp_genes_path + note)
+        return exp_genes_path + note
 
     except Exception as e:
         return f"Error: {_truncate_error(str(e))}"
@@ -544,14 +3338,23 @@ Args:
         - Gene name list (e.g., ['TP53'])
         - CSV file containing a list of gene names
         - The string "all" to return all genes
+    format: Output format: "csv" (default), "parquet" or "feather"; binary formats load much
+        faster, and the gene names are in their "gene" column
 
 Returns:
     The average gene expression file.
+    Gene names are matched case-insensitively and through known aliases; resolved and
+    unmatched gene names are reported on the lines following the path.
 """
 )
-async def get_mean_express_data(
-    data_source: str, genes: Optional[Union[List[str], str]] = "all"
+@_offload(data_executor)
+def get_mean_express_data(
+    data_source: str, genes: Optional[Union[List[str], str]] = "all", format: str = "csv"
 ) -> str:
+    return _mean_express_data(data_source, genes, format)
+
+
+def _mean_express_data(data_source: str, genes: Optional[Union[List[str], str]] = "all", format: str = "csv") -> str:
     try:
         if not isinstance(data_source, str):
             return f"Error: Data source must be a string, got: {type(data_source).__name__}"
@@ -559,53 +3362,473 @@ async def get_mean_express_data(
         if data_source not in exp_data_db:
             return f"Error: Data source '{data_source}' not found. Available: {data_source_list}"
 
+        if format not in expression_formats:
+            return f"Error: Format must be one of: {', '.join(expression_formats)}"
+
         validated_genes = _validate_genes_input(genes)
         if isinstance(validated_genes, str) and validated_genes.startswith("Error:"):
             return validated_genes
 
         genes = validated_genes
 
-        exp_file = exp_data_db[data_source]
+        source = _expression_source(data_source, exp_data_db[data_source])
+        md5_value = result_cache.key(
+            "get_mean_express_data",
+            {"data_source": data_source, "genes": _genes_cache_arg(genes), "format": format},
+            [source[1], bed_config["gene_alias_path"]],
+        )
+        cached = result_cache.get(md5_value)
+        if cached is not None:
+            return cached
+
         try:
-            exp = pd.read_csv(exp_file, index_col=0)
+            exp = exp_store.get(*source)
         except Exception as e:
             return f"Error reading expression file: {_truncate_error(str(e))}"
 
+        note = ""
         if genes == "all":
-            exp_genes = exp
-            genes_list = ["all"]
+            exp_genes = exp.take()
         else:
-            if isinstance(genes, str):  # file path
-                try:
-                    genes_list = pd.read_csv(genes, header=None).iloc[:, 0].tolist()
-                except Exception as e:
-                    return f"Error reading genes file: {_truncate_error(str(e))}"
-            else:  # list
-                genes_list = genes
+            genes_list = _read_genes_list(genes)
+            if isinstance(genes_list, str):
+                return genes_list
 
-            exp_genes = exp[exp.index.map(lambda gene: gene in genes_list)]
+            rows, unmatched, resolved = exp.selector.select(genes_list)
 
-            if exp_genes.empty:
+            if len(rows) == 0:
                 return f"Error: No expression data found for specified genes in {data_source}"
+            note = _gene_selection_note(unmatched, resolved)
+
+            exp_genes = exp.take(rows)
 
-        md5_value = hashlib.md5(
-            data_source.join(genes_list).encode("utf-8")
-        ).hexdigest()
-        exp_genes_path = f"{tmp_docker}/exp_genes_md5_{md5_value}.csv"
+        exp_genes_path = f"{tmp_docker}/exp_genes_md5_{md5_value}.{format}"
         try:
-            exp_genes.to_csv(exp_genes_path)
+            _write_expression(exp_genes, exp_genes_path, format)
         except Exception as e:
             return f"Error writing expression file: {_truncate_error(str(e))}"
 
-        return exp_genes_path
+        result_cache.put(md5_value, exp_genes_path, exp_genes_path + note)
+        return exp_genes_path + note
+
+    except Exception as e:
+        return f"Error: {_truncate_error(str(e))}"
+
+
+# TCGA barcode sample type: 01-09 tumour, 10-19 normal, 20-29 control
+tcga_sample_type_pattern = re.compile(r"TCGA-[^-]+-[^-]+-(\d{2})")
+
+
+def _tcga_sample_types(samples: pd.Index) -> np.ndarray:
+    """'tumor', 'normal' or '' for each TCGA sample name"""
+    codes = pd.Series(samples, dtype=str).str.extract(tcga_sample_type_pattern, expand=False)
+    codes = pd.to_numeric(codes, errors="coerce").to_numpy()
+    return np.where(codes < 10, "tumor", np.where(codes < 20, "normal", ""))
+
+
+def _standardised_rows(values: np.ndarray, method: str) -> np.ndarray:
+    """Rows centred and scaled to unit norm, so that row dot products are correlations"""
+    if method == "spearman":
+        values = pd.DataFrame(values).rank(axis=1).to_numpy()
+    values = values - np.nanmean(values, axis=1, keepdims=True)
+    values = np.nan_to_num(values)
+    norms = np.linalg.norm(values, axis=1, keepdims=True)
+    return np.divide(values, norms, out=np.zeros_like(values), where=norms > 0)
+
+
+def _expression_dataset(data_source: str, cancer: Optional[str]) -> tuple:
+    """(store key, path) of a data source, or of the TCGA partition of a cancer type"""
+    if data_source == "gene_expression_TCGA":
+        return _expression_source(data_source, gene_expression_TCGA, partition=cancer)
+    return _expression_source(data_source, exp_data_db[data_source])
+
+
+def _summary_stats(values: np.ndarray) -> dict:
+    with np.errstate(all="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return {
+            "n_samples": np.sum(~np.isnan(values), axis=1),
+            "mean": np.nanmean(values, axis=1),
+            "median": np.nanmedian(values, axis=1),
+            "std": np.nanstd(values, axis=1, ddof=1),
+            "min": np.nanmin(values, axis=1),
+            "max": np.nanmax(values, axis=1),
+        }
+
+
+def _fold_change(values: np.ndarray, sample_types: np.ndarray) -> dict:
+    """Tumour vs normal means, log2 fold change of (mean + 1) and Welch's t statistic"""
+    tumor, normal = values[:, sample_types == "tumor"], values[:, sample_types == "normal"]
+    with np.errstate(all="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        n_t, n_n = np.sum(~np.isnan(tumor), axis=1), np.sum(~np.isnan(normal), axis=1)
+        mean_t, mean_n = np.nanmean(tumor, axis=1), np.nanmean(normal, axis=1)
+        var_t, var_n = np.nanvar(tumor, axis=1, ddof=1), np.nanvar(normal, axis=1, ddof=1)
+        return {
+            "n_tumor": n_t,
+            "n_normal": n_n,
+            "mean_tumor": mean_t,
+            "mean_normal": mean_n,
+            "log2_fold_change": np.log2((mean_t + 1) / (mean_n + 1)),
+            "t_statistic": (mean_t - mean_n) / np.sqrt(var_t / n_t + var_n / n_n),
+        }
+
+
+def _format_table(frame: pd.DataFrame, max_rows: int = 50) -> str:
+    text = frame.head(max_rows).to_string(index=False, float_format=lambda value: f"{value:.4g}")
+    if len(frame) > max_rows:
+        text += f"\n... {len(frame) - max_rows} more rows in the file"
+    return text
+
+
+@mcp.tool(
+    description=f"""
+Compute statistics over the resident expression data on the server and return compact results,
+instead of exporting full matrices with get_tcga_cancer_express or get_mean_express_data.
+
+Args:
+    analysis: One of:
+        - "summary": per gene (and per cancer type for TCGA) n_samples, mean, median, std, min, max
+        - "fold_change": TCGA tumour vs normal samples per gene and cancer type (sample types from
+          TCGA barcodes): means, log2((mean_tumor + 1) / (mean_normal + 1)) and Welch's t statistic
+        - "correlation": gene x gene correlation matrix of the given genes
+        - "coexpression": for each given gene, the top_n genes with the highest correlation
+    genes: Gene names, as a gene name list (e.g., ['TP53']) or a CSV file containing a list of gene names
+    data_source: "gene_expression_TCGA" (TCGA samples) or one of: {data_source_list}
+    cancer: TCGA cancer type(s) (one of: {cancer_list}); "summary" and "fold_change" default to all,
+        "correlation" and "coexpression" take a single cancer type
+    method: Correlation method, "pearson" or "spearman"
+    top_n: Number of co-expressed genes reported per gene
+
+Returns:
+    The result table (up to 50 rows) and the path of a CSV file with all of it.
+"""
+)
+@_offload(data_executor)
+def expression_stats(
+    analysis: str,
+    genes: Union[List[str], str],
+    data_source: str = "gene_expression_TCGA",
+    cancer: Optional[Union[List[str], str]] = None,
+    method: str = "pearson",
+    top_n: int = 20,
+) -> str:
+    try:
+        if analysis not in ("summary", "fold_change", "correlation", "coexpression"):
+            return f"Error: Analysis must be one of summary, fold_change, correlation, coexpression, got: {analysis}"
+        if data_source != "gene_expression_TCGA" and data_source not in exp_data_db:
+            return f"Error: Data source '{data_source}' not found. Available: gene_expression_TCGA, {data_source_list}"
+        if analysis == "fold_change" and data_source != "gene_expression_TCGA":
+            return "Error: fold_change needs TCGA samples (data_source gene_expression_TCGA)"
+        if method not in ("pearson", "spearman"):
+            return f"Error: Method must be 'pearson' or 'spearman', got: {method}"
+        if not isinstance(top_n, int) or top_n < 1:
+            return "Error: top_n must be a positive integer"
+
+        # Cancer types: only meaningful for TCGA samples
+        cancers = [None]
+        if data_source == "gene_expression_TCGA":
+            available = cancer_list.split(", ")
+            if cancer is None:
+                if analysis in ("correlation", "coexpression"):
+                    return f"Error: {analysis} needs a single cancer type. Available: {cancer_list}"
+                cancers = available
+            else:
+                cancers = [cancer] if isinstance(cancer, str) else list(cancer)
+                unknown = [name for name in cancers if name not in available]
+                if unknown:
+                    return f"Error: Cancer type(s) not found: {', '.join(unknown)}. Available: {cancer_list}"
+                if analysis in ("correlation", "coexpression") and len(cancers) != 1:
+                    return f"Error: {analysis} takes a single cancer type"
+
+        validated_genes = _validate_genes_input(genes)
+        if isinstance(validated_genes, str) and validated_genes.startswith("Error:"):
+            return validated_genes
+        if validated_genes == "all":
+            return "Error: Genes must be a gene list or a gene file, not 'all'"
+        genes_list = _read_genes_list(validated_genes)
+        if isinstance(genes_list, str):
+            return genes_list
+
+        sources = [_expression_dataset(data_source, name)[1] for name in cancers]
+        md5_value = result_cache.key(
+            "expression_stats",
+            {
+                "analysis": analysis,
+                "genes": _genes_cache_arg(validated_genes),
+                "data_source": data_source,
+                "cancers": cancers,
+                "method": method,
+                "top_n": top_n,
+            },
+            sorted(set(sources)) + [bed_config["gene_alias_path"]],
+        )
+        stats_path = f"{tmp_docker}/expression_stats_{analysis}_md5_{md5_value}.csv"
+        cached = result_cache.get(md5_value)
+        if cached is not None:
+            # Only empty fields are missing values; gene symbols such as NA stay strings
+            table = pd.read_csv(stats_path, keep_default_na=False, na_values=[""])
+            return _format_table(table) + f"\n\nFull result: {cached}"
+
+        note = ""
+        skipped = []
+        tables = []
+        for name in cancers:
+            try:
+                exp = exp_store.get(*_expression_dataset(data_source, name))
+            except Exception as e:
+                return f"Error reading expression data: {_truncate_error(str(e))}"
+            rows, unmatched, resolved = exp.selector.select(genes_list)
+            if len(rows) == 0:
+                return f"Error: No expression data found for specified genes in {data_source}"
+            note = _gene_selection_note(unmatched, resolved)  # same for every cancer type
+            symbols = exp.genes[rows].astype(str)
+            columns = exp.prefix_columns(name) if name is not None else None
+
+            if analysis in ("summary", "fold_change"):
+                selected = exp.take(rows, columns)
+                values, samples = selected.to_numpy(dtype=np.float64), selected.columns
+                if analysis == "summary":
+                    stats = _summary_stats(values)
+                else:
+                    sample_types = _tcga_sample_types(samples)
+                    if not (sample_types == "tumor").any() or not (sample_types == "normal").any():
+                        skipped.append(name)
+                        continue
+                    stats = _fold_change(values, sample_types)
+                table = pd.DataFrame({"gene": symbols, **stats})
+                if name is not None:
+                    table.insert(1, "cancer", name)
+                tables.append(table)
+
+            elif analysis == "correlation":
+                values = exp.take(rows, columns).to_numpy(dtype=np.float64)
+                standardised = _standardised_rows(values, method)
+                tables.append(pd.DataFrame(standardised @ standardised.T, index=symbols, columns=symbols))
+
+            else:
+                values = exp.take(None, columns).to_numpy(dtype=np.float64)
+                standardised = _standardised_rows(values, method)
+                correlation = standardised[rows] @ standardised.T
+                correlation[np.arange(len(rows)), rows] = -np.inf  # exclude each gene itself
+                k = min(top_n, correlation.shape[1] - 1)
+                top = np.argpartition(-correlation, k - 1, axis=1)[:, :k] if k > 0 else np.zeros((len(rows), 0), dtype=np.int64)
+                top_r = np.take_along_axis(correlation, top, axis=1)
+                order = np.argsort(-top_r, axis=1, kind="stable")
+                top, top_r = np.take_along_axis(top, order, axis=1), np.take_along_axis(top_r, order, axis=1)
+                tables.append(
+                    pd.DataFrame(
+                        {
+                            "gene": np.repeat(symbols, k),
+                            "rank": np.tile(np.arange(1, k + 1), len(rows)),
+                            "partner": exp.genes[top.ravel()].astype(str),
+                            "r": top_r.ravel(),
+                        }
+                    )
+                )
+
+        if skipped:
+            note += f"\nNote: No TCGA barcoded tumour and normal samples for: {', '.join(skipped)}"
+        if not tables:
+            return f"Error: No results for {analysis}{note}"
+        table = pd.concat(tables, ignore_index=analysis != "correlation")
+        try:
+            _write_atomic(
+                stats_path,
+                lambda tmp_path: table.to_csv(tmp_path, index=analysis == "correlation", index_label="gene"),
+            )
+        except Exception as e:
+            return f"Error writing statistics file: {_truncate_error(str(e))}"
+
+        result_cache.put(md5_value, stats_path, stats_path + note)
+        shown = table.reset_index(names="gene") if analysis == "correlation" else table
+        return _format_table(shown) + f"\n\nFull result: {stats_path}{note}"
+
+    except Exception as e:
+        return f"Error: {_truncate_error(str(e))}"
+
+
+async def _run_batch(tool: str, key: str, choices: List[str], fn, queries, genes, format: str) -> str:
+    """
+    Run single-query tool bodies concurrently on the data pool (the resident stores load
+    each dataset once) and write one JSON manifest of their outputs.
+    """
+    if not isinstance(queries, list) or not queries:
+        return "Error: Queries must be a non-empty list"
+    if genes is None:
+        genes = "all"
+
+    parsed = []
+    for i, query in enumerate(queries):
+        if isinstance(query, str):
+            query = {key: query}
+        if not isinstance(query, dict) or not isinstance(query.get(key), str):
+            return f"Error: Query {i + 1} must be a {key} name or an object with a '{key}' field"
+        if query[key] not in choices:
+            return f"Error: Query {i + 1}: {key} '{query[key]}' not found. Available: {', '.join(choices)}"
+        parsed.append((query[key], query.get("genes", genes)))
+
+    results = await asyncio.gather(
+        *(data_executor.run(tool, fn, name, query_genes, format) for name, query_genes in parsed)
+    )
+
+    manifest = []
+    for (name, query_genes), result in zip(parsed, results):
+        entry = {key: name, "genes": query_genes}
+        if result.startswith("Error"):
+            entry.update(status="error", error=result)
+        else:
+            path, *notes = result.split("\n")
+            entry.update(status="ok", path=path, notes=notes)
+        manifest.append(entry)
+
+    md5_value = hashlib.md5(json.dumps([tool, manifest], sort_keys=True).encode("utf-8")).hexdigest()
+    manifest_path = f"{tmp_docker}/{tool}_batch_md5_{md5_value}.json"
+    try:
+        def write_manifest(tmp_path: str):
+            with open(tmp_path, "w") as f:
+                json.dump(manifest, f, indent=2)
+
+        _write_atomic(manifest_path, write_manifest)
+    except Exception as e:
+        return f"Error writing manifest file: {_truncate_error(str(e))}"
+
+    failed = sum(entry["status"] == "error" for entry in manifest)
+    lines = [f"Manifest: {manifest_path} ({len(manifest) - failed} succeeded, {failed} failed)"]
+    for entry in manifest:
+        detail = entry["path"] if entry["status"] == "ok" else entry["error"]
+        lines.append(f"{entry[key]}: {detail}")
+        lines.extend(f"  {note}" for note in entry.get("notes", []))
+    return "\n".join(lines)
+
+
+@mcp.tool(
+    description=f"""
+Batched get_tcga_cancer_express: expression data for several TCGA cancer types in one call.
+
+Args:
+    queries: List of queries, each either a cancer type or an object {{"cancer": ..., "genes": ...}}
+        (cancer must be one of: {cancer_list}; genes as in get_tcga_cancer_express)
+    genes: Genes for queries that do not give their own (gene list, CSV file or "all")
+    format: Output format of every query: "csv" (default), "parquet" or "feather"
+
+Returns:
+    The path of a JSON manifest with, per query, its output file path (or error) and notes,
+    followed by the same information as text.
+"""
+)
+async def get_tcga_cancer_express_batch(
+    queries: List[Union[str, Dict[str, Union[str, List[str]]]]],
+    genes: Optional[Union[List[str], str]] = "all",
+    format: str = "csv",
+) -> str:
+    try:
+        return await _run_batch(
+            "get_tcga_cancer_express", "cancer", cancer_list.split(", "), _tcga_cancer_express, queries, genes, format
+        )
+    except Exception as e:
+        return f"Error: {_truncate_error(str(e))}"
+
+
+@mcp.tool(
+    description=f"""
+Batched get_mean_express_data: average expression data from several data sources in one call.
+
+Args:
+    queries: List of queries, each either a data source or an object {{"data_source": ..., "genes": ...}}
+        (data_source must be one of: {data_source_list}; genes as in get_mean_express_data)
+    genes: Genes for queries that do not give their own (gene list, CSV file or "all")
+    format: Output format of every query: "csv" (default), "parquet" or "feather"
 
+Returns:
+    The path of a JSON manifest with, per query, its output file path (or error) and notes,
+    followed by the same information as text.
+"""
+)
+async def get_mean_express_data_batch(
+    queries: List[Union[str, Dict[str, Union[str, List[str]]]]],
+    genes: Optional[Union[List[str], str]] = "all",
+    format: str = "csv",
+) -> str:
+    try:
+        return await _run_batch(
+            "get_mean_express_data", "data_source", list(exp_data_db), _mean_express_data, queries, genes, format
+        )
     except Exception as e:
         return f"Error: {_truncate_error(str(e))}"
 
 
+metrics.describe("biotools_dataset_warm", "gauge", "Whether a dataset is loaded (1) or not (0)")
+metrics.describe("biotools_dataset_load_seconds", "gauge", "Time the last load of a dataset took")
+metrics.describe("biotools_expression_store_bytes", "gauge", "Memory held by resident expression matrices")
+metrics.describe("biotools_cache_bytes", "gauge", "Size of the files tracked by a cache")
+metrics.describe("biotools_cache_entries", "gauge", "Entries in a cache")
+metrics.describe("biotools_tool_queue_waiting", "gauge", "Offloaded tool calls waiting for a concurrency slot")
+metrics.describe("biotools_tool_queue_running", "gauge", "Offloaded tool calls running on a pool thread")
+metrics.describe("biotools_tool_queue_wait_seconds_total", "counter", "Time offloaded tool calls spent queued")
+metrics.describe("biotools_jobs_running", "gauge", "Background jobs running")
+metrics.describe("biotools_jobs_queued", "gauge", "Background jobs waiting for CPU slots or memory")
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request: Request) -> PlainTextResponse:
+    """Prometheus scrape endpoint: tool call metrics plus a snapshot of the /ready state"""
+    for name, dataset in datasets.items():
+        metrics.set("biotools_dataset_warm", int(dataset.state == "warm"), dataset=name)
+        if dataset.load_seconds is not None:
+            metrics.set("biotools_dataset_load_seconds", dataset.load_seconds, dataset=name)
+    metrics.set("biotools_expression_store_bytes", exp_store.stats()["nbytes"])
+    for cache_name, cache in (("result", result_cache), ("step", step_cache)):
+        stats = cache.stats()
+        metrics.set("biotools_cache_bytes", stats["bytes"], cache=cache_name)
+        metrics.set("biotools_cache_entries", stats["entries"], cache=cache_name)
+    for executor in (data_executor, lookup_executor, step_executor):
+        for tool, stats in executor.stats().items():
+            metrics.set("biotools_tool_queue_waiting", stats["waiting"], pool=executor.name, tool=tool)
+            metrics.set("biotools_tool_queue_running", stats["running"], pool=executor.name, tool=tool)
+            metrics.set("biotools_tool_queue_wait_seconds_total", stats["wait_seconds"], pool=executor.name, tool=tool)
+    jobs = job_scheduler.stats()
+    metrics.set("biotools_jobs_running", jobs["running"])
+    metrics.set("biotools_jobs_queued", jobs["queued"])
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@mcp.custom_route("/ready", methods=["GET"])
+async def ready(request: Request) -> JSONResponse:
+    """
+    Readiness probe: ready once the datasets loaded at startup have settled (none in lazy mode,
+    where datasets load on first use), plus per-dataset, resident store and cache state
+    """
+    status = {name: dataset.status() for name, dataset in datasets.items()}
+    pending = [name for name in startup_datasets if status[name]["state"] in ("cold", "loading")]
+    is_ready = not pending
+    return JSONResponse(
+        {
+            "ready": is_ready,
+            "startup_mode": startup_mode,
+            "pending": pending,
+            "failed": [name for name, dataset in status.items() if dataset["state"] == "failed"],
+            "datasets": status,
+            "expression_store": exp_store.stats(),
+            "annotation_indexes": sorted(annotation_indexes),
+            "result_cache": result_cache.stats(),
+            "step_cache": step_cache.stats(),
+            "jobs": job_scheduler.stats(),
+            "tool_pools": {
+                executor.name: executor.stats() for executor in (data_executor, lookup_executor, step_executor)
+            },
+        },
+        status_code=200 if is_ready else 503,
+    )
+
+
 if __name__ == "__main__":
+    job_scheduler.ensure_started()
+    if startup_mode == "background":
+        for name in startup_datasets:
+            datasets[name].warm_in_background()
     try:
-        mcp.run(transport="streamable-http", host="0.0.0.0", port=3001, path="/biotools")
+        mcp.run(transport="streamable-http", host="0.0.0.0", port=port, path="/biotools")
     except Exception as e:
         print(f"Fatal error starting MCP server: {_truncate_error(str(e))}")
         exit(1)
\ No newline at end of file
@@ -0,0 +1,36 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import make_bench_data  # noqa: E402
+
+# server.py reads its directories from the environment at import time; point them at a
+# scratch directory so the tests never touch /data or /tmp of a running server.
+# BIOTOOLS_TEST_DATA_DIR reuses a tree written by make_bench_data.py (e.g. a larger scale for
+# the benchmarks), otherwise a BIOTOOLS_TEST_SCALE (default tiny) tree is generated per run.
+scratch_dir = tempfile.mkdtemp(prefix="biotools_tests_")
+data_dir = os.environ.get("BIOTOOLS_TEST_DATA_DIR")
+if not data_dir:
+    data_dir = f"{scratch_dir}/data"
+    make_bench_data.generate(
+        data_dir, os.environ.get("BIOTOOLS_TEST_SCALE", "tiny"), seed=0, columnar=True, tr_matrix=True
+    )
+os.environ["BIOTOOLS_DATA_DIR"] = data_dir
+os.environ["BIOTOOLS_TMP_DIR"] = f"{scratch_dir}/tmp"
+os.environ["BIOTOOLS_STARTUP"] = "lazy"
+os.makedirs(os.environ["BIOTOOLS_TMP_DIR"], exist_ok=True)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(scratch_dir, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def bench_data() -> str:
+    """Synthetic /data tree the server was imported with"""
+    return data_dir
@@ -0,0 +1,71 @@
+"""
+Hot paths of the server timed with pytest-benchmark. A plain run executes each one once as a
+smoke test; pass --benchmark-enable to time them (see README, Tests).
+"""
+
+import numpy as np
+import pytest
+
+import server
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.fixture(scope="module")
+def genes():
+    symbols = server._gene_index().selector.symbols
+    return list(symbols[np.random.default_rng(0).choice(len(symbols), 200, replace=False)])
+
+
+@pytest.mark.benchmark(group="annotation")
+def test_interval_overlaps(benchmark):
+    index = server._annotation_index("Super_Enhancer_SEdbv2")
+    rng = np.random.default_rng(0)
+    starts = rng.integers(0, 100_000_000, 1_000)
+
+    def query():
+        return sum(len(index.overlaps("chr1", int(start), int(start) + 100_000)) for start in starts)
+
+    benchmark(query)
+
+
+@pytest.mark.benchmark(group="genes")
+def test_gene_selection(benchmark, genes):
+    selector = server._gene_index().selector
+    queries = genes + [gene.lower() for gene in genes] + ["NOT_A_GENE"]
+    rows, unmatched, _ = benchmark(selector.select, queries)
+    assert len(rows) == len(genes) and unmatched == ["NOT_A_GENE"]
+
+
+@pytest.mark.benchmark(group="tr")
+def test_tr_search(benchmark):
+    symbols = sorted({key.split("@")[0] for key in server.tr_data_db})
+    benchmark(lambda: [server.tr_index.search(symbol[:3]) for symbol in symbols])
+
+
+@pytest.mark.benchmark(group="tr")
+def test_tr_matrix_score(benchmark, genes):
+    matrix = server._tr_matrix()
+    rows, _, _ = matrix.selector.select(genes)
+    ranking = benchmark(matrix.score, rows)
+    assert len(ranking) == len(matrix.trs)
+
+
+@pytest.mark.benchmark(group="enrichment")
+def test_geneset_enrich(benchmark):
+    server.datasets["geneset"].ensure()
+    matrix = server._geneset_matrix("KEGG")
+    rng = np.random.default_rng(0)
+    queries = [rng.choice(len(matrix.genes), 100, replace=False) for _ in range(20)]
+    results = benchmark(matrix.enrich, queries, 1, 1, 1)
+    assert len(results) == len(queries)
+
+
+@pytest.mark.benchmark(group="expression")
+def test_expression_take(benchmark):
+    name, path = server._expression_source("gene_expression_TCGA", server.gene_expression_TCGA, partition="BRCA")
+    matrix = server.exp_store.get(name, path)
+    rng = np.random.default_rng(0)
+    rows = np.sort(rng.choice(len(matrix.genes), min(200, len(matrix.genes)), replace=False))
+    frame = benchmark(matrix.take, rows)
+    assert len(frame) == len(rows)
@@ -0,0 +1,172 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pytest
+
+import server
+
+
+def write_artifact(path, size):
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    return str(path)
+
+
+def test_result_cache_hit_and_invalidation(tmp_path):
+    cache = server.ResultCache(str(tmp_path / "index.json"), max_bytes=1000, max_age=3600)
+    source = write_artifact(tmp_path / "source.bed", 10)
+    key = cache.key("tool", {"genes": ["TP53"]}, [source])
+    assert cache.key("tool", {"genes": ["TP53"]}, [source]) == key
+    assert cache.key("tool", {"genes": ["EGFR"]}, [source]) != key
+    assert cache.get(key) is None
+
+    artifact = write_artifact(tmp_path / "artifact.csv", 100)
+    cache.put(key, artifact, "result")
+    assert cache.get(key) == "result"
+
+    # A changed source gives a new key; a changed artifact invalidates the entry
+    time.sleep(0.01)
+    write_artifact(tmp_path / "source.bed", 20)
+    assert cache.key("tool", {"genes": ["TP53"]}, [source]) != key
+    write_artifact(tmp_path / "artifact.csv", 50)
+    assert cache.get(key) is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_result_cache_evicts_by_size_and_age(tmp_path):
+    cache = server.ResultCache(str(tmp_path / "index.json"), max_bytes=250, max_age=3600)
+    paths = [write_artifact(tmp_path / f"artifact_{i}.csv", 100) for i in range(3)]
+    cache.put("a", paths[0], "a")
+    cache.put("b", paths[1], "b")
+    cache.get("a")
+    cache.put("c", paths[2], "c")
+    assert cache.get("b") is None
+    assert not os.path.exists(paths[1])
+    assert cache.get("a") == "a" and cache.get("c") == "c"
+
+    cache.max_age = 0
+    time.sleep(0.01)
+    cache.evict()
+    assert cache.stats()["entries"] == 0
+
+
+def test_result_cache_index_survives_restart(tmp_path):
+    index = str(tmp_path / "index.json")
+    artifact = write_artifact(tmp_path / "artifact.csv", 10)
+    server.ResultCache(index, 1000, 3600).put("key", artifact, "result")
+    assert server.ResultCache(index, 1000, 3600).get("key") == "result"
+
+
+def test_step_cache_restores_outputs(tmp_path):
+    cache = server.StepCache(str(tmp_path / "cache"), max_bytes=10_000)
+    source = tmp_path / "in.txt"
+    source.write_text("b\na\n")
+    output = tmp_path / "out" / "sorted.txt"
+    output.parent.mkdir()
+    output.write_text("a\nb\n")
+    log = tmp_path / "command.log"
+    log.write_text("done\n")
+
+    command = f"sort {source} > {output}"
+    key = cache.key(command, [str(source)], [str(output)])
+    assert cache.key(f"sort  {source}  >  {output}", [str(source)], [str(output)]) == key
+    assert cache.restore(key) is None
+    cache.put(key, command, [str(output)], str(log), runtime=1.5)
+
+    output.unlink()
+    entry = cache.restore(key)
+    assert entry["runtime"] == 1.5
+    assert output.read_text() == "a\nb\n"
+    assert open(cache.log_path(key)).read() == "done\n"
+
+    # Same path, different content: a different key
+    source.write_text("c\na\n")
+    assert cache.key(command, [str(source)], [str(output)]) != key
+    assert server.StepCache(str(tmp_path / "cache"), max_bytes=10_000).restore(key) is not None
+
+
+def test_step_cache_evicts_least_recently_used(tmp_path):
+    cache = server.StepCache(str(tmp_path / "cache"), max_bytes=2_500)
+    log = tmp_path / "command.log"
+    log.write_text("")
+    for name in ("a", "b", "c"):
+        output = tmp_path / f"{name}.bin"
+        output.write_bytes(b"x" * 1_000)
+        cache.put(name, f"make {name}", [str(output)], str(log), runtime=0)
+        if name == "b":
+            cache.restore("a")
+    assert cache.restore("b") is None
+    assert cache.restore("a") is not None and cache.restore("c") is not None
+    assert not os.path.exists(tmp_path / "cache" / "b")
+
+
+@pytest.fixture
+def arrow_matrix(tmp_path):
+    frame = pd.DataFrame(
+        np.arange(200 * 30, dtype=np.float32).reshape(200, 30),
+        index=pd.Index([f"GENE{i}" for i in range(200)], name="gene"),
+        columns=[f"S{i}" for i in range(30)],
+    )
+    path = str(tmp_path / "matrix.arrow")
+    feather.write_feather(pa.Table.from_pandas(frame, preserve_index=True), path, compression="uncompressed")
+    frame.to_csv(tmp_path / "matrix.csv")
+    return frame, path, str(tmp_path / "matrix.csv")
+
+
+def test_expression_matrix_formats_agree(arrow_matrix):
+    frame, arrow_path, csv_path = arrow_matrix
+    rows, columns = np.array([5, 0, 199]), np.array([3, 29])
+    for path in (arrow_path, csv_path):
+        matrix = server._load_expression_matrix(path)
+        pd.testing.assert_frame_equal(
+            matrix.take(rows, columns), frame.iloc[rows, columns], check_names=False, check_dtype=False
+        )
+        assert list(matrix.prefix_columns("S2")) == [2] + list(range(20, 30))
+
+
+def test_expression_store_counts_mapped_matrices(arrow_matrix):
+    _, arrow_path, _ = arrow_matrix
+    matrix = server._load_expression_matrix(arrow_path)
+    assert matrix.nbytes >= 200 * 30 * 4
+
+    store = server.ExpressionStore(max_bytes=int(matrix.nbytes * 1.5))
+    store.get("a", arrow_path)
+    store.get("b", arrow_path)
+    assert store.stats()["sources"] == ["b"]
+
+
+def test_step_cache_restore_copies_outside_the_lock(tmp_path, monkeypatch):
+    cache = server.StepCache(str(tmp_path / "cache"), max_bytes=1_500)
+    log = tmp_path / "command.log"
+    log.write_text("")
+    output = tmp_path / "a.bin"
+    output.write_bytes(b"x" * 1_000)
+    cache.put("a", "make a", [str(output)], str(log), runtime=0)
+
+    other = tmp_path / "b.bin"
+    other.write_bytes(b"y" * 1_000)
+    copy_output = server._copy_output
+
+    def copy_while_another_step_is_recorded(src, dst):
+        # Lookups and puts go ahead during the copy, and cannot evict the entry being restored
+        if dst == str(output):
+            assert not cache._lock.locked()
+            cache.put("b", "make b", [str(other)], str(log), runtime=0)
+            assert cache.stats()["entries"] == 2
+        copy_output(src, dst)
+
+    monkeypatch.setattr(server, "_copy_output", copy_while_another_step_is_recorded)
+    output.unlink()
+    assert cache.restore("a") is not None
+    assert output.read_bytes() == b"x" * 1_000
+
+
+def test_gene_index_sidecar_is_written_outside_the_data(bench_data):
+    assert server.bed_config["gene_index_path"].startswith(server.tmp_docker)
+    server._load_gene_frame(server.bed_config["gene_bed_path"], server.bed_config["gene_index_path"])
+    assert os.path.exists(server.bed_config["gene_index_path"])
+    assert not os.path.exists(f"{bench_data}/human/gene.bed.arrow")
@@ -0,0 +1,81 @@
+from fractions import Fraction
+from math import comb
+
+import numpy as np
+import pytest
+import scipy.stats
+
+import server
+
+
+def exact_sf(overlap, population, successes, draws):
+    """P(X >= overlap) in exact rational arithmetic"""
+    tail = sum(
+        comb(successes, x) * comb(population - successes, draws - x)
+        for x in range(overlap, min(successes, draws) + 1)
+    )
+    return float(Fraction(tail, comb(population, draws)))
+
+
+@pytest.mark.parametrize(
+    "overlap, population, successes, draws",
+    [
+        (0, 100, 10, 10),
+        (1, 100, 10, 10),
+        (3, 100, 10, 10),
+        (10, 100, 10, 10),
+        (11, 100, 10, 10),
+        (5, 20, 15, 10),  # lower bound of the support above zero
+        (2, 20000, 200, 150),
+        (40, 20000, 200, 150),  # ~1e-46
+        (150, 20000, 500, 150),  # ~1e-251, last term of the support
+        (120, 30000, 400, 300),
+        (300, 2000, 1500, 300),  # successes cover most of the population
+        (200, 2000, 1500, 300),  # tail of ~100 terms summing close to 1
+    ],
+)
+def test_hypergeom_sf_matches_exact(overlap, population, successes, draws):
+    expected = exact_sf(overlap, population, successes, draws)
+    p = server._hypergeom_sf(overlap, population, successes, draws)
+    assert p == pytest.approx(expected, rel=1e-9, abs=1e-300)
+
+
+def test_hypergeom_sf_matches_scipy_on_grid():
+    rng = np.random.default_rng(0)
+    population = 5000
+    successes = rng.integers(1, 400, 300)
+    draws = rng.integers(1, 300, (4, 1))
+    overlap = rng.binomial(draws, successes[None, :] / population) + rng.integers(0, 3, (4, 300))
+
+    p = server._hypergeom_sf(overlap, population, successes[None, :], draws)
+    expected = scipy.stats.hypergeom.sf(overlap - 1, population, successes[None, :], draws)
+    assert p.shape == overlap.shape
+    np.testing.assert_allclose(p, expected, rtol=1e-9, atol=1e-300)
+
+
+def test_bh_fdr_matches_reference():
+    # R: p.adjust(c(0.01, 0.04, 0.03, 0.005, 0.2, 0.5), "BH")
+    p = np.array([0.01, 0.04, 0.03, 0.005, 0.2, 0.5])
+    expected = [0.03, 0.06, 0.06, 0.03, 0.24, 0.5]
+    np.testing.assert_allclose(server._bh_fdr(p), expected)
+    np.testing.assert_allclose(server._bh_fdr(np.vstack([p, p[::-1]])), [expected, expected[::-1]])
+    assert server._bh_fdr(np.zeros((2, 0))).shape == (2, 0)
+
+
+def test_geneset_matrix_enrich():
+    genesets = {
+        "cell_cycle": ["CDK1", "CDK2", "CCNB1", "CCNE1"],
+        "apoptosis": ["TP53", "BAX", "CASP3"],
+        "other": ["GAPDH", "ACTB", "CDK1"],
+    }
+    matrix = server.GenesetMatrix(genesets)
+    rows, _, _ = matrix.selector.select(["CDK1", "CDK2", "CCNB1"])
+    result = matrix.enrich([rows, np.zeros(0, dtype=np.int64)], pvalue=1, fdr=1, bonferroni=1)
+
+    top = result[0].iloc[0]
+    assert top["geneset"] == "cell_cycle"
+    assert top["overlap"] == 3
+    assert set(top["overlap_genes"].split(",")) == {"CDK1", "CDK2", "CCNB1"}
+    population = len(matrix.genes)
+    assert top["p_value"] == pytest.approx(exact_sf(3, population, 4, 3))
+    assert result[1].empty
@@ -0,0 +1,71 @@
+import gzip
+import os
+import struct
+
+import pytest
+
+import server
+
+
+def bgzf_blocks(data):
+    """(block size, uncompressed size) of every BGZF block, read from the BC extra field"""
+    blocks, offset = [], 0
+    while offset < len(data):
+        magic, _, flags, _, _, _, xlen, si1, si2, _, bsize = struct.unpack_from("<HBBIBBHBBHH", data, offset)
+        assert (magic, flags, xlen, si1, si2) == (0x8B1F, 4, 6, ord("B"), ord("C"))
+        block_size = bsize + 1
+        blocks.append((block_size, struct.unpack_from("<I", data, offset + block_size - 4)[0]))
+        offset += block_size
+    return blocks
+
+
+def test_bgzf_roundtrip(tmp_path):
+    data = os.urandom(50_000).hex().encode()  # 100 kB over two blocks
+    path = str(tmp_path / "out.bed.gz")
+    server._write_bgzf(path, data)
+    raw = open(path, "rb").read()
+
+    assert gzip.decompress(raw) == data
+    assert raw.endswith(server.BGZF_EOF)
+    blocks = bgzf_blocks(raw)
+    assert [size for _, size in blocks] == [0xFF00, len(data) - 0xFF00, 0]
+    assert all(block_size <= 65536 for block_size, _ in blocks)
+
+
+def test_write_atomic_leaves_no_partial_file(tmp_path):
+    path = str(tmp_path / "result.csv")
+    server._write_atomic(path, lambda tmp: open(tmp, "w").write("a,b\n"))
+    assert open(path).read() == "a,b\n"
+
+    def fail(tmp):
+        open(tmp, "w").write("partial")
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        server._write_atomic(path, fail)
+    assert open(path).read() == "a,b\n"
+    assert os.listdir(tmp_path) == ["result.csv"]
+
+
+@pytest.mark.parametrize("mode", ["reflink", "copy"])
+def test_delivered_copies_do_not_share_the_source(tmp_path, mode):
+    source = tmp_path / "TR.bed"
+    source.write_text("chr1\t1\t2\n")
+    target = str(tmp_path / "delivered.bed")
+    method, _ = server._deliver_file(str(source), target, mode)
+    assert method in ("linked", "copied")
+    assert server._deliver_file(str(source), target, mode) == ("reused", 0)
+
+    # Editing the delivered file in place must not reach the database
+    with open(target, "a") as f:
+        f.write("chr1\t5\t6\n")
+    assert source.read_text() == "chr1\t1\t2\n"
+
+
+def test_hardlink_delivery_is_opt_in(tmp_path):
+    assert server.tr_delivery_mode in ("reflink", "copy") or os.environ.get("BIOTOOLS_TR_DELIVERY")
+    source = tmp_path / "TR.bed"
+    source.write_text("chr1\t1\t2\n")
+    target = str(tmp_path / "linked.bed")
+    assert server._deliver_file(str(source), target, "hardlink") == ("linked", 0)
+    assert os.stat(target).st_ino == source.stat().st_ino
@@ -0,0 +1,101 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import server
+
+
+def levenshtein(a, b):
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def test_interval_index_skips_headers_and_keeps_lines(tmp_path):
+    path = tmp_path / "regions.bed"
+    path.write_bytes(
+        b"track name=test\n"
+        b"# comment\n"
+        b"chr1\t100\t200\tA\t0\t+\n"
+        b"\n"
+        b"chr1\t150\t160\tB\r\n"
+        b"browser position chr1\n"
+        b"chr2\t0\t50\tC\n"
+        b"chr1\t300\t400\tD"
+    )
+    index = server.IntervalIndex(str(path))
+    assert len(index) == 4
+    assert [index.line(i) for i in index.overlaps("chr1", 155, 156)] == [b"chr1\t100\t200\tA\t0\t+", b"chr1\t150\t160\tB"]
+    # Half-open intervals: touching ends do not overlap
+    assert list(index.overlaps("chr1", 200, 300)) == []
+    assert [index.line(i) for i in index.overlaps("chr1", 199, 301)] == [b"chr1\t100\t200\tA\t0\t+", b"chr1\t300\t400\tD"]
+    assert list(index.overlaps("chrX", 0, 10**9)) == []
+
+
+def test_interval_index_empty_file(tmp_path):
+    path = tmp_path / "empty.bed"
+    path.write_bytes(b"")
+    index = server.IntervalIndex(str(path))
+    assert len(index) == 0
+    assert list(index.overlaps("chr1", 0, 100)) == []
+
+
+def test_interval_index_matches_brute_force(bench_data):
+    path = f"{bench_data}/human/human_Super_Enhancer_SEdbv2.bed"
+    index = server.IntervalIndex(path)
+    rows = [line.split("\t") for line in open(path).read().splitlines()]
+    rng = np.random.default_rng(1)
+    for _ in range(50):
+        chrom, start, end = rows[rng.integers(len(rows))][:3]
+        query_start = int(start) + int(rng.integers(-50_000, 50_000))
+        query_end = query_start + int(rng.integers(1, 100_000))
+        expected = sorted(
+            i for i, row in enumerate(rows)
+            if row[0] == chrom and int(row[1]) < query_end and int(row[2]) > query_start
+        )
+        assert sorted(index.overlaps(chrom, query_start, query_end)) == expected
+
+
+@pytest.mark.parametrize("a, b", list(itertools.product(["", "TP53", "TP63", "GATA4", "GATA", "ATAG4"], repeat=2)))
+def test_edit_distance(a, b):
+    distance = levenshtein(a, b)
+    for max_distance in range(4):
+        expected = distance if distance <= max_distance else max_distance + 1
+        assert server._edit_distance(a, b, max_distance) == expected
+
+
+def test_tr_index_ranking():
+    keys = ["GATA4@Sample_01", "GATA3@Sample_02", "ZGATA@Sample_03", "TP53@Sample_04", "TP63@Sample_05", "FOO@GATA_06"]
+    index = server.TRIndex({key: f"/data/{key}.bed" for key in keys})
+    # Exact symbol, prefix, substring, then a match in the sample name only
+    assert index.search("gata") == ["GATA3@Sample_02", "GATA4@Sample_01", "ZGATA@Sample_03", "FOO@GATA_06"]
+    assert index.search("GATA4") == ["GATA4@Sample_01"]
+    assert index.search("p5") == ["TP53@Sample_04"]
+    assert index.search("missing") == []
+    # Typos fall back to edit distance over symbols
+    assert index.fuzzy("TPP53") == ["TP53@Sample_04"]
+    assert index.fuzzy("GATTA4") == ["GATA4@Sample_01"]
+    assert index.fuzzy("TP") == ["TP53@Sample_04", "TP63@Sample_05"]
+    assert index.fuzzy("XXXXXXXX") == []
+
+
+@pytest.mark.parametrize(
+    "a, b, same",
+    [
+        ("sort  -k1,1   in.bed > out.bed", "sort -k1,1 in.bed > out.bed", True),
+        ("  bedtools intersect -a a.bed -b b.bed\n", "bedtools intersect -a a.bed -b b.bed", True),
+        ("a && b", "a '&&' b", False),
+        ("x | y", "x '|' y", False),
+        ("x | y", 'x "|" y', False),
+        ("echo 'a  b'", "echo 'a b'", False),
+        ('echo "a  b"', 'echo "a b"', False),
+        ("a\\ b", "a b", False),
+    ],
+)
+def test_normalise_command(a, b, same):
+    assert (server._normalise_command(a) == server._normalise_command(b)) is same
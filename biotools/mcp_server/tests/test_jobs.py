@@ -0,0 +1,92 @@
+import os
+import subprocess
+import time
+
+import pytest
+
+import server
+
+
+def wait_for(scheduler, job_id, states=server.JOB_FINAL_STATES, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = scheduler.get(job_id)
+        if job["state"] in states:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} still {job['state']}")
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    return server.JobScheduler(str(tmp_path / "jobs"), cpu_slots=2, memory_mb=1000)
+
+
+def test_job_runs_and_records_exit_code(scheduler):
+    ok = scheduler.submit("echo hello", "s1", 1, 0, None)
+    failing = scheduler.submit("echo oops >&2; exit 3", "s1", 1, 0, None)
+    assert wait_for(scheduler, ok["id"])["state"] == "succeeded"
+    job = wait_for(scheduler, failing["id"])
+    assert (job["state"], job["exit_code"]) == ("failed", 3)
+    assert open(job["log"]).read() == "oops\n"
+
+
+def test_jobs_wait_for_resources(scheduler):
+    first = scheduler.submit("sleep 0.5", "s1", 2, 0, None)
+    second = scheduler.submit("true", "s1", 1, 0, None)
+    wait_for(scheduler, first["id"], ("running",))
+    assert scheduler.get(second["id"])["state"] == "queued"
+    assert wait_for(scheduler, second["id"])["started_at"] >= wait_for(scheduler, first["id"])["finished_at"] - 1
+
+
+def test_sessions_are_served_round_robin(scheduler):
+    blocker = scheduler.submit("sleep 0.3", "s0", 2, 0, None)
+    wait_for(scheduler, blocker["id"], ("running",))
+    a = [scheduler.submit("sleep 0.1", "a", 2, 0, None) for _ in range(2)]
+    b = scheduler.submit("sleep 0.1", "b", 2, 0, None)
+    jobs = [wait_for(scheduler, job["id"]) for job in a + [b]]
+    order = [job["id"] for job in sorted(jobs, key=lambda job: job["started_at"])]
+    assert order == [a[0]["id"], b["id"], a[1]["id"]]
+
+
+def test_cancel_and_timeout(scheduler):
+    running = scheduler.submit("sleep 30", "s1", 1, 0, None)
+    queued = scheduler.submit("sleep 30", "s1", 2, 0, None)
+    timed = scheduler.submit("sleep 30", "s2", 1, 0, 0.2)
+    wait_for(scheduler, running["id"], ("running",))
+
+    start = time.monotonic()
+    assert scheduler.cancel(queued["id"])["state"] == "cancelled"
+    assert scheduler.cancel(running["id"])["state"] == "cancelled"
+    assert time.monotonic() - start < 1
+    assert wait_for(scheduler, timed["id"])["state"] == "timed_out"
+
+
+def test_jobs_survive_restart(tmp_path, scheduler):
+    running = scheduler.submit("sleep 0.5; exit 4", "s1", 2, 0, None)
+    wait_for(scheduler, running["id"], ("running",))
+
+    # A second scheduler over the same directory adopts the job still running detached
+    restarted = server.JobScheduler(str(tmp_path / "jobs"), cpu_slots=2, memory_mb=1000)
+    assert restarted.get(running["id"])["state"] == "running"
+    job = wait_for(restarted, running["id"])
+    assert (job["state"], job["exit_code"]) == ("failed", 4)
+
+
+def test_process_group_usage_counts_reaped_children():
+    # The busy subshell exits and is reaped by the shell while the group is still running
+    proc = subprocess.Popen(
+        ["sh", "-c", "(i=0; while [ $i -lt 300000 ]; do i=$((i+1)); done); exec sleep 5"], start_new_session=True
+    )
+    try:
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            with open(f"/proc/{proc.pid}/cmdline", "rb") as f:
+                if f.read().startswith(b"sleep"):
+                    break
+        rss, cpu = server._process_group_usage(proc.pid)
+        assert rss > 0 and cpu >= 0.1
+    finally:
+        server._kill_process_group(proc.pid)
+        proc.wait()
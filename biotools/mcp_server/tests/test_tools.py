@@ -0,0 +1,128 @@
+"""End-to-end tool calls against the synthetic data tree from make_bench_data.py"""
+
+import asyncio
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import server
+
+
+def call(tool, *args, **kwargs):
+    return asyncio.run(tool.fn(*args, **kwargs))
+
+
+def test_ready_waits_for_startup_datasets_only(monkeypatch):
+    # Lazy startup loads nothing up front, so the server is ready as soon as it listens
+    response = asyncio.run(server.ready(None))
+    body = json.loads(response.body)
+    assert response.status_code == 200 and body["ready"]
+    assert body["datasets"]["tr"]["state"] in ("cold", "warm")
+
+    monkeypatch.setattr(server, "startup_datasets", ["tr", "geneset"])
+    monkeypatch.setitem(server.datasets, "geneset", server.LazyDataset("geneset", "geneset data", dict))
+    server.datasets["tr"].ensure()
+    response = asyncio.run(server.ready(None))
+    assert response.status_code == 503
+    assert json.loads(response.body)["pending"] == ["geneset"]
+
+
+def test_search_and_get_tr_bed():
+    reply = call(server.search_tr, "ESR1")
+    assert "ESR1@Sample" in reply
+    key = reply.splitlines()[1].split(":")[0]
+    reply = call(server.get_tr_bed, [key])
+    assert not reply.startswith("Error"), reply
+    delivered = reply.splitlines()[1]
+    assert open(delivered).read() == open(server.tr_data_db[key]).read()
+
+
+def test_get_gene_position_formats():
+    bed = pd.read_csv(
+        call(server.get_gene_position, ["TP53", "p53", "EGFR"]).splitlines()[0], sep="\t", header=None
+    )
+    assert sorted(bed[4]) == ["EGFR", "TP53"]
+    reply = call(server.get_gene_position, ["TP53", "EGFR"], format="parquet")
+    assert sorted(pd.read_parquet(reply.splitlines()[0])["column_5"]) == ["EGFR", "TP53"]
+
+
+def test_query_annotation_regions_matches_index(bench_data):
+    reply = call(server.query_annotation_regions, "Super_Enhancer_SEdbv2", genes=["TP53"], flank=50_000)
+    assert not reply.startswith("Error"), reply
+    genes = pd.read_csv(f"{bench_data}/human/gene.bed", sep="\t", header=None)
+    chrom, start, end = genes.loc[genes[4] == "TP53", [0, 1, 2]].iloc[0]
+    regions = pd.read_csv(f"{bench_data}/human/human_Super_Enhancer_SEdbv2.bed", sep="\t", header=None)
+    expected = regions[(regions[0] == chrom) & (regions[1] < end + 50_000) & (regions[2] > start - 50_000)]
+    assert f"{len(expected)} " in reply
+
+
+def test_query_annotation_regions_sees_changed_bed(tmp_path, monkeypatch):
+    bed = tmp_path / "regions.bed"
+    bed.write_text("chr1\t100\t200\tA\n")
+    monkeypatch.setitem(server.bed_data_db, "Test_regions", str(bed))
+    assert "Found 1 overlap(s)" in call(server.query_annotation_regions, "Test_regions", regions=["chr1:0-1000"])
+
+    bed.write_text("chr1\t100\t200\tA\nchr1\t300\t400\tB\n")
+    reply = call(server.query_annotation_regions, "Test_regions", regions=["chr1:0-1000"])
+    assert "Found 2 overlap(s)" in reply
+    assert call(server.query_annotation_regions, "Test_regions", regions=["chr1:0-1000"]) == reply
+
+
+def test_rank_tr_and_cache():
+    reply = call(server.rank_tr, ["TP53", "EGFR", "MYC", "GATA4"], top_n=3)
+    assert reply.startswith("Top 3 TR(s):"), reply
+    assert "gene.bed changed" not in reply
+    ranking = pd.read_csv(reply.split("Full ranking: ")[1].splitlines()[0])
+    assert len(ranking) == len(server._tr_matrix().trs)
+    assert ranking["score"].is_monotonic_decreasing
+    hits = server.result_cache.hits
+    assert call(server.rank_tr, ["TP53", "EGFR", "MYC", "GATA4"], top_n=3) == reply
+    assert server.result_cache.hits == hits + 1
+
+
+def test_enrichment_tool():
+    category = "KEGG"
+    server.datasets["geneset"].ensure()
+    geneset, members = next(iter(server.class_data[category].items()))
+    reply = call(server.enrichment, members[:10], category, pvalue=1, fdr=1, bonferroni=1)
+    assert geneset in reply, reply
+
+
+@pytest.mark.parametrize("format", ["csv", "parquet", "feather"])
+def test_tcga_expression_uses_columnar_copy(format):
+    reply = call(server.get_tcga_cancer_express, "BRCA", ["TP53", "EGFR"], format=format)
+    assert not reply.startswith("Error"), reply
+    assert "gene_expression_TCGA/BRCA" in server.exp_store.stats()["sources"]
+
+
+def test_expression_stats_correlation_matches_on_cache_hit():
+    args = ("correlation", ["TP53", "EGFR", "MYC"], "gene_expression_TCGA", "BRCA")
+    reply = call(server.expression_stats, *args)
+    assert not reply.startswith("Error"), reply
+    assert reply.split()[0] == "gene"
+    hits = server.result_cache.hits
+    assert call(server.expression_stats, *args) == reply
+    assert server.result_cache.hits == hits + 1
+
+    matrix = pd.read_csv(reply.split("Full result: ")[1].splitlines()[0], index_col="gene")
+    assert sorted(matrix.index) == sorted(matrix.columns) == ["EGFR", "MYC", "TP53"]
+    assert (matrix.to_numpy().diagonal().round(6) == 1).all()
+    assert (matrix.to_numpy() == matrix.to_numpy().T).all()
+
+
+def test_expression_stats_fold_change_matches_on_cache_hit():
+    args = ("fold_change", ["TP53", "EGFR"], "gene_expression_TCGA", ["BRCA", "LUAD"])
+    reply = call(server.expression_stats, *args)
+    assert not reply.startswith("Error"), reply
+    assert call(server.expression_stats, *args) == reply
+
+    table = pd.read_csv(reply.split("Full result: ")[1].splitlines()[0])
+    assert list(table.columns[:2]) == ["gene", "cancer"]
+    assert sorted(zip(table["gene"], table["cancer"])) == [
+        ("EGFR", "BRCA"), ("EGFR", "LUAD"), ("TP53", "BRCA"), ("TP53", "LUAD"),
+    ]
+    assert (table[["n_tumor", "n_normal"]] > 0).all().all()
+    expected = np.log2((table["mean_tumor"] + 1) / (table["mean_normal"] + 1))
+    assert np.allclose(table["log2_fold_change"], expected)
@@ -131,3 +131,26 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Connection pool of chat.views.query_mysql (seconds for the timeouts)
+MYSQL_POOL = {
+    "MAX_SIZE": 8,
+    "IDLE_TIMEOUT": 300,
+    # Idle connections older than this are checked with SELECT 1 before reuse
+    "HEALTH_CHECK_AFTER": 30,
+    "ACQUIRE_TIMEOUT": 10,
+}
+
+# Row cap and streaming chunk size of chat.views.query_mysql
+MYSQL_QUERY = {
+    "MAX_ROWS": 10000,
+    "STREAM_CHUNK_ROWS": 1000,
+}
+
+# Result cache of chat.views.query_mysql: TTL in seconds, byte budget of each tier, and an optional
+# SQLite file (e.g. BASE_DIR / "query_cache.sqlite3") shared by all worker processes
+MYSQL_QUERY_CACHE = {
+    "TTL": 300,
+    "MAX_BYTES": 64 * 1024 * 1024,
+    "PATH": None,
+}
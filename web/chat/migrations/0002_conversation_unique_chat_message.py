@@ -0,0 +1,35 @@
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def remove_duplicate_conversations(apps, schema_editor):
+    """Keep only the latest row of each (chat_id, message_id) before making the pair unique"""
+    Conversation = apps.get_model("chat", "Conversation")
+    latest_ids = (
+        Conversation.objects.values("chat_id", "message_id")
+        .annotate(latest_id=Max("id"))
+        .values_list("latest_id", flat=True)
+    )
+    Conversation.objects.exclude(id__in=list(latest_ids)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_conversations, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="conversation",
+            constraint=models.UniqueConstraint(
+                fields=("chat_id", "message_id"), name="conversations_chat_message_uniq"
+            ),
+        ),
+        # The unique index leads with chat_id, so the single column index is redundant
+        migrations.RemoveIndex(
+            model_name="conversation",
+            name="conversatio_chat_id_624d8d_idx",
+        ),
+    ]
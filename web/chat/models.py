@@ -11,6 +11,11 @@ class Conversation(models.Model):
     class Meta:
         db_table = "conversations"
         indexes = [
-            models.Index(fields=["chat_id"]),
             models.Index(fields=["message_id"]),
         ]
+        constraints = [
+            # Also serves chat_id lookups and keyset pagination of a chat's history
+            models.UniqueConstraint(
+                fields=["chat_id", "message_id"], name="conversations_chat_message_uniq"
+            ),
+        ]
@@ -0,0 +1,164 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolTimeout(TimeoutError):
+    pass
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of DB-API connections created by `connect`.
+
+    Idle connections are reused most recently used first, closed once idle for longer than
+    `idle_timeout` seconds, and checked with `SELECT 1` before reuse when they have been idle
+    for more than `check_after` seconds. Callers wait up to `acquire_timeout` seconds for a
+    connection when `max_size` are in use.
+    """
+
+    def __init__(self, connect, max_size=8, idle_timeout=300, check_after=30, acquire_timeout=10):
+        self._connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self.acquire_timeout = acquire_timeout
+        self._idle = deque()  # (connection, released at), oldest on the left
+        self._size = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            "created": 0,
+            "closed": 0,
+            "health_check_failures": 0,
+            "acquired": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+            "timeouts": 0,
+        }
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; it is discarded instead of returned if it cannot be rolled back"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            # End the borrower's transaction so the next one does not read a stale snapshot
+            try:
+                conn.rollback()
+            except Exception:
+                self.release(conn, discard=True)
+            else:
+                self.release(conn)
+
+    def acquire(self):
+        start = time.monotonic()
+        deadline = start + self.acquire_timeout
+        waited = False
+        with self._cond:
+            while True:
+                self._close_expired()
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    # Reserve the slot, connect outside the lock
+                    self._size += 1
+                    conn, released_at = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"No connection available within {self.acquire_timeout}s")
+                waited = True
+                self._cond.wait(remaining)
+
+        if conn is not None and time.monotonic() - released_at > self.check_after and not self._healthy(conn):
+            self._close(conn)
+            with self._cond:
+                # The slot is kept for the replacement connection
+                self._stats["health_check_failures"] += 1
+                self._stats["closed"] += 1
+            conn = None
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats["created"] += 1
+
+        wait = time.monotonic() - start
+        with self._cond:
+            self._stats["acquired"] += 1
+            if waited:
+                self._stats["waits"] += 1
+            self._stats["wait_seconds"] += wait
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], wait)
+        return conn
+
+    def release(self, conn, discard=False):
+        if discard:
+            self._close(conn)
+        with self._cond:
+            if discard:
+                self._size -= 1
+                self._stats["closed"] += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def close(self):
+        """Close all idle connections (borrowed ones are closed when released with discard)"""
+        with self._cond:
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._stats["closed"] += len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._cond:
+            return dict(
+                self._stats,
+                size=self._size,
+                idle=len(self._idle),
+                in_use=self._size - len(self._idle),
+                max_size=self.max_size,
+            )
+
+    def _close_expired(self):
+        """Drop connections idle for longer than idle_timeout (called with the lock held)"""
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            conn, _ = self._idle.popleft()
+            self._size -= 1
+            self._stats["closed"] += 1
+            self._close(conn)
+
+    @staticmethod
+    def _healthy(conn):
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -0,0 +1,185 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Quoted strings and identifiers are kept verbatim, whitespace between them is collapsed
+SQL_TOKEN_PATTERN = re.compile(r"""('(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*"|`[^`]*`)|(\s+)""", re.DOTALL)
+
+
+def normalize_sql(sql):
+    """Collapse whitespace outside quotes and drop a trailing semicolon"""
+    sql = SQL_TOKEN_PATTERN.sub(lambda m: m.group(1) or " ", sql.strip())
+    return sql.rstrip(";").rstrip()
+
+
+class QueryCache:
+    """
+    TTL cache of serialized query results keyed by normalised SQL text.
+
+    The first tier is an in-process LRU bounded by `max_bytes` of values. When `path` is set,
+    a SQLite file shared by all worker processes is the second tier: misses of the first tier
+    are looked up there and promoted, and it is trimmed to `max_bytes` as well, expired and
+    least recently stored entries first. invalidate() touches `path + ".invalidated"`, which
+    every process checks before serving from its own LRU, so invalidation reaches all workers.
+    """
+
+    def __init__(self, ttl=300, max_bytes=64 * 1024 * 1024, path=None):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.path = str(path) if path else None
+        self._entries = OrderedDict()  # key -> (value, expires at), least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._marker_path = f"{self.path}.invalidated" if self.path else None
+        self._marker = None
+        self._stats = {"hits": 0, "shared_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "shared_errors": 0}
+        if self.path:
+            self._marker = self._marker_mtime()
+            self._shared(self._create_table)
+
+    @staticmethod
+    def key(sql, *options):
+        """Cache key of the normalised SQL and the options that shape its result"""
+        text = "\0".join([normalize_sql(sql)] + [repr(option) for option in options])
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return (value, tier) with tier "memory" or "shared", or (None, None) on a miss"""
+        self._check_marker()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry[0], "memory"
+                self._pop(key)
+
+        if self.path:
+            row = self._shared(lambda db: db.execute(
+                "SELECT value, expires FROM query_cache WHERE key = ? AND expires > ?", (key, now)
+            ).fetchone())
+            if row:
+                value, expires = row
+                self._remember(key, bytes(value), expires)
+                with self._lock:
+                    self._stats["shared_hits"] += 1
+                return bytes(value), "shared"
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None, None
+
+    def set(self, key, value):
+        """Store bytes under key for ttl seconds; values larger than max_bytes are not cached"""
+        if len(value) > self.max_bytes:
+            return
+        expires = time.time() + self.ttl
+        self._remember(key, value, expires)
+        if self.path:
+            self._shared(lambda db: self._store(db, key, value, expires))
+
+    def invalidate(self, key=None):
+        """Drop one key, or every entry when key is None, from both tiers"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._bytes = 0
+            elif key in self._entries:
+                self._pop(key)
+            self._stats["invalidations"] += 1
+        if self.path:
+            if key is None:
+                self._shared(lambda db: db.execute("DELETE FROM query_cache"))
+            else:
+                self._shared(lambda db: db.execute("DELETE FROM query_cache WHERE key = ?", (key,)))
+            self._touch_marker()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), bytes=self._bytes, max_bytes=self.max_bytes, ttl=self.ttl, shared=bool(self.path))
+
+    def _remember(self, key, value, expires):
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (value, expires)
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def _pop(self, key):
+        """Remove key from the LRU (called with the lock held)"""
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def _store(self, db, key, value, expires):
+        now = time.time()
+        db.execute(
+            "INSERT OR REPLACE INTO query_cache (key, value, size, expires, stored) VALUES (?, ?, ?, ?, ?)",
+            (key, value, len(value), expires, now),
+        )
+        db.execute("DELETE FROM query_cache WHERE expires <= ?", (now,))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM query_cache").fetchone()[0]
+        if total > self.max_bytes:
+            # Oldest first until the shared tier fits again
+            for old_key, size in db.execute("SELECT key, size FROM query_cache ORDER BY stored").fetchall():
+                if total <= self.max_bytes:
+                    break
+                db.execute("DELETE FROM query_cache WHERE key = ?", (old_key,))
+                total -= size
+
+    @staticmethod
+    def _create_table(db):
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS query_cache "
+            "(key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, expires REAL NOT NULL, stored REAL NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS query_cache_stored ON query_cache (stored)")
+
+    def _shared(self, operation):
+        """Run operation in a transaction on the shared tier; errors only disable it for this call"""
+        try:
+            db = sqlite3.connect(self.path, timeout=5)
+            try:
+                with db:
+                    return operation(db)
+            finally:
+                db.close()
+        except sqlite3.Error:
+            with self._lock:
+                self._stats["shared_errors"] += 1
+            return None
+
+    def _marker_mtime(self):
+        try:
+            return os.stat(self._marker_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _touch_marker(self):
+        try:
+            with open(self._marker_path, "a"):
+                pass
+            os.utime(self._marker_path)
+        except OSError:
+            return
+        self._marker = self._marker_mtime()
+
+    def _check_marker(self):
+        """Clear the LRU when another process invalidated the shared tier"""
+        if not self._marker_path:
+            return
+        marker = self._marker_mtime()
+        if marker != self._marker:
+            with self._lock:
+                self._entries.clear()
+                self._bytes = 0
+            self._marker = marker
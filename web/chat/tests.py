@@ -1,6 +1,16 @@
-from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, Client, override_settings
 from django.urls import reverse
+from .models import Conversation
+from .pool import ConnectionPool, PoolTimeout
+from .query_cache import QueryCache, normalize_sql
+from . import views
+from unittest import mock
 import json
+import sqlite3
+import tempfile
+import threading
+import time
 
 class CollectionAPITest(TestCase):
     def setUp(self):
@@ -10,9 +20,9 @@ class CollectionAPITest(TestCase):
     def test_collection_post(self):
         data = {
             'chat_id': 1,
-            'id': 1,
-            'user': 'test message',
-            'agent': [{'memory_id': 1, 'role': 'user', 'content': 'test content'}]
+            'message_id': 1,
+            'user_message': 'test message',
+            'agent_messages': [{'memory_id': 1, 'role': 'user', 'content': 'test content'}]
         }
         response = self.client.post(
             self.url,
@@ -29,4 +39,429 @@ class CollectionAPITest(TestCase):
             content_type='application/json'
         )
         self.assertEqual(response.status_code, 400)
-        self.assertEqual(response.json()['status'], 'error')
\ No newline at end of file
+        self.assertEqual(response.json()['status'], 'error')
+
+class CollectionBatchAPITest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.url = reverse('collection_batch')
+
+    def post(self, data):
+        return self.client.post(self.url, data=json.dumps(data), content_type='application/json')
+
+    def conversation(self, message_id, user_message='test message'):
+        return {
+            'chat_id': 'chat-1',
+            'message_id': message_id,
+            'user_message': user_message,
+            'agent_messages': [{'memory_id': 1, 'role': 'user', 'content': 'test content'}],
+        }
+
+    def test_batch_creates_and_updates(self):
+        existing = Conversation.objects.create(**self.conversation(1))
+        response = self.post([self.conversation(1, 'edited'), self.conversation(2)])
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['status'], 'success')
+        self.assertEqual(body['ids'][0], existing.id)
+        self.assertEqual(body['count'], 2)
+        self.assertEqual(Conversation.objects.count(), 2)
+        self.assertEqual(Conversation.objects.get(id=existing.id).user_message, 'edited')
+        self.assertEqual(Conversation.objects.get(id=body['ids'][1]).message_id, 2)
+
+    def test_batch_repeated_key_keeps_last(self):
+        response = self.post({'conversations': [self.conversation(1, 'first'), self.conversation(1, 'last')]})
+        body = response.json()
+        self.assertEqual(body['ids'][0], body['ids'][1])
+        self.assertEqual(Conversation.objects.get().user_message, 'last')
+
+    def test_batch_invalid_item_writes_nothing(self):
+        response = self.post([self.conversation(1), {'chat_id': 'chat-1'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['status'], 'error')
+        self.assertEqual(Conversation.objects.count(), 0)
+
+    def test_batch_requires_array(self):
+        response = self.post(self.conversation(1))
+        self.assertEqual(response.status_code, 400)
+
+
+class CollectionUpsertTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.url = reverse('collection')
+
+    def post(self, message_id, user_message):
+        data = {
+            'chat_id': 'chat-1',
+            'message_id': message_id,
+            'user_message': user_message,
+            'agent_messages': [],
+        }
+        return self.client.post(self.url, data=json.dumps(data), content_type='application/json')
+
+    def test_repeated_post_updates_in_place(self):
+        first = self.post(1, 'draft').json()
+        second = self.post(1, 'final').json()
+        self.assertEqual(first['id'], second['id'])
+        self.assertEqual(Conversation.objects.count(), 1)
+        self.assertEqual(Conversation.objects.get().user_message, 'final')
+
+    def test_missing_key_is_rejected(self):
+        response = self.client.post(
+            self.url, data=json.dumps({'chat_id': 'chat-1'}), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_conflict_target_only_where_supported(self):
+        # MySQL's upsert cannot name the unique fields and Django rejects them there
+        features = views.connection.features
+        with mock.patch.object(features, 'supports_update_conflicts_with_target', False), \
+                mock.patch.object(Conversation.objects, 'bulk_create', return_value=[]) as bulk_create:
+            self.post(1, 'draft')
+        self.assertNotIn('unique_fields', bulk_create.call_args.kwargs)
+        self.assertTrue(bulk_create.call_args.kwargs['update_conflicts'])
+
+
+class ConversationHistoryAPITest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.url = reverse('conversation_history')
+        for message_id in range(1, 8):
+            Conversation.objects.create(
+                chat_id='chat-1', message_id=message_id, user_message=f'message {message_id}', agent_messages=[]
+            )
+        Conversation.objects.create(chat_id='chat-2', message_id=1, user_message='other', agent_messages=[])
+
+    def pages(self, **params):
+        message_ids = []
+        while True:
+            body = self.client.get(self.url, {'chat_id': 'chat-1', 'limit': 3, **params}).json()
+            self.assertEqual(body['status'], 'success')
+            message_ids.extend(row['message_id'] for row in body['data'])
+            if body['next_cursor'] is None:
+                return message_ids
+            params['cursor'] = body['next_cursor']
+
+    def test_pages_ascending(self):
+        self.assertEqual(self.pages(), [1, 2, 3, 4, 5, 6, 7])
+
+    def test_pages_descending(self):
+        self.assertEqual(self.pages(order='desc'), [7, 6, 5, 4, 3, 2, 1])
+
+    def test_requires_chat_id(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['status'], 'error')
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    """ConnectionPool against SQLite connections standing in for MySQL"""
+
+    def make_pool(self, **kwargs):
+        pool = ConnectionPool(lambda: sqlite3.connect(':memory:', check_same_thread=False), **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_reuses_connections(self):
+        pool = self.make_pool()
+        for _ in range(3):
+            with pool.connection() as conn:
+                self.assertEqual(conn.execute('SELECT 1').fetchone(), (1,))
+        stats = pool.stats()
+        self.assertEqual((stats['created'], stats['acquired'], stats['size'], stats['idle']), (1, 3, 1, 1))
+
+    def test_bounded_and_times_out(self):
+        pool = self.make_pool(max_size=1, acquire_timeout=0.05)
+        with pool.connection():
+            with self.assertRaises(PoolTimeout):
+                pool.acquire()
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_waiter_gets_released_connection(self):
+        pool = self.make_pool(max_size=1, acquire_timeout=5)
+        conn = pool.acquire()
+        threading.Timer(0.05, pool.release, args=(conn,)).start()
+        with pool.connection() as borrowed:
+            self.assertIs(borrowed, conn)
+        stats = pool.stats()
+        self.assertEqual(stats['waits'], 1)
+        self.assertGreater(stats['max_wait_seconds'], 0)
+
+    def test_recycles_idle_connections(self):
+        pool = self.make_pool(idle_timeout=0.01)
+        with pool.connection() as first:
+            pass
+        time.sleep(0.02)
+        with pool.connection() as second:
+            self.assertIsNot(second, first)
+        self.assertEqual((pool.stats()['created'], pool.stats()['closed']), (2, 1))
+
+    def test_replaces_broken_connection(self):
+        pool = self.make_pool(check_after=0)
+        conn = pool.acquire()
+        conn.close()
+        # A closed SQLite connection cannot roll back either, so release it as if it were healthy
+        pool.release(conn)
+        with pool.connection() as replacement:
+            self.assertEqual(replacement.execute('SELECT 1').fetchone(), (1,))
+        stats = pool.stats()
+        self.assertEqual((stats['health_check_failures'], stats['size']), (1, 1))
+
+
+class SQLiteStandIn:
+    """SQLite connection with the pymysql DictCursor interface used by query_mysql"""
+
+    class Cursor:
+        def __init__(self, cursor):
+            self._cursor = cursor
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            self.close()
+
+        @property
+        def description(self):
+            return self._cursor.description
+
+        def execute(self, sql, params=None):
+            if params is not None:
+                sql = sql.replace('%s', '?').replace('%%', '%')
+            self._cursor.execute(sql, params or ())
+
+        def fetchmany(self, size):
+            return [dict(row) for row in self._cursor.fetchmany(size)]
+
+        def close(self):
+            self._cursor.close()
+
+    def __init__(self):
+        self._conn = sqlite3.connect(':memory:', check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('CREATE TABLE regulation (id INTEGER PRIMARY KEY, tr TEXT, gene TEXT, score REAL)')
+        self._conn.executemany(
+            'INSERT INTO regulation VALUES (?, ?, ?, ?)',
+            [(i, f'TR{i % 3}', f'GENE{i}', i / 10) for i in range(1, 26)],
+        )
+        self._conn.commit()
+
+    def cursor(self, cursor_class=None):
+        return self.Cursor(self._conn.cursor())
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+@override_settings(MYSQL_QUERY={'MAX_ROWS': 10, 'STREAM_CHUNK_ROWS': 4})
+class QueryMysqlAPITest(SimpleTestCase):
+    def setUp(self):
+        self.client = Client()
+        self.url = reverse('query_mysql')
+        pool = ConnectionPool(SQLiteStandIn, max_size=1)
+        patcher = mock.patch.object(views, 'mysql_pool', pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(pool.close)
+        patcher = mock.patch.object(views, 'query_cache', QueryCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, **params):
+        return self.client.get(self.url, {'sql': 'SELECT * FROM regulation', **params})
+
+    def stream(self, **params):
+        response = self.get(stream='1', **params)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_row_cap(self):
+        result = self.get().json()['result']
+        self.assertEqual((result['count'], result['truncated'], result['next_cursor']), (10, True, None))
+
+    def test_projection(self):
+        result = self.get(columns='gene,score', limit=2).json()['result']
+        self.assertEqual(result['columns'], ['gene', 'score'])
+        self.assertEqual(result['data'][0], {'gene': 'GENE1', 'score': 0.1})
+
+    def test_keyset_pages(self):
+        ids, params = [], {'key': 'id', 'limit': 10}
+        while True:
+            result = self.get(**params).json()['result']
+            ids.extend(row['id'] for row in result['data'])
+            if result['next_cursor'] is None:
+                break
+            params = {'cursor': result['next_cursor'], 'limit': 10}
+        self.assertEqual(ids, list(range(1, 26)))
+
+    def test_cursor_bound_to_sql(self):
+        cursor = self.get(key='id', limit=5).json()['result']['next_cursor']
+        response = self.client.get(self.url, {'sql': 'SELECT id FROM regulation', 'cursor': cursor})
+        self.assertEqual(response.status_code, 400)
+
+    def test_stream_pages(self):
+        lines = self.stream(key='id', limit=7)
+        self.assertEqual(lines[0]['columns'], ['id', 'tr', 'gene', 'score'])
+        self.assertEqual([row['id'] for row in lines[1:-1]], list(range(1, 8)))
+        footer = lines[-1]
+        self.assertEqual((footer['count'], footer['truncated']), (7, True))
+        lines = self.stream(cursor=footer['next_cursor'], limit=7)
+        self.assertEqual(lines[1]['id'], 8)
+
+    def test_stream_without_key_stops_at_cap(self):
+        footer = self.stream()[-1]
+        self.assertEqual((footer['count'], footer['truncated'], footer['next_cursor']), (10, True, None))
+        self.assertEqual(views.mysql_pool.stats()['size'], 0)
+        # A wrapped query is bounded by its LIMIT, so its connection is kept
+        footer = self.stream(key='id')[-1]
+        self.assertEqual((footer['count'], footer['truncated']), (10, True))
+        self.assertEqual(views.mysql_pool.stats()['idle'], 1)
+
+    def test_disconnected_stream_drops_connection(self):
+        response = self.get(stream='1')
+        next(iter(response.streaming_content))
+        response.close()
+        # Dropped rather than drained by a rollback of the unfinished cursor
+        self.assertEqual(views.mysql_pool.stats()['size'], 0)
+
+    def test_unwrapped_without_projection_or_key(self):
+        # A derived table would reject the duplicate id columns of a join
+        sql = 'SELECT * FROM a JOIN b ON a.id = b.id'
+        self.assertEqual(views._build_query(sql, [], None, None, 10), (sql, None))
+
+    def test_wrapped_query_survives_trailing_comment(self):
+        query, params = views._build_query("SELECT * FROM t WHERE a LIKE 'x%' -- note", ['a'], None, None, 10)
+        self.assertEqual(query, "SELECT `a` FROM (SELECT * FROM t WHERE a LIKE 'x%%' -- note\n) AS q LIMIT %s")
+        self.assertEqual(params, [11])
+
+    def test_duplicate_columns_and_comment(self):
+        sql = 'SELECT r.id, s.id FROM regulation r JOIN regulation s ON s.id = r.id + 1 -- pairs'
+        result = self.client.get(self.url, {'sql': sql, 'limit': 3}).json()['result']
+        self.assertEqual((result['count'], result['truncated']), (3, True))
+        # The unread rest of an unwrapped result is dropped with its connection
+        self.assertEqual(views.mysql_pool.stats()['size'], 0)
+        result = self.client.get(self.url, {'sql': 'SELECT id FROM regulation -- all', 'cache': '0'}).json()
+        self.assertEqual(result['result']['count'], 10)
+
+    def test_invalid_column_rejected(self):
+        response = self.get(columns='gene; DROP TABLE x')
+        self.assertEqual(response.status_code, 400)
+
+
+class QueryCacheTest(SimpleTestCase):
+    def test_normalize_sql(self):
+        self.assertEqual(normalize_sql("  SELECT *\n  FROM t\tWHERE a = 'x  y' ;"), "SELECT * FROM t WHERE a = 'x  y'")
+        self.assertEqual(QueryCache.key('SELECT 1', 10), QueryCache.key('SELECT   1;', 10))
+        self.assertNotEqual(QueryCache.key('SELECT 1', 10), QueryCache.key('SELECT 1', 20))
+
+    def test_lru_evicts_by_bytes(self):
+        cache = QueryCache(max_bytes=10)
+        cache.set('a', b'aaaa')
+        cache.set('b', b'bbbb')
+        cache.get('a')
+        cache.set('c', b'cccc')
+        self.assertEqual(cache.get('b'), (None, None))
+        self.assertEqual(cache.get('a'), (b'aaaa', 'memory'))
+        cache.set('big', b'x' * 11)
+        self.assertEqual(cache.get('big'), (None, None))
+        self.assertEqual(cache.stats()['bytes'], 8)
+
+    def test_ttl(self):
+        cache = QueryCache(ttl=0.05)
+        cache.set('a', b'1')
+        self.assertEqual(cache.get('a'), (b'1', 'memory'))
+        time.sleep(0.1)
+        self.assertEqual(cache.get('a'), (None, None))
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_shared_tier(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f'{tmp}/cache.sqlite3'
+            first, second = QueryCache(path=path), QueryCache(path=path)
+            first.set('a', b'1')
+            self.assertEqual(second.get('a'), (b'1', 'shared'))
+            self.assertEqual(second.get('a'), (b'1', 'memory'))
+            # Invalidation in one process clears the LRU of the others
+            first.invalidate()
+            self.assertEqual(second.get('a'), (None, None))
+            self.assertEqual(first.stats()['shared_errors'], 0)
+
+    def test_shared_tier_trimmed_to_max_bytes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f'{tmp}/cache.sqlite3'
+            QueryCache(max_bytes=10, path=path).set('a', b'aaaa')
+            cache = QueryCache(max_bytes=10, path=path)
+            cache.set('b', b'bbbb')
+            cache.set('c', b'cccc')
+            self.assertEqual(QueryCache(path=path).get('a'), (None, None))
+            self.assertEqual(QueryCache(path=path).get('c'), (b'cccc', 'shared'))
+
+
+@override_settings(MYSQL_QUERY={'MAX_ROWS': 10, 'STREAM_CHUNK_ROWS': 4})
+class QueryMysqlCacheAPITest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.url = reverse('query_mysql')
+        self.pool = ConnectionPool(SQLiteStandIn, max_size=1)
+        self.cache = QueryCache()
+        for name, value in (('mysql_pool', self.pool), ('query_cache', self.cache)):
+            patcher = mock.patch.object(views, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(self.pool.close)
+
+    def get(self, sql='SELECT gene FROM regulation WHERE tr = \'TR1\'', **params):
+        return self.client.get(self.url, {'sql': sql, **params})
+
+    def test_hit_after_miss(self):
+        miss = self.get()
+        hit = self.get(sql="SELECT gene\n  FROM regulation WHERE tr = 'TR1';")
+        self.assertEqual((miss['X-Cache'], hit['X-Cache'], hit['X-Cache-Tier']), ('MISS', 'HIT', 'memory'))
+        self.assertEqual(hit.json(), miss.json())
+        self.assertEqual(self.pool.stats()['acquired'], 1)
+        self.assertEqual(self.get(limit=5)['X-Cache'], 'MISS')
+
+    def test_bypass(self):
+        self.get()
+        response = self.get(cache='0')
+        self.assertEqual(response['X-Cache'], 'BYPASS')
+        self.assertEqual(self.pool.stats()['acquired'], 2)
+
+    def test_errors_not_cached(self):
+        self.assertEqual(self.get(sql='SELECT missing FROM regulation').status_code, 400)
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_invalidate_requires_staff(self):
+        url = reverse('query_mysql_invalidate')
+        self.get()
+        self.assertEqual(self.client.post(url).status_code, 403)
+        self.client.force_login(User.objects.create_user('user'))
+        self.assertEqual(self.client.post(url).status_code, 403)
+        self.assertEqual(self.cache.stats()['entries'], 1)
+
+        # Session authenticated, so the CSRF token is checked
+        staff = Client(enforce_csrf_checks=True)
+        staff.force_login(User.objects.create_user('admin', is_staff=True))
+        self.assertEqual(staff.post(url).status_code, 403)
+        self.assertEqual(self.cache.stats()['entries'], 1)
+
+    def test_invalidate(self):
+        url = reverse('query_mysql_invalidate')
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        self.get()
+        self.get(limit=5)
+        self.client.post(f"{url}?sql=SELECT+gene+FROM+regulation+WHERE+tr+%3D+'TR1'&limit=5")
+        self.assertEqual((self.get()['X-Cache'], self.get(limit=5)['X-Cache']), ('HIT', 'MISS'))
+        response = self.client.post(url)
+        self.assertEqual(response.json()['cache']['entries'], 0)
+        self.assertEqual(self.get()['X-Cache'], 'MISS')
+
+    def test_stats(self):
+        self.get()
+        self.get()
+        cache = self.client.get(reverse('query_mysql_stats')).json()['cache']
+        self.assertEqual((cache['hits'], cache['misses'], cache['entries']), (1, 1, 1))
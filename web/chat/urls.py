@@ -3,5 +3,9 @@ from . import views
 
 urlpatterns = [
     path('data/collection', views.collection, name='collection'),
+    path('data/collection/batch', views.collection_batch, name='collection_batch'),
+    path('data/history', views.conversation_history, name='conversation_history'),
     path('query/mysql', views.query_mysql, name='query_mysql'),
+    path('query/mysql/stats', views.query_mysql_stats, name='query_mysql_stats'),
+    path('query/mysql/cache/invalidate', views.query_mysql_invalidate, name='query_mysql_invalidate'),
 ]
\ No newline at end of file
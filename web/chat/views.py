@@ -1,51 +1,346 @@
-from django.http import JsonResponse
+from django.conf import settings
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST, require_GET
 from .models import Conversation
+from .pool import ConnectionPool
+from .query_cache import QueryCache, normalize_sql
 from conn import Mysql
+import hashlib
 import json
 import re
 
+try:
+    from pymysql.cursors import SSDictCursor
+except ImportError:
+    SSDictCursor = None
+
 mysql = Mysql()
+mysql_pool = ConnectionPool(
+    mysql.connect,
+    max_size=settings.MYSQL_POOL["MAX_SIZE"],
+    idle_timeout=settings.MYSQL_POOL["IDLE_TIMEOUT"],
+    check_after=settings.MYSQL_POOL["HEALTH_CHECK_AFTER"],
+    acquire_timeout=settings.MYSQL_POOL["ACQUIRE_TIMEOUT"],
+)
+query_cache = QueryCache(
+    ttl=settings.MYSQL_QUERY_CACHE["TTL"],
+    max_bytes=settings.MYSQL_QUERY_CACHE["MAX_BYTES"],
+    path=settings.MYSQL_QUERY_CACHE["PATH"],
+)
+
+CONVERSATION_FIELDS = ("chat_id", "message_id", "user_message", "agent_messages")
+# Maximum number of conversations accepted by one collection_batch request
+BATCH_MAX_ITEMS = 1000
+# Page sizes of the conversation_history endpoint
+HISTORY_DEFAULT_LIMIT = 50
+HISTORY_MAX_LIMIT = 500
+# Column names accepted by query_mysql projection and pagination
+IDENTIFIER_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+CURSOR_SALT = "chat.query_mysql.cursor"
+
+
+def _conversation_data(data):
+    if not isinstance(data, dict):
+        raise ValueError("Expected a conversation object")
+    data = {key: data.get(key) for key in CONVERSATION_FIELDS}
+    if data["chat_id"] is None or data["message_id"] is None:
+        raise ValueError("chat_id and message_id are required")
+    return data
+
+
+def _upsert_conversations(items):
+    """
+    Create or update conversations keyed by (chat_id, message_id) with a single
+    INSERT ... ON CONFLICT DO UPDATE (ON DUPLICATE KEY UPDATE on MySQL). Returns their ids
+    in input order.
+    """
+    keys = [(str(item["chat_id"]), int(item["message_id"])) for item in items]
+    # A key repeated within the batch keeps its last version
+    latest = {key: dict(item, chat_id=key[0], message_id=key[1]) for key, item in zip(keys, items)}
+
+    # MySQL cannot name the conflict target; its upsert matches any unique key, which here
+    # is conversations_chat_message_uniq
+    conflict_target = {}
+    if connection.features.supports_update_conflicts_with_target:
+        conflict_target["unique_fields"] = ["chat_id", "message_id"]
+
+    with transaction.atomic():
+        conversations = Conversation.objects.bulk_create(
+            [Conversation(**item) for item in latest.values()],
+            update_conflicts=True,
+            update_fields=["user_message", "agent_messages"],
+            **conflict_target,
+        )
+        ids = {(c.chat_id, c.message_id): c.id for c in conversations}
+        if None in ids.values():
+            # Backends that do not return primary keys from upserts (MySQL)
+            for conversation in Conversation.objects.filter(
+                chat_id__in={chat_id for chat_id, _ in latest},
+                message_id__in={message_id for _, message_id in latest},
+            ).only("id", "chat_id", "message_id"):
+                key = (conversation.chat_id, conversation.message_id)
+                if key in ids:
+                    ids[key] = conversation.id
+
+    return [ids[key] for key in keys]
 
 
 @csrf_exempt
 @require_POST
 def collection(request):
+    try:
+        data = _conversation_data(json.loads(request.body))
+        conversation_id = _upsert_conversations([data])[0]
+        return JsonResponse({"status": "success", "id": conversation_id})
+    except Exception as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+
+
+@csrf_exempt
+@require_POST
+def collection_batch(request):
+    """
+    Upsert many conversations in one request.
+    Accepts a JSON array of conversations (or {"conversations": [...]}) and returns their ids
+    in the same order.
+    """
     try:
         data = json.loads(request.body)
-        data = {
-            "chat_id": data.get("chat_id"),
-            "message_id": data.get("message_id"),
-            "user_message": data.get("user_message"),
-            "agent_messages": data.get("agent_messages"),
-        }
+        if isinstance(data, dict):
+            data = data.get("conversations")
+        if not isinstance(data, list):
+            raise ValueError("Expected a JSON array of conversations")
+        if len(data) > BATCH_MAX_ITEMS:
+            raise ValueError(f"At most {BATCH_MAX_ITEMS} conversations per request, got {len(data)}")
 
-        # Check if conversation with chat_id exists
-        existing_conversation = Conversation.objects.filter(
-            chat_id=data["chat_id"], message_id=data["message_id"]
-        ).first()
-        if existing_conversation:
-            # Update existing conversation
-            for key, value in data.items():
-                setattr(existing_conversation, key, value)
-            existing_conversation.save()
-            conversation = existing_conversation
-        else:
-            # Create new conversation
-            conversation = Conversation.objects.create(**data)
+        items = []
+        for index, item in enumerate(data):
+            try:
+                items.append(_conversation_data(item))
+            except ValueError as e:
+                raise ValueError(f"Item {index}: {e}")
+
+        ids = _upsert_conversations(items)
+        return JsonResponse({"status": "success", "ids": ids, "count": len(set(ids))})
+    except Exception as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+
+
+@require_GET
+def conversation_history(request):
+    """
+    Messages of one chat ordered by message_id, one page at a time.
+    Pages are keyset-paginated on the (chat_id, message_id) unique index: pass the returned
+    next_cursor back as `cursor` to get the following page, with the same `order`.
+    """
+    try:
+        chat_id = request.GET.get("chat_id")
+        if not chat_id:
+            raise ValueError("chat_id is required")
+        order = request.GET.get("order", "asc")
+        if order not in ("asc", "desc"):
+            raise ValueError("order must be 'asc' or 'desc'")
+        limit = int(request.GET.get("limit", HISTORY_DEFAULT_LIMIT))
+        if not 1 <= limit <= HISTORY_MAX_LIMIT:
+            raise ValueError(f"limit must be between 1 and {HISTORY_MAX_LIMIT}")
+
+        conversations = Conversation.objects.filter(chat_id=chat_id)
+        cursor = request.GET.get("cursor")
+        if cursor is not None:
+            if order == "asc":
+                conversations = conversations.filter(message_id__gt=int(cursor))
+            else:
+                conversations = conversations.filter(message_id__lt=int(cursor))
+        conversations = conversations.order_by("message_id" if order == "asc" else "-message_id")
+
+        # One extra row tells whether another page follows
+        rows = list(
+            conversations.values("id", "message_id", "user_message", "agent_messages", "created_at")[: limit + 1]
+        )
+        next_cursor = rows[limit - 1]["message_id"] if len(rows) > limit else None
+        rows = rows[:limit]
 
-        return JsonResponse({"status": "success", "id": conversation.id})
+        return JsonResponse(
+            {
+                "status": "success",
+                "chat_id": chat_id,
+                "data": rows,
+                "count": len(rows),
+                "next_cursor": next_cursor,
+            }
+        )
     except Exception as e:
         return JsonResponse({"status": "error", "message": str(e)}, status=400)
 
 
+def _query_options(request):
+    """解析 query_mysql 的分页、列投影与行数上限参数"""
+    max_rows = settings.MYSQL_QUERY["MAX_ROWS"]
+    limit = int(request.GET.get("limit", max_rows))
+    if not 1 <= limit <= max_rows:
+        raise ValueError(f"limit必须在1到{max_rows}之间")
+
+    columns = [c.strip() for c in request.GET.get("columns", "").split(",") if c.strip()]
+    key = request.GET.get("key") or None
+    for name in columns + ([key] if key else []):
+        if not IDENTIFIER_PATTERN.match(name):
+            raise ValueError(f"非法列名: {name}")
+
+    after = None
+    token = request.GET.get("cursor")
+    if token:
+        try:
+            cursor_data = signing.loads(token, salt=CURSOR_SALT)
+        except signing.BadSignature:
+            raise ValueError("无效的cursor")
+        if cursor_data["sql"] != _sql_digest(request.GET.get("sql", "").strip()):
+            raise ValueError("cursor与SQL不匹配")
+        key, after = cursor_data["key"], cursor_data["after"]
+    return {"limit": limit, "columns": columns, "key": key, "after": after}
+
+
+def _sql_digest(sql):
+    # Normalised so a cached next_cursor stays valid for every spelling of the same query
+    return hashlib.sha256(normalize_sql(sql).encode("utf-8")).hexdigest()[:16]
+
+
+def _build_query(sql, columns, key, after, limit):
+    """
+    Wrap the SELECT for projection and keyset pagination:
+    SELECT cols FROM (sql) AS q WHERE key > after ORDER BY key LIMIT limit + 1.
+    The extra row tells whether another page follows. Without columns or key the SQL runs
+    as written (a derived table rejects duplicate column names) and the row cap is applied
+    while fetching. Returns (sql, params); params is None when the SQL was not wrapped.
+    """
+    if not columns and not key:
+        return sql, None
+    # The driver formats the query with params, so literal % in the user's SQL must be doubled
+    sql = sql.rstrip().rstrip(";").replace("%", "%%")
+    projection = ", ".join(f"`{name}`" for name in columns) if columns else "*"
+    # The closing parenthesis goes on its own line so a trailing -- comment cannot swallow it
+    query = f"SELECT {projection} FROM ({sql}\n) AS q"
+    params = []
+    if key:
+        if after is not None:
+            query += f" WHERE `{key}` > %s"
+            params.append(after)
+        query += f" ORDER BY `{key}`"
+    query += " LIMIT %s"
+    params.append(limit + 1)
+    return query, params
+
+
+def _next_cursor(sql, key, last_row):
+    """Signed token for the page after last_row, or None without a key column"""
+    if not key or last_row is None:
+        return None
+    if key not in last_row:
+        raise ValueError(f"key列 {key} 不在结果中")
+    # Normalise dates/decimals to their JSON form; MySQL compares them with the column values
+    after = json.loads(json.dumps(last_row[key], cls=DjangoJSONEncoder))
+    return signing.dumps({"sql": _sql_digest(sql), "key": key, "after": after}, salt=CURSOR_SALT)
+
+
+def _open_cursor(mysql_conn):
+    # Server-side cursor so rows are read from MySQL as they are sent, not buffered first
+    if SSDictCursor is not None:
+        return mysql_conn.cursor(SSDictCursor)
+    return mysql_conn.cursor()
+
+
+def _fetch_rows(query, params, limit):
+    """
+    Run the query on a server-side cursor and read at most limit + 1 rows.
+    Returns (columns, rows); more than limit rows means the result was truncated.
+    """
+    mysql_conn = mysql_pool.acquire()
+    # Dropped unless the result was read to the end: closing or rolling back an unfinished
+    # server-side cursor would read the rest of an unbounded result first
+    discard = True
+    try:
+        cursor = _open_cursor(mysql_conn)
+        cursor.execute(query, params)
+        columns = [column[0] for column in cursor.description or []]
+        rows = list(cursor.fetchmany(limit + 1))
+        if len(rows) <= limit or params is not None:
+            cursor.close()
+            discard = False
+        return columns, rows
+    finally:
+        if not discard:
+            try:
+                mysql_conn.rollback()
+            except Exception:
+                discard = True
+        mysql_pool.release(mysql_conn, discard=discard)
+
+
+def _stream_rows(sql, query, params, options):
+    """
+    NDJSON generator: a header line with the columns, one line per row, then a footer with the
+    row count, whether the row cap cut the result and the cursor of the next page.
+    """
+    limit, key = options["limit"], options["key"]
+    mysql_conn = mysql_pool.acquire()
+    # Dropped unless the result was read to the end: rolling back an unfinished server-side
+    # cursor would read the rest of the result first, e.g. after the client disconnected
+    discard = True
+    try:
+        cursor = _open_cursor(mysql_conn)
+        cursor.execute(query, params)
+        columns = [column[0] for column in cursor.description or []]
+        yield json.dumps({"columns": columns}) + "\n"
+
+        count, last_row, truncated = 0, None, False
+        chunk_rows = settings.MYSQL_QUERY["STREAM_CHUNK_ROWS"]
+        while not truncated:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            for row in rows:
+                if count == limit:
+                    truncated = True
+                    break
+                count += 1
+                last_row = row
+                yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+
+        # A wrapped query's LIMIT leaves no rows after the one that marked truncation;
+        # an unwrapped one may have any number left, so its connection is dropped instead
+        if not truncated or params is not None:
+            cursor.close()
+            discard = False
+        next_cursor = _next_cursor(sql, key, last_row) if truncated else None
+        yield json.dumps({"count": count, "truncated": truncated, "next_cursor": next_cursor}) + "\n"
+    except Exception as e:
+        yield json.dumps({"status": "error", "message": str(e)}, ensure_ascii=False) + "\n"
+    finally:
+        if not discard:
+            try:
+                mysql_conn.rollback()
+            except Exception:
+                discard = True
+        mysql_pool.release(mysql_conn, discard=discard)
+
+
 @csrf_exempt
 @require_GET
 def query_mysql(request):
     """
     执行安全的SQL查询
     仅允许SELECT查询，禁止其他操作
+
+    可选参数：
+    limit   返回行数上限（默认且最大为 settings.MYSQL_QUERY["MAX_ROWS"]）
+    columns 逗号分隔的列投影
+    key     分页键列（需唯一），按其升序返回，超出 limit 时返回 next_cursor
+    cursor  上一页返回的 next_cursor
+    stream  为1时以NDJSON流式返回（服务端游标，内存占用与结果大小无关）
+    cache   为0时跳过结果缓存；非流式结果按规范化SQL缓存，响应头 X-Cache 为 HIT/MISS/BYPASS
     """
     try:
         sql = request.GET.get("sql", "").strip()
@@ -54,21 +349,74 @@ def query_mysql(request):
         if not re.match(r"^\s*SELECT\s", sql, re.IGNORECASE):
             raise ValueError("只允许执行SELECT查询")
 
-        # 创建MySQL连接
-        mysql_conn = mysql.connect()
+        options = _query_options(request)
+        query, params = _build_query(sql, options["columns"], options["key"], options["after"], options["limit"])
+
+        if request.GET.get("stream") in ("1", "true"):
+            return StreamingHttpResponse(
+                _stream_rows(sql, query, params, options), content_type="application/x-ndjson"
+            )
+
+        use_cache = request.GET.get("cache") not in ("0", "false")
+        cache_key = _cache_key(sql, options)
+        if use_cache:
+            body, tier = query_cache.get(cache_key)
+            if body is not None:
+                response = HttpResponse(body, content_type="application/json")
+                response["X-Cache"] = "HIT"
+                response["X-Cache-Tier"] = tier
+                return response
 
-        # 执行查询
-        with mysql_conn.cursor() as cursor:
-            cursor.execute(sql)
-            rows = cursor.fetchall()
-            columns = list(rows[0].keys()) if rows else []
+        # 从连接池借用MySQL连接执行查询，最多多取一行用于判断是否截断
+        columns, rows = _fetch_rows(query, params, options["limit"])
 
-        mysql_conn.close()
+        truncated = len(rows) > options["limit"]
+        rows = rows[: options["limit"]]
+        next_cursor = _next_cursor(sql, options["key"], rows[-1] if rows else None) if truncated else None
 
         # 格式化结果
-        result = {"columns": columns, "data": rows, "count": len(rows)}
+        result = {
+            "columns": columns,
+            "data": rows,
+            "count": len(rows),
+            "truncated": truncated,
+            "next_cursor": next_cursor,
+        }
 
-        return JsonResponse({"status": "success", "result": result})
+        response = JsonResponse({"status": "success", "result": result})
+        if use_cache:
+            query_cache.set(cache_key, response.content)
+        response["X-Cache"] = "MISS" if use_cache else "BYPASS"
+        return response
 
     except Exception as e:
         return JsonResponse({"status": "error", "message": str(e)}, status=400)
+
+
+def _cache_key(sql, options):
+    return QueryCache.key(sql, options["limit"], options["columns"], options["key"], options["after"])
+
+
+@require_POST
+def query_mysql_invalidate(request):
+    """
+    清除query_mysql结果缓存（仅限已登录的管理员，会话认证因此保留CSRF校验）
+    不带参数时清除全部；带 sql（及 limit/columns/key/cursor）查询参数时只清除该条结果
+    """
+    if not request.user.is_active or not request.user.is_staff:
+        return JsonResponse({"status": "error", "message": "需要管理员登录"}, status=403)
+    try:
+        sql = request.GET.get("sql", "").strip()
+        if sql:
+            query_cache.invalidate(_cache_key(sql, _query_options(request)))
+        else:
+            query_cache.invalidate()
+        return JsonResponse({"status": "success", "cache": query_cache.stats()})
+    except Exception as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+
+
+@require_GET
+def query_mysql_stats(request):
+    """连接池与结果缓存状态：连接数、空闲数、等待次数与等待时间，缓存命中、淘汰与占用字节数"""
+    return JsonResponse({"status": "success", "pool": mysql_pool.stats(), "cache": query_cache.stats()})